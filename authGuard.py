@@ -0,0 +1,117 @@
+# authGuard.py
+# Keeps password hashing off the request threads and throttles login attempts.
+# Hashes are deliberately CPU-expensive, so they run on a small dedicated pool with a
+# bounded backlog; when the backlog is full callers get HashingBusyError straight away
+# instead of tying up Waitress threads that serve the dashboards.
+
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashingBusyError(Exception):
+    """Raised when the hashing pool has no room for another request"""
+
+
+class PasswordHasher:
+    def __init__(self, workers=2, max_pending=8, wait_timeout=0.5):
+        """
+        Args:
+            workers: hashing threads (hashlib releases the GIL while hashing)
+            max_pending: hashes running or queued at once, beyond that callers are refused
+            wait_timeout: seconds to wait for a free slot before refusing
+        """
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="PasswordHash")
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self.wait_timeout = wait_timeout
+
+        # Checked against when the username does not exist, so both paths cost one hash
+        self._dummy_hash = generate_password_hash(secrets.token_hex(16))
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            raise HashingBusyError("Password hashing pool is busy")
+        try:
+            future = self._executor.submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def generate(self, password):
+        """Hash a new password"""
+        return self._run(generate_password_hash, password)
+
+    def check(self, password_hash, password):
+        """Verify a password; a missing hash (unknown user) still costs one hash"""
+        return self._run(check_password_hash, password_hash or self._dummy_hash, password or "")
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+class LoginThrottle:
+    def __init__(self, max_per_username=5, max_per_ip=20, window=900):
+        """
+        Args:
+            max_per_username: failed attempts allowed per username within the window
+            max_per_ip: failed attempts allowed per client address within the window
+            window: sliding window in seconds
+        """
+        self.max_per_username = max_per_username
+        self.max_per_ip = max_per_ip
+        self.window = window
+        self._failures = {}  # ("user"|"ip", key) -> deque of failure times
+        self._max_kept = max(max_per_username, max_per_ip)
+        self._lock = threading.Lock()
+
+    def _limits(self, username, ip):
+        """(key, limit) pairs an attempt counts against, username is None for address-only checks"""
+        limits = [(("ip", ip), self.max_per_ip)]
+        if username is not None:
+            limits.append((("user", username.strip().lower()), self.max_per_username))
+        return limits
+
+    def _recent(self, key, now):
+        attempts = self._failures.get(key)
+        if attempts is None:
+            return None
+        while attempts and attempts[0] <= now - self.window:
+            attempts.popleft()
+        if not attempts:
+            del self._failures[key]
+            return None
+        return attempts
+
+    def retry_after(self, username, ip):
+        """Seconds until another attempt is allowed, 0 if allowed now"""
+        now = time.monotonic()
+        wait = 0
+        with self._lock:
+            for key, limit in self._limits(username, ip):
+                attempts = self._recent(key, now)
+                if attempts and len(attempts) >= limit:
+                    wait = max(wait, attempts[-limit] + self.window - now)
+        return int(wait) + 1 if wait > 0 else 0
+
+    def record_failure(self, username, ip):
+        now = time.monotonic()
+        with self._lock:
+            for key, _ in self._limits(username, ip):
+                self._failures.setdefault(key, deque(maxlen=self._max_kept)).append(now)
+
+            # Keep memory bounded when hammered with many distinct usernames
+            if len(self._failures) > 50000:
+                for key in list(self._failures):
+                    self._recent(key, now)
+
+    def record_success(self, username):
+        if username is None:
+            return
+        with self._lock:
+            self._failures.pop(("user", username.strip().lower()), None)
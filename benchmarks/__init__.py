@@ -0,0 +1,3 @@
+# benchmarks
+# Synthetic ledgers and timing suites for the ExpenseDB hot paths.
+# Run from the repository root, e.g. python -m benchmarks.bench --scales 1k,100k
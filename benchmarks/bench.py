@@ -0,0 +1,334 @@
+# bench.py
+# Times the ExpenseDB read paths, CSV-import ingestion and homepage figure construction
+# against generated ledgers, and compares the medians with stored baselines.
+#
+#   python -m benchmarks.bench                          # 1k and 100k, compare with baselines
+#   python -m benchmarks.bench --scales 1m --repeat 3
+#   python -m benchmarks.bench --save-baseline          # record this machine's numbers
+#
+# Ledgers are generated once into benchmarks/data/ and reused. Queries run for one
+# user over the last full year of data, the way the app queries them.
+# Exit status is 1 when a case got slower than its baseline by more than the tolerance.
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import time
+from datetime import date
+
+from benchmarks.ledger import SCALES, DEFAULT_SEED, DEFAULT_END_DATE, generate_ledger
+from database import ExpenseDB
+import homepage
+from sankey import build_sankey_model
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCH_DIR, "data")
+BASELINES_PATH = os.path.join(BENCH_DIR, "baselines.json")
+
+DEFAULT_SCALES = ["1k", "100k"]
+DEFAULT_REPEAT = 5
+DEFAULT_TOLERANCE = 0.25   # Slower than baseline by more than this fraction is a regression
+MIN_REGRESSION_MS = 1.0    # Differences below this are noise, whatever the ratio
+IMPORT_ROWS = 1000         # Rows per simulated CSV import
+
+BENCH_USER_ID = 1
+
+
+class BenchContext:
+    """Dates and ids the cases query with"""
+
+    def __init__(self, db):
+        self.db = db
+        self.user_id = BENCH_USER_ID
+        self.end = DEFAULT_END_DATE
+        self.year = self.end.year
+        self.month = self.end.month
+        self.start_date = date(self.end.year, 1, 1).isoformat()
+        self.end_date = self.end.isoformat()
+        self.month_start = date(self.end.year, self.end.month, 1).isoformat()
+
+        merchants = db.get_spending_by_merchant(self.start_date, self.end_date, self.user_id, limit=1)
+        self.top_merchant = merchants[0][0] if merchants else None
+        spending = db.get_total_spent_by_category_filtered(self.start_date, self.end_date, self.user_id)
+        self.top_category = max(spending, key=lambda row: row[1])[0] if spending else None
+        with db._get_cursor() as cursor:
+            cursor.execute("SELECT transaction_id FROM tags WHERE user_id = ? LIMIT 1", (self.user_id,))
+            row = cursor.fetchone()
+        self.tagged_transaction = row[0] if row else None
+
+
+# --- Read paths ---
+def read_cases():
+    return {
+        "get_categories": lambda c: c.db.get_categories(c.user_id),
+        "get_budget_by_category": lambda c: c.db.get_budget_by_category(c.user_id),
+        "get_total_spent_by_category_filtered (month)":
+            lambda c: c.db.get_total_spent_by_category_filtered(c.month_start, c.end_date, c.user_id),
+        "get_total_spent_by_category_filtered (year)":
+            lambda c: c.db.get_total_spent_by_category_filtered(c.start_date, c.end_date, c.user_id),
+        "get_transactions_for_category":
+            lambda c: c.db.get_transactions_for_category(c.top_category, c.start_date, c.end_date, c.user_id),
+        "get_monthly_spending_by_category": lambda c: c.db.get_monthly_spending_by_category(c.year, c.month, c.user_id),
+        "get_total_income": lambda c: c.db.get_total_income(c.start_date, c.end_date, c.user_id),
+        "get_monthly_income_till_date": lambda c: c.db.get_monthly_income_till_date(c.year, c.month, c.user_id),
+        "get_movement_trend": lambda c: c.db.get_movement_trend(c.start_date, c.end_date, c.user_id),
+        "get_all_transactions_flow": lambda c: c.db.get_all_transactions_flow(c.start_date, c.end_date, c.user_id),
+        "get_top_transactions_flow": lambda c: c.db.get_top_transactions_flow(c.start_date, c.end_date, c.user_id, top_n=10),
+        "get_category_transactions_flow":
+            lambda c: c.db.get_category_transactions_flow(c.start_date, c.end_date, c.top_category, c.user_id),
+        "get_spending_by_merchant": lambda c: c.db.get_spending_by_merchant(c.start_date, c.end_date, c.user_id),
+        "get_merchant_category_counts": lambda c: c.db.get_merchant_category_counts(c.user_id),
+        "get_current_netWorth_snapshot": lambda c: c.db.get_current_netWorth_snapshot(c.user_id),
+        "get_all_non_current_netWorth_snapshots": lambda c: c.db.get_all_non_current_netWorth_snapshots(c.user_id),
+        "fetch_recent_transactions": lambda c: c.db.fetch_recent_transactions(num_trans_limit=50, user_id=c.user_id),
+        "fetch_recent_transactions (search)":
+            lambda c: c.db.fetch_recent_transactions(search_term=c.top_merchant, num_trans_limit=50, user_id=c.user_id),
+        "fetch_recent_income": lambda c: c.db.fetch_recent_income(num_income_limit=50, user_id=c.user_id),
+        "fetch_unique_tags": lambda c: c.db.fetch_unique_tags(c.user_id),
+        "get_transactions_by_tag": lambda c: c.db.get_transactions_by_tag("work", c.user_id),
+        "get_tags_for_transaction": lambda c: c.db.get_tags_for_transaction(c.tagged_transaction, c.user_id),
+        "iter_export_rows (transactions)": lambda c: sum(len(page) for page in c.db.iter_export_rows("transactions", c.user_id)),
+    }
+
+
+# --- Ingestion ---
+def _import_rows(ctx):
+    """Synthetic CSV rows for the bench user, spending and income mixed like a bank export"""
+    with ctx.db._get_cursor() as cursor:
+        cursor.execute("SELECT id FROM categories WHERE user_id = ? ORDER BY id", (ctx.user_id,))
+        category_ids = [row[0] for row in cursor.fetchall()]
+    rows = []
+    for i in range(IMPORT_ROWS):
+        if i % 10 == 0:
+            rows.append((None, f"Employer {i % 3}", -round(500 + i % 97 * 3.1, 2), ctx.end_date, "", 0))
+        else:
+            rows.append((category_ids[i % len(category_ids)], f"Imported Merchant {i % 150}",
+                         round(5 + i % 89 * 1.7, 2), ctx.end_date, "Imported", 0))
+    return rows
+
+
+def import_csv_equivalent(ctx, rows):
+    """The database side of the datapage CSV import: merchant ids, bulk inserts, data version bump"""
+    db, user_id = ctx.db, ctx.user_id
+    spending = [row for row in rows if row[2] > 0]
+    income = [row for row in rows if row[2] < 0]
+
+    merchant_ids = db.get_merchant_ids(user_id, [row[1] for row in spending])
+    with db._get_cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO transactions (category_id, merchant, amount, date, note, recurring, user_id, merchant_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(*row, user_id, merchant_ids[row[1]]) for row in spending],
+        )
+    with db._get_cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO income (source, amount, date, user_id) VALUES (?, ?, ?, ?)",
+            [(row[1], -row[2], row[3], user_id) for row in income],
+        )
+    db.mark_user_data_changed(user_id)
+
+
+def _undo_import(ctx, marks):
+    with ctx.db._get_cursor() as cursor:
+        cursor.execute("DELETE FROM transactions WHERE id > ?", (marks[0],))
+        cursor.execute("DELETE FROM income WHERE id > ?", (marks[1],))
+
+
+def _import_marks(ctx):
+    with ctx.db._get_cursor() as cursor:
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM transactions")
+        transactions_mark = cursor.fetchone()[0]
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM income")
+        return transactions_mark, cursor.fetchone()[0]
+
+
+# --- Figure construction (the homepage's own builders, fed the queries its callbacks run) ---
+def build_category_bar_figure(ctx):
+    data = ctx.db.get_total_spent_by_category_filtered(ctx.month_start, ctx.end_date, ctx.user_id)
+    budget_data = ctx.db.get_budget_by_category(ctx.user_id)
+    fig, _ = homepage.build_category_bar_figure(data, "bench", budget_data)
+    return fig.to_plotly_json()
+
+
+def build_trend_figure(ctx):
+    monthly = ctx.db.get_monthly_spending_by_category(ctx.year, ctx.month, ctx.user_id)
+    categories = [name for _, name in ctx.db.get_categories(ctx.user_id)]  # Filter defaults to all
+    return homepage.build_trend_figure(monthly, ctx.month, categories).to_plotly_json()
+
+
+def build_sankey_figure(ctx, show_transactions=True):
+    income_data, spending_data, transactions_data = ctx.db.get_top_transactions_flow(
+        ctx.start_date, ctx.end_date, ctx.user_id, top_n=homepage.SANKEY_TOP_N if show_transactions else 0
+    )
+    model = build_sankey_model(income_data, spending_data, transactions_data, show_transactions)
+    fig, _ = homepage.build_sankey_figure(model, show_transactions)
+    return fig.to_plotly_json()
+
+
+def figure_cases():
+    return {
+        "figure: category bar": build_category_bar_figure,
+        "figure: category trend": build_trend_figure,
+        "figure: sankey categories": lambda c: build_sankey_figure(c, show_transactions=False),
+        "figure: sankey top 10": build_sankey_figure,
+    }
+
+
+# --- Runner ---
+def _time(func, repeat):
+    func()  # Warm up caches and the statement cache
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def ledger_path(scale, seed=DEFAULT_SEED):
+    return os.path.join(DATA_DIR, f"ledger-{scale}-{seed}.db")
+
+
+def prepare_ledger(scale, regenerate=False):
+    path = ledger_path(scale)
+    if regenerate and os.path.exists(path):
+        os.remove(path)
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        generate_ledger(path, scale)
+    return path
+
+
+def run_scale(scale, repeat, selected=None, regenerate=False):
+    """Median/min/max milliseconds per case for one ledger size"""
+    source = prepare_ledger(scale, regenerate)
+
+    # Ingestion writes, so every run works on a copy
+    work_path = source + ".run"
+    shutil.copyfile(source, work_path)
+    db = ExpenseDB(work_path, use_pool=True, pool_size=2, enable_monitoring=False, use_wal=True)
+    results = {}
+    try:
+        ctx = BenchContext(db)
+        cases = {**read_cases(), **figure_cases()}
+        for name, case in cases.items():
+            if selected and not any(part in name for part in selected):
+                continue
+            timings = _time(lambda: case(ctx), repeat)
+            results[name] = _summarize(timings)
+            print(f"  {scale:>5}  {name:<50} {results[name]['median_ms']:>10.2f} ms")
+
+        name = f"import_csv ({IMPORT_ROWS} rows)"
+        if not selected or any(part in name for part in selected):
+            rows = _import_rows(ctx)
+            timings = []
+            for _ in range(repeat):
+                marks = _import_marks(ctx)
+                start = time.perf_counter()
+                import_csv_equivalent(ctx, rows)
+                timings.append((time.perf_counter() - start) * 1000)
+                _undo_import(ctx, marks)
+            results[name] = _summarize(timings)
+            print(f"  {scale:>5}  {name:<50} {results[name]['median_ms']:>10.2f} ms")
+    finally:
+        db.close_change_watcher()
+        db.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(work_path + suffix):
+                os.remove(work_path + suffix)
+    return results
+
+
+def _summarize(timings):
+    return {
+        "median_ms": round(statistics.median(timings), 3),
+        "min_ms": round(min(timings), 3),
+        "max_ms": round(max(timings), 3),
+    }
+
+
+def load_baselines(path=BASELINES_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("results", {})
+
+
+def save_baselines(results, path=BASELINES_PATH):
+    """Merge results into the baseline file, keeping scales that were not run"""
+    baselines = load_baselines(path)
+    for scale, cases in results.items():
+        baselines[scale] = {name: summary["median_ms"] for name, summary in cases.items()}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "recorded": date.today().isoformat(),
+            "machine": f"{platform.system()} {platform.machine()}, Python {platform.python_version()}",
+            "results": baselines,
+        }, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"Baselines written to {path}")
+
+
+def compare(results, baselines, tolerance):
+    """List of (scale, case, baseline ms, median ms) that regressed"""
+    regressions = []
+    for scale, cases in results.items():
+        for name, summary in cases.items():
+            baseline = baselines.get(scale, {}).get(name)
+            if baseline is None:
+                continue
+            median = summary["median_ms"]
+            if median > baseline * (1 + tolerance) and median - baseline > MIN_REGRESSION_MS:
+                regressions.append((scale, name, baseline, median))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ExpenseDB benchmark suite")
+    parser.add_argument("--scales", default=",".join(DEFAULT_SCALES), help=f"comma separated, from {', '.join(SCALES)}")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--cases", help="comma separated substrings of case names to run")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--regenerate", action="store_true", help="rebuild the ledgers")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--json", help="also write the raw results to this file")
+    args = parser.parse_args()
+
+    scales = [scale.strip() for scale in args.scales.split(",") if scale.strip()]
+    unknown = [scale for scale in scales if scale not in SCALES]
+    if unknown:
+        parser.error(f"Unknown scale(s): {', '.join(unknown)}")
+    selected = [part.strip() for part in args.cases.split(",")] if args.cases else None
+
+    results = {}
+    for scale in scales:
+        print(f"Scale {scale}:")
+        results[scale] = run_scale(scale, args.repeat, selected, args.regenerate)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        save_baselines(results)
+        return 0
+
+    baselines = load_baselines()
+    if not baselines:
+        print("No baselines recorded yet, run with --save-baseline to create them")
+        return 0
+
+    regressions = compare(results, baselines, args.tolerance)
+    for scale, name, baseline, median in regressions:
+        print(f"REGRESSION {scale} {name}: {baseline:.2f} ms -> {median:.2f} ms (+{(median / baseline - 1) * 100:.0f}%)")
+    if regressions:
+        return 1
+    print(f"No regressions beyond {args.tolerance:.0%} of baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
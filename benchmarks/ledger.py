@@ -0,0 +1,290 @@
+# ledger.py
+# Deterministic synthetic ledgers scaled up from the demo CSVs in excelTables/.
+# The demo rows are used as templates (merchant, category, typical amount, note);
+# each user gets monthly spending drawn from them, paychecks and side income,
+# a few monthly recurring schedules, tagged transactions and a net worth snapshot
+# per month. The same (scale, seed) always produces the same database.
+#
+#   python -m benchmarks.ledger --scale 100k --out benchmarks/data/ledger-100k.db
+
+import argparse
+import calendar
+import csv
+import os
+import random
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import date
+
+from benchmarks.schema import create_schema
+
+DEMO_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "excelTables")
+DEMO_TRANSACTIONS = os.path.join(DEMO_DIR, "demo_transactions.csv")
+DEMO_INCOME = os.path.join(DEMO_DIR, "demo_income.csv")
+
+DEFAULT_SEED = 42
+DEFAULT_END_DATE = date(2025, 12, 31)  # Fixed so the data does not move with the calendar
+
+RECURRING_PER_USER = 4   # Monthly schedules per user (subscriptions, rent, ...)
+TAGGED_FRACTION = 0.03   # Share of transactions that get a tag
+TAGS = [("work", "#007bff"), ("vacation", "#28a745"), ("gift", "#dc3545"), ("reimbursable", "#ffc107")]
+
+
+@dataclass(frozen=True)
+class LedgerScale:
+    users: int
+    years: int
+    rows_per_user_year: int   # Transactions per user per year (recurring occurrences come on top)
+
+    @property
+    def transaction_rows(self):
+        return self.users * self.years * self.rows_per_user_year
+
+
+# Named sizes, by total transaction rows
+SCALES = {
+    "1k": LedgerScale(users=1, years=1, rows_per_user_year=1000),
+    "100k": LedgerScale(users=10, years=5, rows_per_user_year=2000),
+    "1m": LedgerScale(users=100, years=5, rows_per_user_year=2000),
+}
+
+
+def _read_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def load_templates():
+    """
+    Spending and income templates from the demo CSVs
+
+    Returns:
+        (spending list of (category, merchant, amount, note), income list of (source, amount))
+    """
+    spending = [
+        (row["category"].strip(), row["merchant"].strip(), abs(float(row["amount"])), row["note"].strip())
+        for row in _read_csv(DEMO_TRANSACTIONS)
+        if row["category"].strip() and row["merchant"].strip()
+    ]
+    income = [
+        (row["merchant"].strip(), abs(float(row["amount"])))
+        for row in _read_csv(DEMO_INCOME)
+        if row["merchant"].strip()
+    ]
+    return spending, income
+
+
+def _months(years, end_date):
+    """(year, month) pairs covering the last `years` years up to end_date's month"""
+    months = []
+    year, month = end_date.year, end_date.month
+    for _ in range(years * 12):
+        months.append((year, month))
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    months.reverse()
+    return months
+
+
+def _random_day(rng, year, month):
+    return date(year, month, rng.randint(1, calendar.monthrange(year, month)[1])).isoformat()
+
+
+def _jitter(rng, amount, spread=0.3):
+    return round(amount * rng.uniform(1 - spread, 1 + spread), 2)
+
+
+def generate_ledger(db_path, scale, seed=DEFAULT_SEED, end_date=DEFAULT_END_DATE, verbose=True):
+    """
+    Create db_path and fill it with a synthetic ledger
+
+    Args:
+        db_path: database file to create (must not exist)
+        scale: LedgerScale or a name from SCALES
+        seed: random seed, the same seed gives the same data
+        end_date: last day of generated data
+
+    Returns:
+        dict of row counts per table
+    """
+    if isinstance(scale, str):
+        scale = SCALES[scale]
+    if os.path.exists(db_path):
+        raise FileExistsError(f"{db_path} already exists")
+
+    start = time.perf_counter()
+    db = create_schema(db_path)
+    spending_templates, income_templates = load_templates()
+    category_names = sorted({category for category, _, _, _ in spending_templates})
+    months = _months(scale.years, end_date)
+    per_month = max(1, scale.rows_per_user_year // 12)
+
+    # Bulk load on a separate connection with durability off, it is a scratch database
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA foreign_keys=ON")
+    counts = dict.fromkeys(
+        ["users", "categories", "transactions", "recurringTransactions", "income", "tags",
+         "net_worth_snapshots", "net_worth_items"], 0)
+
+    try:
+        for user_index in range(1, scale.users + 1):
+            rng = random.Random(seed * 1000003 + user_index)
+            cursor = conn.cursor()
+
+            cursor.execute(
+                "INSERT INTO users (username, password_hash, email, name) VALUES (?, ?, ?, ?)",
+                (f"bench_user_{user_index}", "!", f"bench_user_{user_index}@example.invalid", f"Bench User {user_index}"),
+            )
+            user_id = cursor.lastrowid
+            counts["users"] += 1
+
+            # Categories with budgets around the expected monthly spend
+            category_ids = {}
+            for name in category_names:
+                typical = sum(amount for category, _, amount, _ in spending_templates if category == name)
+                budget = round(typical / len(spending_templates) * per_month * rng.uniform(0.8, 1.2), -1)
+                cursor.execute("INSERT INTO categories (name, budget, user_id) VALUES (?, ?, ?)", (name, budget, user_id))
+                category_ids[name] = cursor.lastrowid
+            counts["categories"] += len(category_ids)
+            conn.commit()
+
+            # Merchant ids the same way the app resolves them
+            merchant_ids = db.get_merchant_ids(user_id, [merchant for _, merchant, _, _ in spending_templates])
+
+            # One-off spending, ids are contiguous from first_id (single writer)
+            first_id = cursor.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM transactions").fetchone()[0]
+            rows = []
+            for year, month in months:
+                for _ in range(per_month):
+                    category, merchant, amount, note = rng.choice(spending_templates)
+                    rows.append((category_ids[category], merchant, _jitter(rng, amount), _random_day(rng, year, month),
+                                 note, 0, user_id, merchant_ids[merchant]))
+            cursor.executemany(
+                """INSERT INTO transactions (category_id, merchant, amount, date, note, recurring, user_id, merchant_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                rows,
+            )
+            counts["transactions"] += len(rows)
+
+            # Monthly recurring schedules, started at a random month of the range
+            for category, merchant, amount, note in rng.sample(spending_templates, min(RECURRING_PER_USER, len(spending_templates))):
+                year, month = rng.choice(months[: max(1, len(months) // 2)])
+                values = (category_ids[category], merchant, round(amount, 2), date(year, month, rng.randint(1, 28)).isoformat(),
+                          f"Monthly {merchant}", 1, user_id, merchant_ids[merchant])
+                cursor.execute(
+                    """INSERT INTO transactions (category_id, merchant, amount, date, note, recurring, user_id, merchant_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    values,
+                )
+                cursor.execute(
+                    """INSERT INTO recurringTransactions
+                    (trans_id, category_id, merchant, amount, date, note, recurring, user_id, merchant_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (cursor.lastrowid, *values),
+                )
+                counts["transactions"] += 1
+                counts["recurringTransactions"] += 1
+
+            # Tags on a sample of the one-off transactions
+            tag_rows = []
+            for offset in range(len(rows)):
+                if rng.random() < TAGGED_FRACTION:
+                    tag_name, tag_color = rng.choice(TAGS)
+                    tag_rows.append((first_id + offset, tag_name, tag_color, user_id))
+            cursor.executemany(
+                "INSERT INTO tags (transaction_id, tag_name, tag_color, user_id) VALUES (?, ?, ?, ?)",
+                tag_rows,
+            )
+            counts["tags"] += len(tag_rows)
+
+            # Income: two paychecks a month plus occasional side income
+            salary_source, salary = max(income_templates, key=lambda template: template[1])
+            income_rows = []
+            for year, month in months:
+                for day in (1, 15):
+                    income_rows.append((salary_source, _jitter(rng, salary, 0.02), date(year, month, day).isoformat(), user_id))
+                if rng.random() < 0.4:
+                    source, amount = rng.choice(income_templates)
+                    income_rows.append((source, _jitter(rng, amount), _random_day(rng, year, month), user_id))
+            cursor.executemany("INSERT INTO income (source, amount, date, user_id) VALUES (?, ?, ?, ?)", income_rows)
+            counts["income"] += len(income_rows)
+
+            # Net worth snapshot at the end of every month, the last one is current
+            savings, investments, loan = rng.uniform(2000, 20000), rng.uniform(0, 50000), rng.uniform(0, 30000)
+            for index, (year, month) in enumerate(months):
+                savings *= rng.uniform(0.98, 1.05)
+                investments *= rng.uniform(0.95, 1.06)
+                loan = max(0.0, loan - rng.uniform(100, 600))
+                assets = [("Checking", "Cash", round(rng.uniform(500, 5000), 2)),
+                          ("Savings", "Cash", round(savings, 2)),
+                          ("Brokerage", "Investments", round(investments, 2))]
+                liabilities = [("Credit card", "Credit", round(rng.uniform(0, 3000), 2)),
+                               ("Car loan", "Loan", round(loan, 2))]
+                total_assets = round(sum(item[2] for item in assets), 2)
+                total_liabilities = round(sum(item[2] for item in liabilities), 2)
+                cursor.execute(
+                    """INSERT INTO net_worth_snapshots
+                    (snapshot_date, note, total_assets, total_liabilities, net_worth, is_current, user_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                    (date(year, month, calendar.monthrange(year, month)[1]).isoformat(), "Month end",
+                     total_assets, total_liabilities, round(total_assets - total_liabilities, 2),
+                     int(index == len(months) - 1), user_id),
+                )
+                snapshot_id = cursor.lastrowid
+                cursor.executemany(
+                    "INSERT INTO net_worth_items (snapshot_id, name, type, category, amount, note) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(snapshot_id, name, "asset", category, amount, "") for name, category, amount in assets]
+                    + [(snapshot_id, name, "liability", category, amount, "") for name, category, amount in liabilities],
+                )
+                counts["net_worth_snapshots"] += 1
+                counts["net_worth_items"] += len(assets) + len(liabilities)
+
+            conn.commit()
+            cursor.close()
+            if verbose and (user_index % 10 == 0 or user_index == scale.users):
+                print(f"Generated {user_index}/{scale.users} users ({counts['transactions']} transactions)")
+
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+        db.close_change_watcher()
+        db.close()
+
+    # Fold the WAL into the main file so the ledger is a single self-contained file
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        conn.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        conn.close()
+
+    if verbose:
+        print(f"Ledger {db_path} ready in {time.perf_counter() - start:.1f}s: {counts}")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic expense ledger")
+    parser.add_argument("--scale", default="1k", choices=sorted(SCALES), help="named size")
+    parser.add_argument("--users", type=int, help="override the number of users")
+    parser.add_argument("--years", type=int, help="override the number of years")
+    parser.add_argument("--rows-per-year", type=int, help="override transactions per user per year")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--out", required=True, help="database file to create")
+    args = parser.parse_args()
+
+    scale = SCALES[args.scale]
+    scale = LedgerScale(
+        users=args.users or scale.users,
+        years=args.years or scale.years,
+        rows_per_user_year=args.rows_per_year or scale.rows_per_user_year,
+    )
+    generate_ledger(args.out, scale, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,485 @@
+# loadtest.py
+# Concurrent load generator that drives a running server through the same
+# _dash-update-component requests the browser sends. Callback signatures are read
+# from the server's _dash-dependencies, so the requests always match the app.
+#
+#   python -m benchmarks.ledger --scale 100k --out benchmarks/data/load.db
+#   python -m benchmarks.loadtest prepare --db benchmarks/data/load.db --out benchmarks/data/load-users.json
+#   (point [Database] in config.ini at load.db, set [ConnectionPool] monitoring = True and
+#    add bench_user_1 to [Debug] admin_users so the pool can be sampled, then start main.py)
+#   python -m benchmarks.loadtest run --url http://127.0.0.1:8080/et/ --users benchmarks/data/load-users.json \
+#       --concurrency 20 --duration 60 --json load-report.json
+#
+# Each virtual user logs in, then loops over weighted scenarios (homepage load,
+# filter change, transaction add, CSV import) with think time in between. Homepage
+# callbacks are fired in parallel like a browser does. The report has throughput,
+# p50/p99 latency and error rates per callback plus pool and admission samples.
+
+import argparse
+import base64
+import itertools
+import json
+import random
+import sqlite3
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+
+DASH_UPDATE = "_dash-update-component"
+DASH_DEPENDENCIES = "_dash-dependencies"
+DEFAULT_MIX = "load=1,filter=3,add=1,import=0.1"
+DEFAULT_PASSWORD = "bench-password"
+BROWSER_PARALLELISM = 6   # Requests a browser keeps in flight per host
+POOL_SAMPLE_INTERVAL = 1.0
+CSV_IMPORT_ROWS = 50
+PAGE_LOAD_KEY = "page-load-id.data"  # staleRequests.PAGE_LOAD_STORE, new per homepage render
+
+
+# --- Preparing a ledger ---
+def prepare_users(db_path, out_path, password=DEFAULT_PASSWORD):
+    """Give every generated bench user a known password and write the user manifest"""
+    from werkzeug.security import generate_password_hash
+
+    password_hash = generate_password_hash(password)
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("UPDATE users SET password_hash = ?, is_active = 1 WHERE username LIKE 'bench_user_%'", (password_hash,))
+        conn.commit()
+        users = []
+        for user_id, username in conn.execute("SELECT id, username FROM users WHERE username LIKE 'bench_user_%' ORDER BY id"):
+            categories = conn.execute("SELECT id, name FROM categories WHERE user_id = ? ORDER BY id", (user_id,)).fetchall()
+            users.append({
+                "username": username,
+                "password": password,
+                "categories": [{"id": cat_id, "name": name} for cat_id, name in categories],
+            })
+        data_end = conn.execute("SELECT MAX(date) FROM transactions").fetchone()[0]
+    finally:
+        conn.close()
+
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump({"data_end": data_end, "users": users}, f, indent=2)
+    print(f"{len(users)} users written to {out_path}")
+
+
+# --- Talking to the server ---
+def _prop_key(component_id, prop):
+    if isinstance(component_id, dict):
+        component_id = json.dumps(component_id, sort_keys=True, separators=(",", ":"))
+    return f"{component_id}.{prop}"
+
+
+def _parse_outputs(output):
+    """Dash output string ("a.b" or "..a.b...c.d..") -> list of {id, property}"""
+    parts = output[2:-2].split("...") if output.startswith("..") else [output]
+    outputs = []
+    for part in parts:
+        component_id, prop = part.rsplit(".", 1)
+        outputs.append({"id": component_id, "property": prop.split("@")[0]})
+    return outputs
+
+
+class CallbackIndex:
+    """Server-side callbacks from _dash-dependencies, looked up by output and trigger"""
+
+    def __init__(self, dependencies):
+        self.callbacks = []
+        for dep in dependencies:
+            if dep.get("clientside_function"):
+                continue
+            self.callbacks.append({
+                "output": dep["output"],
+                "outputs": _parse_outputs(dep["output"]),
+                "inputs": dep.get("inputs", []),
+                "state": dep.get("state", []),
+            })
+
+    def find(self, output, trigger):
+        for callback in self.callbacks:
+            if (any(_prop_key(o["id"], o["property"]) == output for o in callback["outputs"])
+                    and any(_prop_key(i["id"], i["property"]) == trigger for i in callback["inputs"])):
+                return callback
+        raise KeyError(f"No callback with output {output} triggered by {trigger}")
+
+
+class DashClient:
+    """One browser session: its own cookies, same base URL and callback index"""
+
+    def __init__(self, base_url, index, timeout=60):
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.index = index
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+
+    def request(self, path, payload=None):
+        """Returns (status, body bytes, seconds)"""
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, headers={"Content-Type": "application/json"})
+        start = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                body = response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            body = e.read()
+            status = e.code
+        except (urllib.error.URLError, OSError):
+            body = b""
+            status = 0  # Connection failure
+        return status, body, time.perf_counter() - start
+
+    def fire(self, output, trigger, values):
+        """Send one callback request; values maps "id.prop" to the current property value"""
+        callback = self.index.find(output, trigger)
+        payload = {
+            "output": callback["output"],
+            "outputs": callback["outputs"] if len(callback["outputs"]) > 1 else callback["outputs"][0],
+            "inputs": [dict(item, value=values.get(_prop_key(item["id"], item["property"]))) for item in callback["inputs"]],
+            "state": [dict(item, value=values.get(_prop_key(item["id"], item["property"]))) for item in callback["state"]],
+            "changedPropIds": [trigger],
+        }
+        return self.request(DASH_UPDATE, payload)
+
+    def login(self, username, password):
+        """Returns (logged in, seconds)"""
+        status, body, seconds = self.fire("login-message.children", "login-button.n_clicks", {
+            "login-button.n_clicks": 1,
+            "login-username.value": username,
+            "login-password.value": password,
+        })
+        return status == 200 and b"login-success-redirect" in body, seconds
+
+
+def load_index(base_url, timeout=30):
+    status, body, _ = DashClient(base_url, None, timeout).request(DASH_DEPENDENCIES)
+    if status != 200:
+        raise RuntimeError(f"Could not read {DASH_DEPENDENCIES} from {base_url} (HTTP {status})")
+    return CallbackIndex(json.loads(body))
+
+
+# --- Results ---
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}   # callback -> list of seconds (successful requests)
+        self.statuses = {}    # callback -> {status: count}
+        self.pool_samples = []
+
+    def record(self, name, status, seconds):
+        with self._lock:
+            counts = self.statuses.setdefault(name, {})
+            counts[status] = counts.get(status, 0) + 1
+            if status in (200, 204):  # 204 is PreventUpdate
+                self.latencies.setdefault(name, []).append(seconds)
+
+    def add_pool_sample(self, sample):
+        with self._lock:
+            self.pool_samples.append(sample)
+
+    def report(self, elapsed):
+        rows = []
+        with self._lock:
+            for name, counts in sorted(self.statuses.items()):
+                latencies = sorted(self.latencies.get(name, []))
+                total = sum(counts.values())
+                errors = total - len(latencies)
+                rows.append({
+                    "callback": name,
+                    "requests": total,
+                    "throughput_per_s": round(total / elapsed, 2),
+                    "p50_ms": round(_percentile(latencies, 0.50) * 1000, 1),
+                    "p99_ms": round(_percentile(latencies, 0.99) * 1000, 1),
+                    "mean_ms": round(statistics.mean(latencies) * 1000, 1) if latencies else 0.0,
+                    "error_percent": round(errors / total * 100, 2),
+                    "rejected_503": counts.get(503, 0),
+                    "statuses": {str(status): count for status, count in sorted(counts.items())},
+                })
+            samples = list(self.pool_samples)
+        return rows, samples
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+# --- Virtual users ---
+class VirtualUser:
+    def __init__(self, client, account, data_end, recorder, executor, rng):
+        self.client = client
+        self.account = account
+        self.recorder = recorder
+        self.executor = executor
+        self.rng = rng
+        self.year, self.month = int(data_end[:4]), int(data_end[5:7])
+        self.end_date = data_end[:10]
+        self.category_names = [category["name"] for category in account["categories"]]
+        self.values = self._homepage_values(self.year, self.month)
+        self._new_page_load()
+
+    def _homepage_values(self, year, month):
+        start_date = f"{year}-{month:02d}-01"
+        return {
+            "url.pathname": "/",
+            "filter-type.value": "month",
+            "data-display-options.value": ["budget"],
+            "year-input.value": year,
+            "month-slider.value": month,
+            "last-period-options.value": 30,
+            "custom-days-input.value": 30,
+            "start-date-picker.date": start_date,
+            "end-date-picker.date": self.end_date,
+            "lag-limiter.value": ["enable"],
+            "trans-limiter.value": [],
+            "trend-category-filter.value": self.category_names,
+            "net-worth-update-trigger.data": {"initial_load": True},
+            "start-date-picker-movement.date": f"{year - 1}-{month:02d}-01",
+            "end-date-picker-movement.date": self.end_date,
+            "show-net-worth-movement.value": ["enable"],
+            "bar-graph.clickData": None,
+        }
+
+    def _new_page_load(self):
+        """Fresh page-load id, like a browser tab rendering the homepage again"""
+        self.values[PAGE_LOAD_KEY] = f"{self.rng.getrandbits(128):032x}"
+
+    def _fire(self, name, output, trigger):
+        status, _, seconds = self.client.fire(output, trigger, self.values)
+        self.recorder.record(name, status, seconds)
+        return status
+
+    def _fire_parallel(self, calls):
+        """Fire (name, output, trigger) calls at once, the way a browser does on page load"""
+        futures = [self.executor.submit(self._fire, *call) for call in calls]
+        for future in futures:
+            future.result()
+
+    # Scenarios
+    def homepage_load(self):
+        self._new_page_load()
+        self._fire_parallel([
+            ("trend category filter", "trend-category-filter.options", "url.pathname"),
+            ("net worth viewer", "net-worth-display-homepage.children", "net-worth-update-trigger.data"),
+            ("bar graph", "bar-graph.figure", "filter-type.value"),
+            ("category graph", "category-bar-graph.figure", "filter-type.value"),
+            ("trend graph", "trend-graph.figure", "year-input.value"),
+            ("income graph", "trend-income-graph.figure", "year-input.value"),
+            ("sankey", "sankey-diagram.figure", "filter-type.value"),
+            ("movement graph", "trend-movement-graph.figure", "start-date-picker-movement.date"),
+        ])
+
+    def filter_change(self):
+        if self.rng.random() < 0.7:
+            self.values["filter-type.value"] = "month"
+            self.values["month-slider.value"] = self.rng.randint(1, self.month)
+        else:
+            self.values["filter-type.value"] = "last"
+            self.values["last-period-options.value"] = self.rng.choice([7, 14, 30])
+        self._fire_parallel([
+            ("bar graph", "bar-graph.figure", "month-slider.value"),
+            ("category graph", "category-bar-graph.figure", "month-slider.value"),
+            ("trend graph", "trend-graph.figure", "month-slider.value"),
+            ("income graph", "trend-income-graph.figure", "month-slider.value"),
+            ("sankey", "sankey-diagram.figure", "month-slider.value"),
+        ])
+
+    def add_transaction(self):
+        category = self.rng.choice(self.account["categories"])
+        self.values.update({
+            "add-transaction-btn.n_clicks": 1,
+            "tm-category.value": category["id"],
+            "tm-merchant.value": f"Load Test Merchant {self.rng.randint(1, 40)}",
+            "tm-amount.value": round(self.rng.uniform(2, 150), 2),
+            "tm-note.value": "load test",
+            "tm-date.date": self.end_date,
+            "tm-recurring.value": False,
+            "selected-tags-store.data": [],
+            "add-transaction-btn.children": "Add Transaction",
+        })
+        self._fire("add transaction", "add-transaction-btn.children", "add-transaction-btn.n_clicks")
+
+    def csv_import(self):
+        lines = ["category,merchant,amount,date,note,recurring"]
+        for i in range(CSV_IMPORT_ROWS):
+            lines.append(f"{self.rng.choice(self.category_names)},Load Test Import {i % 20},"
+                         f"{self.rng.uniform(2, 150):.2f},{self.end_date},load test,0")
+        contents = "data:text/csv;base64," + base64.b64encode("\n".join(lines).encode("utf-8")).decode("ascii")
+        self.values.update({
+            "import-csv-btn.n_clicks": 1,
+            "upload-transactions.contents": contents,
+            "upload-transactions.filename": "load-test.csv",
+            "import-csv-btn.children": "Import Transactions",
+        })
+        self._fire("csv import", "import-csv-btn.children", "import-csv-btn.n_clicks")
+
+
+SCENARIOS = {
+    "load": VirtualUser.homepage_load,
+    "filter": VirtualUser.filter_change,
+    "add": VirtualUser.add_transaction,
+    "import": VirtualUser.csv_import,
+}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name}, expected one of {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def _user_loop(index, account, args, callbacks, data_end, mix, recorder, deadline):
+    rng = random.Random(args.seed + index)
+    client = DashClient(args.url, callbacks, args.timeout)
+
+    logged_in, seconds = client.login(account["username"], account["password"])
+    recorder.record("login", 200 if logged_in else 401, seconds)
+    if not logged_in:
+        print(f"Login failed for {account['username']}")
+        return
+
+    names, weights = list(mix), list(mix.values())
+    with ThreadPoolExecutor(max_workers=BROWSER_PARALLELISM) as executor:
+        user = VirtualUser(client, account, data_end, recorder, executor, rng)
+        user.homepage_load()
+        while time.monotonic() < deadline:
+            SCENARIOS[rng.choices(names, weights)[0]](user)
+            time.sleep(rng.expovariate(1 / args.think_time) if args.think_time > 0 else 0)
+
+
+def _sample_pool(args, callbacks, account, recorder, stop):
+    client = DashClient(args.url, callbacks, args.timeout)
+    if not client.login(account["username"], account["password"])[0]:
+        print("Pool sampling disabled: admin login failed")
+        return
+    start = time.monotonic()
+    while not stop.wait(POOL_SAMPLE_INTERVAL):
+        status, body, _ = client.request("debug/pool")
+        if status != 200:
+            print(f"Pool sampling disabled: /debug/pool returned {status} (is {account['username']} in [Debug] admin_users?)")
+            return
+        sample = json.loads(body)
+        sample["t"] = round(time.monotonic() - start, 1)
+        recorder.add_pool_sample(sample)
+
+
+def _summarize_pool(samples):
+    pools = [s["pool"] for s in samples if isinstance(s.get("pool"), dict) and "utilization_percent" in s["pool"]]
+    summary = {"samples": len(samples)}
+    if pools:
+        summary.update({
+            "max_utilization_percent": max(p["utilization_percent"] for p in pools),
+            "mean_utilization_percent": round(statistics.mean(p["utilization_percent"] for p in pools), 1),
+            "max_waiting_threads": max(p["waiting_threads"] for p in pools),
+            "failed_checkouts": pools[-1]["failed_checkouts"],
+            "avg_checkout_time_ms": pools[-1]["avg_checkout_time_ms"],
+        })
+    if samples and "admission" in samples[-1]:
+        admission = samples[-1]["admission"]
+        summary["admission"] = {key: admission.get(key) for key in
+                                ("admitted", "rejected", "rejection_percent", "peak_active", "peak_waiting", "max_wait_ms")}
+    if samples and "concurrency" in samples[-1]:
+        summary["concurrency"] = samples[-1]["concurrency"]
+    return summary
+
+
+def print_report(rows, pool, width=22, recorded=False):
+    """Table of the rows, with the recorded p50 column when the rows come from a replay"""
+    extra = f"{'rec p50 ms':>12}" if recorded else ""
+    print(f"\n{'callback':<{width}}{'requests':>9}{'req/s':>8}{'p50 ms':>9}{'p99 ms':>9}{'errors %':>10}{'503':>6}{extra}")
+    for row in rows:
+        recorded_p50 = row.get("recorded_p50_ms")
+        extra = f"{'-' if recorded_p50 is None else recorded_p50:>12}" if recorded else ""
+        print(f"{row['callback']:<{width}}{row['requests']:>9}{row['throughput_per_s']:>8}{row['p50_ms']:>9}"
+              f"{row['p99_ms']:>9}{row['error_percent']:>10}{row['rejected_503']:>6}{extra}")
+    print(f"\nPool: {json.dumps(pool)}")
+
+
+def run(args):
+    with open(args.users, encoding="utf-8") as f:
+        manifest = json.load(f)
+    accounts = manifest["users"]
+    if not accounts:
+        raise SystemExit("No users in the manifest")
+    mix = parse_mix(args.mix)
+    callbacks = load_index(args.url, args.timeout)
+
+    recorder = Recorder()
+    stop = threading.Event()
+    sampler = threading.Thread(target=_sample_pool, args=(args, callbacks, accounts[0], recorder, stop),
+                               name="PoolSampler", daemon=True)
+    sampler.start()
+
+    print(f"Running {args.concurrency} virtual users for {args.duration}s against {args.url} (mix {mix})")
+    start = time.monotonic()
+    deadline = start + args.duration
+    threads = []
+    for index, account in zip(range(args.concurrency), itertools.cycle(accounts)):
+        thread = threading.Thread(target=_user_loop, name=f"VirtualUser-{index}",
+                                  args=(index, account, args, callbacks, manifest["data_end"], mix, recorder, deadline))
+        thread.start()
+        threads.append(thread)
+        if args.ramp_up > 0:
+            time.sleep(args.ramp_up / args.concurrency)
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+    stop.set()
+    sampler.join(timeout=5)
+
+    rows, samples = recorder.report(elapsed)
+    pool = _summarize_pool(samples)
+    print_report(rows, pool)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "settings": {"url": args.url, "concurrency": args.concurrency, "duration": args.duration,
+                             "think_time": args.think_time, "mix": mix},
+                "elapsed_seconds": round(elapsed, 1),
+                "callbacks": rows,
+                "pool": pool,
+                "pool_samples": samples,
+            }, f, indent=2)
+        print(f"Report written to {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Dash callback endpoints")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    prepare = commands.add_parser("prepare", help="set passwords on a generated ledger and write the user manifest")
+    prepare.add_argument("--db", required=True)
+    prepare.add_argument("--out", required=True)
+    prepare.add_argument("--password", default=DEFAULT_PASSWORD)
+
+    run_parser = commands.add_parser("run", help="run the load against a server")
+    run_parser.add_argument("--url", default="http://127.0.0.1:8080/et/", help="app base URL including the prefix")
+    run_parser.add_argument("--users", required=True, help="manifest written by prepare")
+    run_parser.add_argument("--concurrency", type=int, default=10, help="virtual users")
+    run_parser.add_argument("--duration", type=float, default=60, help="seconds")
+    run_parser.add_argument("--ramp-up", type=float, default=5, help="seconds to start all virtual users")
+    run_parser.add_argument("--think-time", type=float, default=1.0, help="mean seconds between user actions")
+    run_parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario weights, e.g. load=1,filter=3,add=1,import=0.1")
+    run_parser.add_argument("--timeout", type=float, default=60)
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--json", help="write the full report here")
+
+    args = parser.parse_args()
+    if args.command == "prepare":
+        prepare_users(args.db, args.out, args.password)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# pragmas.py
+# Trade-off matrix of the connection PRAGMA profiles (database.PRAGMA_PROFILES):
+# for every profile in WAL and DELETE journal mode, the latency of small committed
+# writes (one transaction add per commit, as the app does) and the throughput of the
+# bench read paths from several threads sharing a pool.
+#
+#   python -m benchmarks.pragmas                        # 100k ledger, all profiles, both modes
+#   python -m benchmarks.pragmas --scale 1m --threads 8 --json pragmas.json
+#
+# Commit latency depends on the disk far more than on the CPU, run it on the
+# storage the app is deployed on.
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import threading
+import time
+
+from benchmarks.bench import BenchContext, prepare_ledger, read_cases
+from benchmarks.ledger import SCALES
+from database import ExpenseDB, PRAGMA_PROFILES
+
+DEFAULT_SCALE = "100k"
+DEFAULT_COMMITS = 200
+DEFAULT_THREADS = 4
+DEFAULT_READ_SECONDS = 5.0
+
+
+def measure_commits(ctx, count):
+    """Milliseconds per insert + commit, removed again afterwards"""
+    category_id = ctx.db.get_categories(ctx.user_id)[0][0]
+    timings = []
+    ids = []
+    for i in range(count):
+        start = time.perf_counter()
+        with ctx.db._get_cursor() as cursor:
+            cursor.execute(
+                """INSERT INTO transactions (category_id, merchant, amount, date, note, recurring, user_id)
+                VALUES (?, ?, ?, ?, ?, 0, ?)""",
+                (category_id, "Pragma Bench", 1.0 + i % 50, ctx.end_date, "pragma bench", ctx.user_id),
+            )
+            ids.append(cursor.lastrowid)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    with ctx.db._get_cursor() as cursor:
+        cursor.executemany("DELETE FROM transactions WHERE id = ?", [(row_id,) for row_id in ids])
+    return timings
+
+
+def measure_reads(ctx, threads, seconds):
+    """Read path calls per second, all threads cycling through the bench read cases"""
+    cases = list(read_cases().values())
+    for case in cases:
+        case(ctx)  # Warm up the page cache and statement caches
+    counts = [0] * threads
+    deadline = time.monotonic() + seconds
+
+    def reader(slot):
+        index = slot
+        while time.monotonic() < deadline:
+            cases[index % len(cases)](ctx)
+            index += 1
+            counts[slot] += 1
+
+    workers = [threading.Thread(target=reader, args=(slot,), name=f"PragmaReader-{slot}") for slot in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sum(counts) / (time.perf_counter() - start)
+
+
+def run_profile(source, profile, use_wal, args):
+    work_path = f"{source}.{profile}-{'wal' if use_wal else 'delete'}"
+    shutil.copyfile(source, work_path)
+    db = ExpenseDB(work_path, use_pool=True, pool_size=args.threads, enable_monitoring=False,
+                   use_wal=use_wal, pragma_profile=profile)
+    try:
+        ctx = BenchContext(db)
+        commits = measure_commits(ctx, args.commits)
+        reads_per_second = measure_reads(ctx, args.threads, args.read_seconds)
+    finally:
+        db.close_change_watcher()
+        db.close()
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            if os.path.exists(work_path + suffix):
+                os.remove(work_path + suffix)
+
+    ordered = sorted(commits)
+    return {
+        "profile": profile,
+        "journal": "WAL" if use_wal else "DELETE",
+        "commit_p50_ms": round(statistics.median(ordered), 3),
+        "commit_p99_ms": round(ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))], 3),
+        "commit_mean_ms": round(statistics.mean(ordered), 3),
+        "reads_per_s": round(reads_per_second, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the connection PRAGMA profiles")
+    parser.add_argument("--scale", default=DEFAULT_SCALE, choices=sorted(SCALES), help="ledger size to measure on")
+    parser.add_argument("--profiles", default=",".join(PRAGMA_PROFILES), help="comma separated profile names")
+    parser.add_argument("--journal", choices=["wal", "delete", "both"], default="both")
+    parser.add_argument("--commits", type=int, default=DEFAULT_COMMITS, help="single-row commits to time")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS, help="concurrent readers (and pool size)")
+    parser.add_argument("--read-seconds", type=float, default=DEFAULT_READ_SECONDS)
+    parser.add_argument("--json", help="also write the matrix to this file")
+    args = parser.parse_args()
+
+    profiles = [name.strip() for name in args.profiles.split(",") if name.strip()]
+    unknown = [name for name in profiles if name not in PRAGMA_PROFILES]
+    if unknown:
+        parser.error(f"Unknown profile(s): {', '.join(unknown)}")
+    modes = {"wal": [True], "delete": [False], "both": [True, False]}[args.journal]
+
+    source = prepare_ledger(args.scale)
+    rows = []
+    print(f"{'journal':<9}{'profile':<12}{'commit p50 ms':>15}{'commit p99 ms':>15}{'reads/s':>10}")
+    for use_wal in modes:
+        for profile in profiles:
+            row = run_profile(source, profile, use_wal, args)
+            rows.append(row)
+            print(f"{row['journal']:<9}{row['profile']:<12}{row['commit_p50_ms']:>15}"
+                  f"{row['commit_p99_ms']:>15}{row['reads_per_s']:>10}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "settings": {"scale": args.scale, "commits": args.commits, "threads": args.threads,
+                             "read_seconds": args.read_seconds},
+                "profiles": {name: PRAGMA_PROFILES[name] for name in profiles},
+                "results": rows,
+            }, f, indent=2)
+        print(f"Matrix written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
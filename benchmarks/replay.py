@@ -0,0 +1,249 @@
+# replay.py
+# Replays callback traffic recorded by trafficRecorder.py against a running server,
+# at the recorded pace or faster, and reports latency per callback the same way
+# loadtest does. Point the server at a copy of the database: replayed transaction
+# adds and CSV imports are written to it.
+#
+#   (set [Recording] enabled = True on the server being recorded, collect recordings/*.jsonl.gz)
+#   python -m benchmarks.ledger --scale 100k --out benchmarks/data/replay.db
+#   python -m benchmarks.loadtest prepare --db benchmarks/data/replay.db --out benchmarks/data/replay-users.json
+#   (point [Database] in config.ini at replay.db and start main.py)
+#   python -m benchmarks.replay --url http://127.0.0.1:8080/et/ --users benchmarks/data/replay-users.json \
+#       --speed 4 recordings/*.jsonl.gz
+#
+# Recorded users are anonymous, each one is given an account from the manifest
+# (round robin, in order of first appearance). Anonymized values are filled back in:
+# category tokens become that account's categories, uploads become a synthetic CSV
+# of the recorded row count and other hashed text becomes a placeholder string.
+# Each recorded page load gets its own random page-load id, so superseded homepage
+# callbacks are only dropped where the recorded browser tab would have dropped them.
+
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchmarks.loadtest import (BROWSER_PARALLELISM, DASH_UPDATE, PAGE_LOAD_KEY, DashClient, Recorder,
+                                 _sample_pool, _summarize_pool, load_index, print_report)
+from trafficRecorder import CATEGORY_ID_KEYS, FORMAT_VERSION
+
+LATE_WARNING = 1.0  # Seconds behind schedule before the replay reports it cannot keep up
+
+
+def read_events(paths):
+    """
+    Events of all recording files on one timeline, sorted by time
+
+    Files from different workers are aligned on their start time, so "t" of the
+    returned events is seconds since the earliest recording started.
+    """
+    files = []
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            try:
+                header = json.loads(f.readline())
+            except json.JSONDecodeError:
+                print(f"Skipping {path}: no header")
+                continue
+            if header.get("format") != "et-traffic" or header.get("version") != FORMAT_VERSION:
+                print(f"Skipping {path}: not a version {FORMAT_VERSION} traffic recording")
+                continue
+            events = []
+            try:
+                for line in f:
+                    events.append(json.loads(line))
+            except (EOFError, json.JSONDecodeError):
+                pass  # Recording still open or cut off, keep the complete lines
+            files.append((datetime.fromisoformat(header["started_at"]), events))
+
+    if not files:
+        return []
+    first = min(started_at for started_at, _ in files)
+    timeline = []
+    for started_at, events in files:
+        offset = (started_at - first).total_seconds()
+        for event in events:
+            event["t"] += offset
+            timeline.append(event)
+    timeline.sort(key=lambda event: event["t"])
+    return timeline
+
+
+def _callback_name(output):
+    """First output of the callback, "..a.b...c.d.." -> "a.b" """
+    return output.strip(".").split("...")[0] if output.startswith("..") else output
+
+
+class ReplayUser:
+    """A recorded user played by one manifest account, with its own session"""
+
+    def __init__(self, base_url, index, account, timeout):
+        self.client = DashClient(base_url, index, timeout)
+        self.account = account
+        self.executor = ThreadPoolExecutor(max_workers=BROWSER_PARALLELISM)
+        self._login_lock = threading.Lock()
+        self.logged_in = False
+        self._page_loads = {}  # Recorded page-load token -> id sent for it
+        self._page_load = uuid.uuid4().hex  # For recordings made before the id existed
+
+    def ensure_login(self):
+        with self._login_lock:
+            if not self.logged_in:
+                self.logged_in = self.client.login(self.account["username"], self.account["password"])[0]
+                if not self.logged_in:
+                    print(f"Login failed for {self.account['username']}")
+            return self.logged_in
+
+    def _category(self, token):
+        categories = self.account["categories"]
+        return categories[int(hashlib.sha256(token.encode("utf-8")).hexdigest(), 16) % len(categories)]
+
+    def _csv(self, rows):
+        lines = ["category,merchant,amount,date,note,recurring"]
+        for i in range(rows):
+            category = self.account["categories"][i % len(self.account["categories"])]
+            lines.append(f"{category['name']},Replay Import {i % 20},{10 + i % 90}.00,2025-01-01,replay,0")
+        return "data:text/csv;base64," + base64.b64encode("\n".join(lines).encode("utf-8")).decode("ascii")
+
+    def restore(self, key, value):
+        """Stand-in for an anonymized value"""
+        if key == PAGE_LOAD_KEY:
+            self._page_load = self._page_loads.setdefault(value, uuid.uuid4().hex)
+            return self._page_load
+        if isinstance(value, list):
+            return [self.restore(key, item) for item in value]
+        if isinstance(value, dict):
+            if "~category" in value:
+                category = self._category(value["~category"])
+                return category["id"] if key in CATEGORY_ID_KEYS else category["name"]
+            if "~csv_rows" in value:
+                return self._csv(value["~csv_rows"])
+            return {name: self.restore(key, item) for name, item in value.items()}
+        if isinstance(value, str) and value.startswith("~"):
+            return f"Replay {value[1:7]}"
+        return value
+
+    def _restore_items(self, items):
+        result = []
+        for item in items:
+            if isinstance(item, list):
+                result.append(self._restore_items(item))
+                continue
+            component_id = item.get("id")
+            if isinstance(component_id, dict):
+                component_id = json.dumps(component_id, sort_keys=True, separators=(",", ":"))
+            result.append(dict(item, value=self.restore(f"{component_id}.{item.get('property')}", item.get("value"))))
+        return result
+
+    def send(self, event, recorder):
+        name = _callback_name(event["o"])
+        if not self.ensure_login():
+            recorder.record(name, 401, 0.0)
+            return
+        state = self._restore_items(event["s"])
+        expected = next((callback["state"] for callback in self.client.index.callbacks
+                         if callback["output"] == event["o"]), [])
+        if len(state) < len(expected) and f"{expected[-1]['id']}.{expected[-1]['property']}" == PAGE_LOAD_KEY:
+            state.append(dict(expected[-1], value=self._page_load))  # Recorded before the homepage sent it
+        payload = {
+            "output": event["o"],
+            "outputs": event["os"],
+            "inputs": self._restore_items(event["i"]),
+            "state": state,
+            "changedPropIds": event["c"],
+        }
+        status, _, seconds = self.client.request(DASH_UPDATE, payload)
+        recorder.record(name, status, seconds)
+
+
+def replay(events, args, accounts, index, recorder):
+    """Send every event at t / speed after the start (as fast as possible with speed 0)"""
+    users = {}
+    late = 0.0
+    start = time.monotonic()
+    for event in events:
+        user = users.get(event["u"])
+        if user is None:
+            user = users[event["u"]] = ReplayUser(args.url, index, accounts[len(users) % len(accounts)], args.timeout)
+
+        if args.speed > 0:
+            delay = start + event["t"] / args.speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            elif -delay > late + LATE_WARNING:
+                late = -delay
+                print(f"Replay is {late:.1f}s behind schedule, the client cannot keep up")
+        user.executor.submit(user.send, event, recorder)
+
+    for user in users.values():
+        user.executor.shutdown(wait=True)
+    return len(users), time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded callback traffic against a server")
+    parser.add_argument("recordings", nargs="+", help="traffic-*.jsonl.gz files")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/et/", help="app base URL including the prefix")
+    parser.add_argument("--users", required=True, help="manifest written by loadtest prepare")
+    parser.add_argument("--speed", type=float, default=1.0, help="time scale, 2 = twice as fast, 0 = no waiting")
+    parser.add_argument("--limit", type=int, help="replay only the first N events")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--json", help="write the full report here")
+    args = parser.parse_args()
+
+    with open(args.users, encoding="utf-8") as f:
+        accounts = json.load(f)["users"]
+    if not accounts:
+        raise SystemExit("No users in the manifest")
+    events = read_events(args.recordings)[: args.limit]
+    if not events:
+        raise SystemExit("No events in the recordings")
+    index = load_index(args.url, args.timeout)
+
+    recorder = Recorder()
+    stop = threading.Event()
+    sampler = threading.Thread(target=_sample_pool, args=(args, index, accounts[0], recorder, stop),
+                               name="PoolSampler", daemon=True)
+    sampler.start()
+
+    span = events[-1]["t"] - events[0]["t"]
+    print(f"Replaying {len(events)} events spanning {span:.0f}s at speed {args.speed or 'max'} against {args.url}")
+    origin = events[0]["t"]
+    for event in events:
+        event["t"] -= origin
+    user_count, elapsed = replay(events, args, accounts, index, recorder)
+    stop.set()
+    sampler.join(timeout=5)
+
+    rows, samples = recorder.report(elapsed)
+    recorded = {}
+    for event in events:
+        recorded.setdefault(_callback_name(event["o"]), []).append(event["ms"])
+    for row in rows:
+        durations = sorted(recorded.get(row["callback"], []))
+        row["recorded_p50_ms"] = durations[len(durations) // 2] if durations else None
+    pool = _summarize_pool(samples)
+    print_report(rows, pool, width=44, recorded=True)
+    print(f"{user_count} recorded users replayed in {elapsed:.1f}s")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "settings": {"url": args.url, "speed": args.speed, "recordings": args.recordings,
+                             "events": len(events), "users": user_count},
+                "elapsed_seconds": round(elapsed, 1),
+                "callbacks": rows,
+                "pool": pool,
+                "pool_samples": samples,
+            }, f, indent=2)
+        print(f"Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
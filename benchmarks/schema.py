@@ -0,0 +1,101 @@
+# schema.py
+# Builds an empty database with the full schema the app expects. The base tables
+# (users, categories, transactions, ...) predate the app's own table creation
+# methods, so they are created here; everything the app creates itself at startup
+# (tags, merchants, data_changes) goes through the same ExpenseDB methods as init_db.
+
+import sqlite3
+
+from database import ExpenseDB
+
+BASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    email TEXT UNIQUE,
+    name TEXT,
+    is_active INTEGER DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    budget REAL,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    category_id INTEGER REFERENCES categories(id),
+    merchant TEXT,
+    amount REAL,
+    date TEXT,
+    note TEXT,
+    recurring INTEGER DEFAULT 0,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS recurringTransactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    trans_id INTEGER REFERENCES transactions(id) ON DELETE CASCADE,
+    category_id INTEGER REFERENCES categories(id),
+    merchant TEXT,
+    amount REAL,
+    date TEXT,
+    note TEXT,
+    recurring INTEGER DEFAULT 1,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS income (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT,
+    amount REAL,
+    date TEXT,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS net_worth_snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    snapshot_date TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    note TEXT,
+    total_assets REAL,
+    total_liabilities REAL,
+    net_worth REAL,
+    is_current INTEGER DEFAULT 0,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS net_worth_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    snapshot_id INTEGER REFERENCES net_worth_snapshots(id) ON DELETE CASCADE,
+    name TEXT,
+    type TEXT,
+    category TEXT,
+    amount REAL,
+    note TEXT
+);
+"""
+
+
+def create_schema(db_path):
+    """
+    Create every table of the app in db_path (existing tables are left alone)
+
+    Returns:
+        ExpenseDB on the new database, direct connection mode
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(BASE_SCHEMA)
+        conn.commit()
+    finally:
+        conn.close()
+
+    db = ExpenseDB(db_path, use_pool=False, enable_monitoring=False, use_wal=True)
+    db.create_tags_table()
+    db.create_data_changes_table()
+    db.create_merchants_table()
+    return db
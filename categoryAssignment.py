@@ -1,6 +1,11 @@
 import csv
 import pandas as pd
 import re
+import os
+import argparse
+import threading
+from collections import deque
+from functools import lru_cache
 
 # Define keywords per category for simple classification
 keywords = {
@@ -16,16 +21,206 @@ keywords = {
     "Health": []
 }
 
+class KeywordClassifier:
+    """
+    Multi-pattern (Aho-Corasick) matcher compiled once from a keyword table.
+
+    A description is scanned a single time no matter how many keywords there
+    are. When several categories match, the one listed first in the table wins,
+    same as the original per-category loop.
+    """
+
+    def __init__(self, keyword_table, default="Other"):
+        self.default = default
+        self.categories = list(keyword_table)
+
+        # Trie as parallel lists: goto transitions, failure links and the best
+        # (lowest) category priority that ends at each state
+        self._goto = [{}]
+        self._fail = [0]
+        self._best = [None]
+
+        for priority, keys in enumerate(keyword_table.values()):
+            for key in keys:
+                if key:
+                    self._add_pattern(key.upper(), priority)
+
+        self._build_failure_links()
+
+    def _add_pattern(self, pattern, priority):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._best.append(None)
+            state = nxt
+
+        if self._best[state] is None or priority < self._best[state]:
+            self._best[state] = priority
+
+    def _build_failure_links(self):
+        goto, fail, best = self._goto, self._fail, self._best
+
+        # Breadth first so every failure target is finished before it is used
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+
+                # Inherit matches that end at the failure state (suffix keywords)
+                inherited = best[fail[nxt]]
+                if inherited is not None and (best[nxt] is None or inherited < best[nxt]):
+                    best[nxt] = inherited
+
+    def classify(self, description):
+        """Classify a single description, returns the default when nothing matches"""
+        if not isinstance(description, str):
+            return self.default
+
+        goto, fail, best = self._goto, self._fail, self._best
+        state = 0
+        found = None
+        for ch in description.upper():
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+
+            priority = best[state]
+            if priority is not None and (found is None or priority < found):
+                found = priority
+                if found == 0:
+                    break  # Nothing can beat the first category
+
+        return self.categories[found] if found is not None else self.default
+
+    def classify_many(self, descriptions):
+        """
+        Classify a whole Series, array or iterable in one pass.
+
+        Each distinct description is scanned once, statement dumps repeat the
+        same merchant strings many times. A Series input returns a Series with
+        the same index, anything else returns a list.
+        """
+        if isinstance(descriptions, pd.Series):
+            mapping = {value: self.classify(value) for value in descriptions.unique()}
+            return descriptions.map(mapping).fillna(self.default)
+
+        cache = {}
+        results = []
+        for value in descriptions:
+            key = value if isinstance(value, str) else None
+            if key not in cache:
+                cache[key] = self.classify(key)
+            results.append(cache[key])
+        return results
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+def get_classifier():
+    """Return the shared classifier for the keywords table, compiled on first use"""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = KeywordClassifier(keywords)
+    return _classifier
+
+def merchant_key(merchant):
+    """Normalized form used to recognise the same merchant across entries"""
+    if not isinstance(merchant, str):
+        return ""
+    return " ".join(merchant.upper().split())
+
+class MerchantCategoryIndex:
+    """
+    Per-user merchant -> category frequency index learned from history.
+
+    A user's counts are loaded with one query on first lookup and then kept in
+    memory. Adds are applied incrementally with record(); edits and deletes
+    call invalidate() so the user is reloaded on the next lookup. Merchants are
+    matched by canonical name, so 'Publix #123 ATLANTA GA 06/16' learns from
+    earlier 'PUBLIX #123 ATLANTA' entries.
+
+    Args:
+        loader: Callable(user_id) returning (canonical merchant, category_id, count) rows
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._users = {}  # user_id -> {canonical merchant: {category_id: count}}
+        self._lock = threading.Lock()
+
+    def _counts_for(self, user_id):
+        counts = self._users.get(user_id)
+        if counts is not None:
+            return counts
+
+        # Query outside the lock so one user's load does not block the others
+        loaded = {}
+        for merchant, category_id, count in self._loader(user_id):
+            per_category = loaded.setdefault(merchant, {})
+            per_category[category_id] = per_category.get(category_id, 0) + count
+
+        with self._lock:
+            return self._users.setdefault(user_id, loaded)
+
+    def record(self, user_id, merchant, category_id, count=1):
+        """Apply a newly written transaction to a loaded user"""
+        self.record_many(user_id, [(merchant, category_id)], count)
+
+    def record_many(self, user_id, pairs, count=1):
+        """Apply many (merchant, category_id) writes, e.g. a CSV import"""
+        with self._lock:
+            counts = self._users.get(user_id)
+            if counts is None:
+                return  # Not loaded yet, the next lookup reads it from the database
+            for merchant, category_id in pairs:
+                if category_id is None:
+                    continue
+                per_category = counts.setdefault(canonical_merchant_name(merchant), {})
+                per_category[category_id] = per_category.get(category_id, 0) + count
+
+    def invalidate(self, user_id=None):
+        """Drop one user (or everyone) so counts are reloaded on next lookup"""
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+    def suggest(self, user_id, merchant):
+        """Most used category id for this merchant, or None if never seen"""
+        per_category = self._counts_for(user_id).get(canonical_merchant_name(merchant))
+        if not per_category:
+            return None
+        return max(per_category.items(), key=lambda item: item[1])[0]
+
+    def suggest_many(self, user_id, merchants):
+        """Suggestions for a batch of merchants, one dictionary lookup each"""
+        counts = self._counts_for(user_id)
+        suggestions = []
+        for merchant in merchants:
+            per_category = counts.get(canonical_merchant_name(merchant))
+            suggestions.append(
+                max(per_category.items(), key=lambda item: item[1])[0] if per_category else None
+            )
+        return suggestions
+
 def classify_transaction(description):
     """Classify a transaction based on keywords in its description."""
-    if not isinstance(description, str):
-        return "Other"
-    
-    desc_upper = description.upper()
-    for category, keys in keywords.items():
-        if any(key in desc_upper for key in keys):
-            return category
-    return "Other"
+    return get_classifier().classify(description)
 
 def process_transactions(input_file, output_file=None):
     """
@@ -42,67 +237,108 @@ def process_transactions(input_file, output_file=None):
     if 'merchant' not in df.columns:
         raise ValueError("CSV file must contain a 'transaction' column")
     
-    # Classify each transaction
-    df['category'] = df['merchant'].apply(classify_transaction)
+    # Classify all transactions in one pass
+    df['category'] = get_classifier().classify_many(df['merchant'])
     
     # Save the results
     df.to_csv(output_file, index=False)
     print(f"Processed transactions saved to {output_file}")
     return df
 
+# US state abbreviations recognised at the end of statement descriptions
+US_STATES = ['AL','AK','AZ','AR','CA','CO','CT','DE','FL','GA','HI','ID','IL','IN',
+             'IA','KS','KY','LA','ME','MD','MA','MI','MN','MS','MO','MT','NE','NV',
+             'NH','NJ','NM','NY','NC','ND','OH','OK','OR','PA','RI','SC','SD','TN',
+             'TX','UT','VT','VA','WA','WV','WI','WY']
+
+class MerchantCleaner:
+    """
+    Precompiled merchant/state extraction for bank statement descriptions.
+
+    Works on whole Series with vectorized string operations, and only on the
+    distinct descriptions, the results are mapped back onto every row.
+    """
+
+    # Payments that are not merchant spending, dropped from the output
+    SKIP_PATTERN = re.compile(r'Zelle payment|INTEREST PAYMENT|APPLECARD GSBANK PAYMENT')
+
+    # All noise removed in a single pass
+    NOISE_PATTERN = re.compile(
+        r'\s\d{1,2}/\d{1,2}(?:/\d{2,4})?\s*$'  # Trailing dates (06/16, 06/16/23)
+        r'|\b\d{3}-\d{3}-\d{4}\b'            # Phone numbers
+        r'|\b\d{10,}\b'                      # Long reference numbers
+        r'|\bWEB ID:.*$'                      # Web IDs
+        r'|\bYen.*$'                          # Currency conversions
+        r'|\bgosq\.com\b'                     # Website references
+    )
+
+    # Everything before the last standalone state code is the merchant
+    STATE_PATTERN = re.compile(
+        r'^(?P<Merchant>.*)\s(?P<State>' + '|'.join(US_STATES) + r')\b'
+    )
+
+    SPACE_PATTERN = re.compile(r'\s+')
+    PREFIX_PATTERN = re.compile(r'^\*?(?:\w\*)?')  # Leading * and patterns like U*
+
+    def clean(self, descriptions):
+        """Return a DataFrame with Merchant and State columns aligned to the input"""
+        unique_values = pd.Series(descriptions.dropna().unique(), dtype=object)
+        cleaned = self._clean_unique(unique_values.astype('string'))
+        cleaned.index = unique_values
+
+        return pd.DataFrame(
+            {
+                'Merchant': descriptions.map(cleaned['Merchant']),
+                'State': descriptions.map(cleaned['State']),
+            },
+            index=descriptions.index,
+        )
+
+    def _clean_unique(self, text):
+        skip = text.str.contains(self.SKIP_PATTERN, na=True)
+
+        text = text.str.replace(self.NOISE_PATTERN, '', regex=True)
+        parts = text.str.extract(self.STATE_PATTERN)
+        has_state = parts['State'].notna()
+
+        merchant = parts['Merchant'].where(has_state, text)
+        merchant = merchant.str.replace(self.SPACE_PATTERN, ' ', regex=True).str.strip()
+        merchant = merchant.where(
+            ~has_state,
+            merchant.str.replace(self.PREFIX_PATTERN, '', regex=True).str.strip(),
+        )
+
+        result = pd.DataFrame({'Merchant': merchant, 'State': parts['State']})
+        result[skip] = None
+        return result.reset_index(drop=True)
+
+@lru_cache(maxsize=65536)
+def canonical_merchant_name(raw):
+    """
+    Canonical merchant name for a raw descriptor, e.g. 'Publix #123 ATLANTA GA 06/16'
+    and 'publix  #123 atlanta' both give 'PUBLIX #123 ATLANTA'. Cached since
+    descriptors repeat a lot.
+    """
+    if not isinstance(raw, str):
+        return ""
+
+    text = MerchantCleaner.NOISE_PATTERN.sub('', raw)
+    match = MerchantCleaner.STATE_PATTERN.search(text)
+    if match:
+        text = MerchantCleaner.SPACE_PATTERN.sub(' ', match.group('Merchant')).strip()
+        text = MerchantCleaner.PREFIX_PATTERN.sub('', text)
+
+    return merchant_key(text) or merchant_key(raw)
+
 def clean_merchant_data(input_file, output_file):
+    """Clean a whole statement file in memory and return the result"""
     # Read the CSV file (assuming first row is header)
     df = pd.read_csv(input_file)
     
     # Get the column name for the description column (assuming it's the second column)
     desc_col = df.columns[1]
     
-    # Function to extract merchant and state
-    def extract_merchant_state(text):
-        # Skip if it's a Zelle payment or similar
-        if pd.isna(text) or 'Zelle payment' in text or 'INTEREST PAYMENT' in text or 'APPLECARD GSBANK PAYMENT' in text:
-            return None, None
-        
-        # Remove dates (patterns like 06/16, 06/16/23, etc.)
-        text = re.sub(r'\s\d{1,2}/\d{1,2}(/\d{2,4})?\s*$', '', text)
-        
-        # Remove reference numbers, phone numbers, and other patterns
-        text = re.sub(r'\b\d{3}-\d{3}-\d{4}\b', '', text)  # Phone numbers
-        text = re.sub(r'\b\d{10,}\b', '', text)  # Long numbers
-        text = re.sub(r'\bWEB ID:.*$', '', text)  # Web IDs
-        text = re.sub(r'\bYen.*$', '', text)  # Currency conversions
-        text = re.sub(r'\bgosq\.com\b', '', text)  # Website references
-        
-        # Extract state (last 2 letters that match US state abbreviations)
-        states = ['AL','AK','AZ','AR','CA','CO','CT','DE','FL','GA','HI','ID','IL','IN',
-                 'IA','KS','KY','LA','ME','MD','MA','MI','MN','MS','MO','MT','NE','NV',
-                 'NH','NJ','NM','NY','NC','ND','OH','OK','OR','PA','RI','SC','SD','TN',
-                 'TX','UT','VT','VA','WA','WV','WI','WY']
-        
-        # Find state in the text
-        state = None
-        for s in states:
-            if f' {s}' in text:
-                state = s
-                break
-        
-        # If state found, extract merchant name
-        if state:
-            merchant = text[:text.rfind(state)].strip()
-            # Clean up merchant name
-            merchant = re.sub(r'\s+', ' ', merchant)  # Remove extra spaces
-            merchant = re.sub(r'^\*', '', merchant)  # Remove leading *
-            merchant = re.sub(r'^\w\*', '', merchant)  # Remove patterns like UBR*
-            merchant = merchant.strip()
-            return merchant, state
-        else:
-            # For entries without state, try to extract meaningful merchant name
-            merchant = re.sub(r'\s+', ' ', text).strip()
-            return merchant, None
-    
-    # Apply the function to the description column
-    df[['Merchant', 'State']] = df[desc_col].apply(
-        lambda x: pd.Series(extract_merchant_state(x)))
+    df[['Merchant', 'State']] = MerchantCleaner().clean(df[desc_col])
     
     # Drop rows where both Merchant and State are None
     df = df.dropna(subset=['Merchant', 'State'], how='all')
@@ -112,7 +348,59 @@ def clean_merchant_data(input_file, output_file):
     
     return df
 
+def clean_merchant_file(input_file, output_file, chunksize=50000, desc_col=None):
+    """
+    Stream a statement file through the cleaner chunk by chunk.
+
+    Memory stays bounded by chunksize regardless of file size. Writing over
+    the input file goes through a temporary file that replaces it at the end.
+
+    Returns:
+        Number of rows written
+    """
+    cleaner = MerchantCleaner()
+    in_place = os.path.abspath(input_file) == os.path.abspath(output_file)
+    target = output_file + '.tmp' if in_place else output_file
+
+    written = 0
+    header = True
+    for chunk in pd.read_csv(input_file, chunksize=chunksize):
+        column = desc_col or chunk.columns[1]
+        chunk[['Merchant', 'State']] = cleaner.clean(chunk[column])
+        chunk = chunk.dropna(subset=['Merchant', 'State'], how='all')
+
+        chunk.to_csv(target, index=False, header=header, mode='w' if header else 'a')
+        header = False
+        written += len(chunk)
+
+    if in_place:
+        os.replace(target, output_file)
+
+    return written
+
+def main(argv=None):
+    """Command line entry point: clean or classify statement CSV files"""
+    parser = argparse.ArgumentParser(description="Clean and categorize bank statement CSV files")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    clean_parser = subparsers.add_parser("clean", help="Extract merchant and state from descriptions")
+    clean_parser.add_argument("input_file")
+    clean_parser.add_argument("output_file")
+    clean_parser.add_argument("--chunksize", type=int, default=50000, help="Rows processed per chunk")
+    clean_parser.add_argument("--column", default=None, help="Description column (default: second column)")
+
+    classify_parser = subparsers.add_parser("classify", help="Assign categories from merchant keywords")
+    classify_parser.add_argument("input_file")
+    classify_parser.add_argument("output_file", nargs="?", default=None)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "clean":
+        written = clean_merchant_file(args.input_file, args.output_file, args.chunksize, args.column)
+        print(f"Cleaned {written} rows into {args.output_file}")
+    else:
+        process_transactions(args.input_file, args.output_file)
 
-process_transactions('transactions.csv')
 
-#clean_merchant_data('transactions.csv', 'transactions.csv')
\ No newline at end of file
+if __name__ == "__main__":
+    main()
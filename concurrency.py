@@ -0,0 +1,210 @@
+# concurrency.py
+# Sizes Waitress threads and the SQLite pool from one [Server] config section, and
+# admits Dash callback requests through a bounded slot count. When every slot is busy
+# for longer than the admission budget the request gets a fast 503 instead of a
+# Waitress thread blocking on pool checkout. Login and register callbacks, which
+# block on a password hash, have their own smaller set of slots.
+
+import threading
+import time
+from dataclasses import dataclass
+
+from flask import Response, g, request
+
+import tracing
+
+DASH_CALLBACK_SUFFIX = "_dash-update-component"
+AUTH_OUTPUTS = ("login-message.children", "register-message.children")  # Callbacks that hash a password
+
+
+@dataclass
+class ConcurrencyConfig:
+    """Processes, threads, pool and admission limits that have to agree with each other"""
+    workers: int                # Serving processes sharing the port
+    threads: int                # Waitress worker threads per process
+    pool_size: int              # SQLite connections per process
+    max_active_callbacks: int   # Dash callbacks running at once
+    admission_timeout: float    # Seconds a callback may wait for a slot before a 503
+    checkout_timeout: float     # Seconds an admitted request may wait for a connection
+    max_auth_callbacks: int = 1  # Login/register callbacks running at once, outside the slots above
+
+    @classmethod
+    def from_config(cls, config, cpu_count=None):
+        """
+        Read [Server], falling back to the older [ConnectionPool] pool_size
+
+        Defaults split the cores between worker processes and keep one connection per
+        running callback. The spare threads go to login/register callbacks, which have
+        their own admission slots (max_auth_callbacks), and one is left so pages and
+        static assets are still served while dashboard callbacks queue.
+        """
+        section = "Server"
+        workers = max(1, config.getint(section, "workers", fallback=1))
+
+        pool_size = config.getint(section, "pool_size", fallback=0)
+        if pool_size < 1:
+            if cpu_count:
+                pool_size = max(2, cpu_count // workers)
+            else:
+                pool_size = config.getint("ConnectionPool", "pool_size", fallback=8)
+
+        threads = config.getint(section, "threads", fallback=0)
+        if threads < 1:
+            threads = pool_size + 3  # Two for logins, one for pages and static files
+
+        max_active = config.getint(section, "max_active_callbacks", fallback=0)
+        if max_active < 1:
+            max_active = pool_size
+        max_active = min(max_active, threads)
+
+        # Logins wait on a password hash; keep them to the threads the dashboards leave
+        # free, minus one so pages and static files are still served during a burst
+        max_auth = config.getint(section, "max_auth_callbacks", fallback=0)
+        if max_auth < 1:
+            max_auth = max(1, threads - max_active - 1)
+
+        settings = cls(
+            workers=workers,
+            threads=threads,
+            pool_size=pool_size,
+            max_active_callbacks=max_active,
+            admission_timeout=config.getfloat(section, "admission_timeout", fallback=1.0),
+            checkout_timeout=config.getfloat(section, "checkout_timeout", fallback=5.0),
+            max_auth_callbacks=max_auth,
+        )
+        settings.validate()
+        return settings
+
+    def validate(self):
+        if self.pool_size < 1 or self.threads < 1 or self.max_active_callbacks < 1 or self.max_auth_callbacks < 1:
+            raise ValueError("Invalid [Server] settings in config.ini, sizes must be at least 1")
+        if self.max_active_callbacks > self.pool_size:
+            print(f"Warning: {self.max_active_callbacks} concurrent callbacks share {self.pool_size} "
+                  f"connections, callbacks may wait on pool checkout")
+        if self.max_active_callbacks + self.max_auth_callbacks >= self.threads:
+            print(f"Warning: {self.max_active_callbacks} callbacks and {self.max_auth_callbacks} logins can "
+                  f"occupy all {self.threads} threads, pages may stall during a login burst")
+
+    def hashing_limits(self, workers, max_pending):
+        """
+        Password hashing workers and backlog that fit the login slots
+
+        A login blocks its request thread until its hash is done, so hashes running
+        or queued never need to exceed max_auth_callbacks.
+        """
+        workers = max(1, min(workers, self.max_auth_callbacks))
+        return workers, max(0, min(max_pending, self.max_auth_callbacks - workers))
+
+
+def _dash_output():
+    """Output string of the Dash callback being requested, "" if there is none"""
+    body = request.get_json(silent=True)
+    return str(body.get("output", "")) if isinstance(body, dict) else ""
+
+
+class AdmissionController:
+    def __init__(self, max_active, timeout, path_suffix=DASH_CALLBACK_SUFFIX, outputs=None, exclude_outputs=(),
+                 name="callbacks"):
+        """
+        Args:
+            max_active: callback requests allowed to run at once
+            timeout: seconds a request may wait for a slot before it is rejected
+            path_suffix: request paths that go through admission
+            outputs: only callbacks with one of these outputs go through admission (None = all)
+            exclude_outputs: callbacks with one of these outputs skip admission
+            name: tells controllers apart when more than one is registered
+        """
+        self.max_active = max_active
+        self.timeout = timeout
+        self.path_suffix = path_suffix
+        self.outputs = set(outputs) if outputs is not None else None
+        self.exclude_outputs = set(exclude_outputs)
+        self.name = name
+        self._slot_key = f"_admission_slot_{name}"
+        self._slots = threading.BoundedSemaphore(max_active)
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.admitted = 0
+        self.rejected = 0
+        self.active = 0
+        self.waiting = 0
+        self.peak_active = 0
+        self.peak_waiting = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_rejection = None
+
+    def init_app(self, server):
+        server.before_request(self._before_request)
+        server.teardown_request(self._teardown_request)
+
+    def _applies(self):
+        if not request.path.endswith(self.path_suffix):
+            return False
+        if self.outputs is None and not self.exclude_outputs:
+            return True
+        output = _dash_output()
+        if self.outputs is not None and output not in self.outputs:
+            return False
+        return output not in self.exclude_outputs
+
+    def _before_request(self):
+        if not self._applies():
+            return None
+
+        start = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+            self.peak_waiting = max(self.peak_waiting, self.waiting)
+
+        with tracing.span("admission wait", "server", gate=self.name):
+            acquired = self._slots.acquire(timeout=self.timeout)
+        waited = time.perf_counter() - start
+
+        with self._lock:
+            self.waiting -= 1
+            if not acquired:
+                self.rejected += 1
+                self.last_rejection = time.time()
+            else:
+                self.admitted += 1
+                self.active += 1
+                self.peak_active = max(self.peak_active, self.active)
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+
+        if not acquired:
+            return Response(
+                '{"message": "Server busy, please retry"}',
+                status=503,
+                mimetype="application/json",
+                headers={"Retry-After": "1"},
+            )
+
+        setattr(g, self._slot_key, True)
+        return None
+
+    def _teardown_request(self, exc=None):
+        if g.pop(self._slot_key, None):
+            with self._lock:
+                self.active -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            total = self.admitted + self.rejected
+            return {
+                "max_active": self.max_active,
+                "timeout": self.timeout,
+                "active": self.active,
+                "waiting": self.waiting,
+                "peak_active": self.peak_active,
+                "peak_waiting": self.peak_waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "rejection_percent": round(self.rejected / total * 100, 2) if total else 0.0,
+                "average_wait_ms": round(self.total_wait / self.admitted * 1000, 2) if self.admitted else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+                "last_rejection": self.last_rejection,
+            }
@@ -9,11 +9,98 @@ import os
 # Pool monitoring imports
 import threading
 import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from dataclasses import dataclass
 from typing import Dict, List, Optional
 import json
 
+from categoryAssignment import canonical_merchant_name
+import perfMonitor
+import staleRequests
+import tracing
+
+# Session users (Flask-Login user_loader) are re-read from the database at most this often
+SESSION_USER_CACHE_TTL = 60  # seconds
+SESSION_USER_CACHE_SIZE = 10000
+
+# Raw merchant descriptor -> merchant id, least recently used entries dropped first
+MERCHANT_ID_CACHE_SIZE = 100000
+
+# Change counters (data_changes table), shared by all worker processes
+DATA_SCOPE = "data"     # Transactions, categories, income, net worth of a user
+USER_SCOPE = "user"     # The users row itself (profile, password, active flag)
+DATA_VERSION_POLL_INTERVAL = 0.25  # seconds between PRAGMA data_version checks
+
+# Connection PRAGMA profiles, picked with [ConnectionPool] pragma_profile
+# (benchmarks/pragmas.py measures commit latency and read throughput of each)
+# - safe: fsync on every commit in both journal modes, small cache (the original settings)
+# - balanced: NORMAL sync under WAL, which cannot corrupt the database, only lose the
+#   last commits on power loss; FULL stays for DELETE mode. Bigger cache, memory-mapped reads
+# - throughput: NORMAL sync in both modes and the largest cache and map, a power loss
+#   in DELETE mode can corrupt the file
+PRAGMA_PROFILES = {
+    "safe": {
+        "synchronous_wal": "FULL", "synchronous_delete": "FULL", "wal_autocheckpoint": 500,
+        "cache_size": -2000, "mmap_size": 0, "temp_store": "DEFAULT",
+    },
+    "balanced": {
+        "synchronous_wal": "NORMAL", "synchronous_delete": "FULL", "wal_autocheckpoint": 500,
+        "cache_size": -16000, "mmap_size": 64 * 1024 * 1024, "temp_store": "MEMORY",
+    },
+    "throughput": {
+        "synchronous_wal": "NORMAL", "synchronous_delete": "NORMAL", "wal_autocheckpoint": 1000,
+        "cache_size": -64000, "mmap_size": 256 * 1024 * 1024, "temp_store": "MEMORY",
+    },
+}
+DEFAULT_PRAGMA_PROFILE = "safe"
+
+def _apply_pragmas(conn, use_wal, profile=DEFAULT_PRAGMA_PROFILE):
+    """Journal mode and the profile's PRAGMAs, for pooled and direct connections alike"""
+    if profile not in PRAGMA_PROFILES:
+        raise ValueError(f"Unknown pragma profile {profile!r}, expected one of {', '.join(PRAGMA_PROFILES)}")
+    settings = PRAGMA_PROFILES[profile]
+
+    if use_wal:
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA wal_autocheckpoint={settings["wal_autocheckpoint"]}')
+        conn.execute(f'PRAGMA synchronous={settings["synchronous_wal"]}')
+    else:
+        # DELETE mode is more Docker-friendly
+        conn.execute('PRAGMA journal_mode=DELETE')
+        conn.execute(f'PRAGMA synchronous={settings["synchronous_delete"]}')
+
+    conn.execute(f'PRAGMA cache_size={settings["cache_size"]}')  # Negative = KiB
+    conn.execute(f'PRAGMA mmap_size={settings["mmap_size"]}')
+    conn.execute(f'PRAGMA temp_store={settings["temp_store"]}')
+    conn.execute('PRAGMA foreign_keys=ON')
+
+# Query time budgets, enforced with a progress handler on the connection
+PROGRESS_HANDLER_STEPS = 10000  # SQLite VM instructions between deadline checks (well under a millisecond)
+_DEFAULT_BUDGET = object()      # _get_cursor(budget=...) not given, use the database's query budget
+
+class QueryTimeoutError(Exception):
+    """A query ran past its time budget and was aborted, its transaction was rolled back"""
+
+    def __init__(self, budget):
+        self.budget = budget
+        super().__init__(f"The query took longer than {budget:g}s and was stopped. Try a shorter date range.")
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor handed out while a request is traced, each statement becomes a span"""
+    # execute() covers preparing and stepping to the first row, later fetches are not timed
+    def execute(self, sql, parameters=()):
+        with tracing.span("sql", "sqlite", statement=sql):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        with tracing.span("sql many", "sqlite", statement=sql):
+            return super().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        with tracing.span("sql script", "sqlite", statement=sql_script):
+            return super().executescript(sql_script)
+
 @dataclass
 class ConnectionStats:
     """Statistics for a single connection"""
@@ -40,9 +127,12 @@ class PoolMetrics:
 
 # Initialize SQLite connection pool class
 class SQLiteConnectionPool:
-    def __init__(self, db_path, pool_size=8, enable_monitoring=True, use_wal = True):
+    def __init__(self, db_path, pool_size=8, enable_monitoring=True, use_wal = True, checkout_timeout=10.0,
+                 pragma_profile=DEFAULT_PRAGMA_PROFILE):
                 self.db_path = db_path
+                self.pragma_profile = pragma_profile
                 self.pool_size = pool_size
+                self.checkout_timeout = checkout_timeout  # Default wait for a free connection
                 self.pool = Queue(maxsize=pool_size)
                 self.use_wal = use_wal
                 self.enable_monitoring = enable_monitoring
@@ -87,24 +177,11 @@ class SQLiteConnectionPool:
             timeout=30.0
         )
         
-        # Docker-friendly settings
-        if self.use_wal:
-            # Use WAL but with proper checkpoint settings
-            conn.execute('PRAGMA journal_mode=WAL')
-            # More aggressive auto-checkpoint (default is 1000)
-            conn.execute('PRAGMA wal_autocheckpoint=500')
-        else:
-            # Alternative: Use DELETE mode which is more Docker-friendly
-            conn.execute('PRAGMA journal_mode=DELETE')
-        
-        # Use FULL synchronous for data safety in Docker
-        conn.execute('PRAGMA synchronous=FULL')
-        
-        # Reduce cache size to force more frequent disk writes
-        conn.execute('PRAGMA cache_size=-2000')  # 2MB cache
-        
-        # Enable foreign keys
-        conn.execute('PRAGMA foreign_keys=ON')
+        _apply_pragmas(conn, self.use_wal, self.pragma_profile)
+
+        # Count statements per callback for the perf page
+        if perfMonitor.enabled:
+            conn.set_trace_callback(perfMonitor.record_sql)
         
         return conn
     
@@ -128,7 +205,9 @@ class SQLiteConnectionPool:
             print(f"Error during WAL checkpoint: {e}")
 
     @contextmanager
-    def get_connection(self, timeout=10.0):
+    def get_connection(self, timeout=None):
+        if timeout is None:
+            timeout = self.checkout_timeout
         checkout_start = time.time()
         conn = None
         
@@ -139,7 +218,8 @@ class SQLiteConnectionPool:
             
             # Try to get connection with timeout
             try:
-                conn = self.pool.get(timeout=timeout)
+                with tracing.span("pool checkout", "sqlite"):
+                    conn = self.pool.get(timeout=timeout)
             except Empty:
                 if self.enable_monitoring:
                     with self._lock:
@@ -147,6 +227,7 @@ class SQLiteConnectionPool:
                 raise TimeoutError(f"Could not get connection within {timeout} seconds")
             
             checkout_time = time.time() - checkout_start
+            perfMonitor.record_pool_wait(checkout_time)
             
             if self.enable_monitoring:
                 self._update_checkout_stats(conn, checkout_time)
@@ -155,6 +236,7 @@ class SQLiteConnectionPool:
             
         finally:
             if conn:
+                perfMonitor.record_pool_hold(time.time() - checkout_start - checkout_time)
                 if self.enable_monitoring:
                     self._update_checkin_stats(conn)
                 self.pool.put(conn)
@@ -386,7 +468,8 @@ class SQLiteConnectionPool:
 # --- Database class ---
 class ExpenseDB:
     
-    def __init__(self, db_path, use_pool = True, pool_size=8, enable_monitoring=True, use_wal=True):
+    def __init__(self, db_path, use_pool = True, pool_size=8, enable_monitoring=True, use_wal=True, checkout_timeout=10.0,
+                 pragma_profile=DEFAULT_PRAGMA_PROFILE, query_budget=None):
         """
         Initialize ExpenseDB with Docker-friendly options
         
@@ -396,23 +479,57 @@ class ExpenseDB:
             enable_monitoring: Enable pool statistics
             use_wal: Use WAL mode (set False for better Docker compatibility)
             use_pool: Use connection pooling (default True)
+            checkout_timeout: Seconds to wait for a pooled connection before TimeoutError
+            pragma_profile: Name from PRAGMA_PROFILES
+            query_budget: Seconds a _get_cursor block may spend in SQLite before QueryTimeoutError (None = no limit)
         """
         self.db_path = db_path
+        self.pragma_profile = pragma_profile
+        self.query_budget = query_budget or None
+        self.query_timeouts = 0  # Queries aborted for running past their budget
+        self._query_timeout_lock = threading.Lock()
         self.use_pool = use_pool
         self.use_wal = use_wal
 
+        # (user_id, raw merchant) -> merchant id, only filled after commit
+        self._merchant_ids: "OrderedDict[tuple, int]" = OrderedDict()
+        self._merchant_lock = threading.Lock()
+
+        # user_id -> (expires_at, session user row) for the Flask-Login user_loader
+        self._session_users: Dict[int, tuple] = {}
+        self._session_user_lock = threading.Lock()
+
+        # user_id -> data version, bumped on every write that changes what the graphs show
+        self._data_versions: Dict[int, int] = {}
+        self._user_versions: Dict[int, int] = {}  # user_id -> version of the users row
+        self._data_version_lock = threading.Lock()
+        self._data_change_listeners = []
+
+        # Dedicated connection that watches PRAGMA data_version for commits by other connections
+        self._change_conn = None
+        self._change_watch_lock = threading.Lock()
+        self._seen_data_version = None
+        self._last_change_poll = 0.0
+
         if use_pool:
             self.pool = SQLiteConnectionPool(
                 db_path, 
                 pool_size, 
                 enable_monitoring,
-                use_wal=use_wal
+                use_wal=use_wal,
+                checkout_timeout=checkout_timeout,
+                pragma_profile=pragma_profile
             )
-            self._direct_conn = None
         else:
             self.pool = None
-            # Create a single direct connection
-            self._direct_conn = self._create_direct_connection(use_wal)
+
+        # Direct mode: one connection per thread, opened on first use and never shared,
+        # so concurrent callbacks neither wait on a pool nor interleave on one connection
+        self._thread_local = threading.local()
+        self._thread_conns: Dict[threading.Thread, sqlite3.Connection] = {}  # For reaping and close()
+        self._thread_conns_lock = threading.Lock()
+        if not use_pool:
+            self._direct_connection()  # Fail at startup, not on the first callback, if the file cannot be opened
 
     # --- User Management Methods ---
     def create_user(self, username, password_hash, email=None, name=None):
@@ -449,6 +566,44 @@ class ExpenseDB:
             )
             return cursor.fetchone()
 
+    def get_session_user(self, user_id):
+        """
+        User row for request authentication, served from a short-lived in-process cache
+
+        Returns:
+            (id, username, email, name, is_active) or None; no password hash is cached
+        """
+        self._sync_data_changes()
+
+        now = time.monotonic()
+        with self._session_user_lock:
+            entry = self._session_users.get(user_id)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                """SELECT id, username, email, name, is_active 
+                FROM users WHERE id = ?""",
+                (user_id,),
+            )
+            row = cursor.fetchone()
+
+        # Unknown ids are not cached, ids are never reused
+        if row is not None:
+            with self._session_user_lock:
+                if len(self._session_users) > SESSION_USER_CACHE_SIZE:
+                    self._session_users.clear()
+                self._session_users[user_id] = (now + SESSION_USER_CACHE_TTL, row)
+        return row
+
+    def invalidate_session_user(self, user_id=None):
+        """Drop a cached session user (or all of them) so the next request reloads it"""
+        with self._session_user_lock:
+            if user_id is None:
+                self._session_users.clear()
+            else:
+                self._session_users.pop(user_id, None)
 
     def update_user(self, user_id, **kwargs):
         """Update user information"""
@@ -463,7 +618,21 @@ class ExpenseDB:
 
         with self._get_cursor() as cursor:
             cursor.execute(f"UPDATE users SET {set_clause} WHERE id = ?", values)
-            return cursor.rowcount > 0
+            updated = cursor.rowcount > 0
+
+        self._bump_change_counter(USER_SCOPE, user_id)
+        self.invalidate_session_user(user_id)
+        return updated
+
+    def set_user_active(self, user_id, is_active):
+        """Activate or deactivate a user, takes effect on their next request"""
+        with self._get_cursor() as cursor:
+            cursor.execute("UPDATE users SET is_active = ? WHERE id = ?", (int(bool(is_active)), user_id))
+            updated = cursor.rowcount > 0
+
+        self._bump_change_counter(USER_SCOPE, user_id)
+        self.invalidate_session_user(user_id)
+        return updated
     # ---------------------------------------------------------
 
     # --- Checkpoint Methods ---
@@ -473,53 +642,119 @@ class ExpenseDB:
             self.pool.checkpoint_wal()
         else:
             try:
-                result = self._direct_conn.execute('PRAGMA wal_checkpoint(RESTART)').fetchone()
+                conn = self._direct_connection()
+                result = conn.execute('PRAGMA wal_checkpoint(RESTART)').fetchone()
                 if result:
                     print(f"WAL Checkpoint complete: {result}")
-                self._direct_conn.commit()
+                conn.commit()
             except Exception as e:
                 print(f"Error during WAL checkpoint: {e}")
 
     @contextmanager
-    def _get_cursor(self):
+    def _get_cursor(self, budget=_DEFAULT_BUDGET):
+        """
+        Cursor committed on success and rolled back on error
+
+        Args:
+            budget: seconds the block may spend in SQLite, defaults to the query budget (None = no limit).
+                Schema setup, backfills and bulk writes pass None, the budget is for request-path reads
+        """
+        if budget is _DEFAULT_BUDGET:
+            budget = self.query_budget
         if self.use_pool:
             # Use connection pool
             with self.pool.get_connection() as conn:
-                cursor = conn.cursor()
+                cursor = conn.cursor(TracedCursor) if tracing.is_tracing() else conn.cursor()
                 try:
-                    yield cursor
+                    with self._query_guard(conn, budget):
+                        yield cursor
                     conn.commit()
                 except:
                     conn.rollback()
                     raise
         else:
-            # Use direct connection
-            cursor = self._direct_conn.cursor()
+            # Use this thread's direct connection
+            conn = self._direct_connection()
+            cursor = conn.cursor(TracedCursor) if tracing.is_tracing() else conn.cursor()
             try:
-                yield cursor
-                self._direct_conn.commit()
+                with self._query_guard(conn, budget):
+                    yield cursor
+                conn.commit()
             except:
-                self._direct_conn.rollback()
+                conn.rollback()
                 raise
 
+    @contextmanager
+    def _query_guard(self, conn, budget):
+        """
+        Abort the statements run on conn once budget seconds have passed, or once
+        the callback running on this thread has been superseded by a newer request
+        """
+        cancellable = staleRequests.is_tracked()
+        if not budget and not cancellable:
+            yield
+            return
+
+        deadline = time.monotonic() + budget if budget else None
+        stopped = []
+
+        def check():
+            if deadline is not None and time.monotonic() > deadline:
+                stopped.append("timeout")
+                return 1  # Non-zero interrupts the running statement
+            if cancellable and staleRequests.is_stale():
+                stopped.append("stale")
+                return 1
+            return 0
+
+        conn.set_progress_handler(check, PROGRESS_HANDLER_STEPS)
+        try:
+            yield
+        except sqlite3.OperationalError as e:
+            if not stopped:
+                raise
+            if stopped[0] == "stale":
+                raise staleRequests.StaleRequestError() from e
+            with self._query_timeout_lock:
+                self.query_timeouts += 1
+            perfMonitor.record_query_timeout()
+            print(f"Query stopped after its {budget:g}s budget: {e}")
+            raise QueryTimeoutError(budget) from e
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    def _direct_connection(self):
+        """The calling thread's direct connection, created on first use"""
+        conn = getattr(self._thread_local, "conn", None)
+        if conn is not None:
+            return conn
+
+        conn = self._create_direct_connection(self.use_wal)
+        thread = threading.current_thread()
+        with self._thread_conns_lock:
+            # Threads that exited since the last new connection leave theirs behind
+            for dead in [t for t in self._thread_conns if not t.is_alive()]:
+                try:
+                    self._thread_conns.pop(dead).close()
+                except sqlite3.Error as e:
+                    print(f"Error closing connection of finished thread {dead.name}: {e}")
+            self._thread_conns[thread] = conn
+        self._thread_local.conn = conn
+        return conn
+
     def _create_direct_connection(self, use_wal=True):
-        """Create a single direct connection (non-pooled)"""
+        """Create a direct connection (non-pooled) for one thread"""
         conn = sqlite3.connect(
             self.db_path, 
-            check_same_thread=False,
+            check_same_thread=False,  # Only its own thread uses it, but close() and reaping run elsewhere
             timeout=30.0
         )
         
-        # Apply same settings as pooled connections
-        if use_wal:
-            conn.execute('PRAGMA journal_mode=WAL')
-            conn.execute('PRAGMA wal_autocheckpoint=500')
-        else:
-            conn.execute('PRAGMA journal_mode=DELETE')
-        
-        conn.execute('PRAGMA synchronous=FULL')
-        conn.execute('PRAGMA cache_size=-2000')
-        conn.execute('PRAGMA foreign_keys=ON')
+        # Same settings as pooled connections
+        _apply_pragmas(conn, use_wal, self.pragma_profile)
+
+        if perfMonitor.enabled:
+            conn.set_trace_callback(perfMonitor.record_sql)
         
         return conn
 
@@ -535,7 +770,9 @@ class ExpenseDB:
         if self.use_pool:
             return self.pool.get_pool_health()
         else:
-            return {"status": "DIRECT_MODE", "note": "Not using connection pool"}
+            with self._thread_conns_lock:
+                open_connections = len(self._thread_conns)
+            return {"status": "DIRECT_MODE", "note": "Not using connection pool", "thread_connections": open_connections}
     
     def print_pool_stats(self):
         """Convenience method to print pool statistics"""
@@ -557,7 +794,7 @@ class ExpenseDB:
     #Tags table and indexes creation method, use if missing
     def create_tags_table(self):
         
-        with self._get_cursor() as cursor:
+        with self._get_cursor(budget=None) as cursor:
             cursor.execute("""
                     CREATE TABLE IF NOT EXISTS tags (
                         tag_id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -657,6 +894,340 @@ class ExpenseDB:
             cursor.execute(query, params)
             return cursor.fetchall()  
 
+    # ------------------------------------------------------
+
+    # --------------- Merchants ----------------------------
+    # Merchant dimension: canonical merchants per user plus the raw descriptors
+    # (as typed or imported) that map onto them. Transactions reference merchants
+    # by id so per-merchant aggregation is an integer GROUP BY
+    def create_merchants_table(self):
+
+        with self._get_cursor(budget=None) as cursor:
+            cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS merchants (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        user_id INTEGER NOT NULL,
+                        name TEXT NOT NULL,
+                        date_created TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        UNIQUE (user_id, name),
+                        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+                    )
+                """)
+
+            cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS merchant_aliases (
+                        user_id INTEGER NOT NULL,
+                        raw_name TEXT NOT NULL,
+                        merchant_id INTEGER NOT NULL,
+                        PRIMARY KEY (user_id, raw_name),
+                        FOREIGN KEY (merchant_id) REFERENCES merchants(id) ON DELETE CASCADE
+                    ) WITHOUT ROWID
+                """)
+
+            # Reference column on both transaction tables (added once to existing databases)
+            for table in ("transactions", "recurringTransactions"):
+                cursor.execute(f"PRAGMA table_info({table})")
+                columns = [row[1] for row in cursor.fetchall()]
+                if columns and "merchant_id" not in columns:
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN merchant_id INTEGER REFERENCES merchants(id)")
+
+            # index by user and merchant for per-merchant aggregation
+            cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_transactions_user_merchant
+                    ON transactions(user_id, merchant_id)
+                """)
+
+    def get_merchant_ids(self, user_id, raw_names):
+        """
+        Resolve raw merchant descriptors to merchant ids, creating missing ones
+
+        Runs in its own short transaction so callers can resolve ids before
+        opening the cursor that writes the transactions.
+
+        Returns:
+            dict of raw name -> merchant id
+        """
+        resolved = {}
+        missing = []
+        with self._merchant_lock:
+            for raw in set(raw_names):
+                if not isinstance(raw, str):
+                    continue
+                merchant_id = self._merchant_ids.get((user_id, raw))
+                if merchant_id is None:
+                    missing.append(raw)
+                else:
+                    self._merchant_ids.move_to_end((user_id, raw))
+                    resolved[raw] = merchant_id
+
+        if not missing:
+            return resolved
+
+        created = {}
+        # No query budget: a whole CSV import or the startup backfill resolves thousands of names here
+        with self._get_cursor(budget=None) as cursor:
+            for raw in missing:
+                cursor.execute(
+                    "SELECT merchant_id FROM merchant_aliases WHERE user_id = ? AND raw_name = ?",
+                    (user_id, raw),
+                )
+                row = cursor.fetchone()
+                if row is None:
+                    name = canonical_merchant_name(raw)
+                    cursor.execute(
+                        "INSERT OR IGNORE INTO merchants (user_id, name) VALUES (?, ?)",
+                        (user_id, name),
+                    )
+                    cursor.execute(
+                        "SELECT id FROM merchants WHERE user_id = ? AND name = ?",
+                        (user_id, name),
+                    )
+                    row = cursor.fetchone()
+                    cursor.execute(
+                        "INSERT OR IGNORE INTO merchant_aliases (user_id, raw_name, merchant_id) VALUES (?, ?, ?)",
+                        (user_id, raw, row[0]),
+                    )
+                created[raw] = row[0]
+
+        # Cache only once committed
+        with self._merchant_lock:
+            for raw, merchant_id in created.items():
+                self._merchant_ids[(user_id, raw)] = merchant_id
+            while len(self._merchant_ids) > MERCHANT_ID_CACHE_SIZE:
+                self._merchant_ids.popitem(last=False)
+
+        resolved.update(created)
+        return resolved
+
+    def get_merchant_id(self, user_id, raw_name):
+        """Resolve a single raw merchant descriptor to its merchant id"""
+        return self.get_merchant_ids(user_id, [raw_name]).get(raw_name)
+
+    def backfill_merchant_ids(self, user_id=None):
+        """Fill merchant_id for rows written before the merchant table existed"""
+        with self._get_cursor(budget=None) as cursor:
+            query = """
+                SELECT DISTINCT user_id, merchant FROM transactions
+                WHERE merchant_id IS NULL AND user_id IN (SELECT id FROM users)
+                UNION
+                SELECT DISTINCT user_id, merchant FROM recurringTransactions
+                WHERE merchant_id IS NULL AND user_id IN (SELECT id FROM users)
+            """
+            cursor.execute(query)
+            pending = [(uid, merchant) for uid, merchant in cursor.fetchall()
+                       if merchant is not None and uid is not None and (user_id is None or uid == user_id)]
+
+        by_user = {}
+        for uid, merchant in pending:
+            by_user.setdefault(uid, []).append(merchant)
+
+        updated = 0
+        for uid, merchants in by_user.items():
+            merchant_ids = self.get_merchant_ids(uid, merchants)
+            with self._get_cursor(budget=None) as cursor:
+                for table in ("transactions", "recurringTransactions"):
+                    cursor.executemany(
+                        f"UPDATE {table} SET merchant_id = ? WHERE user_id = ? AND merchant = ? AND merchant_id IS NULL",
+                        [(merchant_id, uid, raw) for raw, merchant_id in merchant_ids.items()],
+                    )
+                    updated += cursor.rowcount
+        return updated
+
+    def get_spending_by_merchant(self, start_date=None, end_date=None, user_id=None, limit=None):
+        """Total spent per canonical merchant, highest first"""
+        with self._get_cursor() as cursor:
+            query = """
+                SELECT m.name, totals.total, totals.num_transactions
+                FROM (
+                    SELECT t.merchant_id, SUM(t.amount) AS total, COUNT(*) AS num_transactions
+                    FROM transactions t
+                    WHERE t.merchant_id IS NOT NULL
+            """
+            params = []
+
+            if user_id:
+                query += " AND t.user_id = ?"
+                params.append(user_id)
+
+            if start_date and end_date:
+                query += " AND date(t.date) BETWEEN date(?) AND date(?)"
+                params.extend([start_date, end_date])
+
+            query += """
+                    GROUP BY t.merchant_id
+                ) totals
+                JOIN merchants m ON m.id = totals.merchant_id
+                ORDER BY totals.total DESC
+            """
+
+            if limit:
+                query += " LIMIT ?"
+                params.append(int(limit))
+
+            cursor.execute(query, params)
+            return cursor.fetchall()
+
+    # --------------- Data versions ---------------------------
+    # Cached figures are keyed by the user's data version, so bumping it after
+    # a write is enough to make every cached figure for that user stale.
+    # Versions live in the data_changes table so every worker process agrees on
+    # them. PRAGMA data_version on a dedicated connection tells this process when
+    # any other connection committed, and only then is the small table re-read.
+    def create_data_changes_table(self):
+
+        with self._get_cursor(budget=None) as cursor:
+            cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS data_changes (
+                        scope TEXT NOT NULL,
+                        user_id INTEGER NOT NULL,
+                        version INTEGER NOT NULL DEFAULT 0,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (scope, user_id)
+                    ) WITHOUT ROWID
+                """)
+
+        self._sync_data_changes(force=True)
+
+    def _bump_change_counter(self, scope, user_id):
+        """Increment a change counter in its own short transaction, returns the new version"""
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                """INSERT INTO data_changes (scope, user_id, version) VALUES (?, ?, 1)
+                ON CONFLICT(scope, user_id) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP""",
+                (scope, user_id),
+            )
+            cursor.execute("SELECT version FROM data_changes WHERE scope = ? AND user_id = ?", (scope, user_id))
+            version = cursor.fetchone()[0]
+
+        with self._data_version_lock:
+            versions = self._data_versions if scope == DATA_SCOPE else self._user_versions
+            versions[user_id] = max(version, versions.get(user_id, 0))
+        return version
+
+    def mark_user_data_changed(self, user_id):
+        """Record that a user's data changed, returns the new version"""
+        return self._bump_change_counter(DATA_SCOPE, user_id)
+
+    def get_data_version(self, user_id):
+        """Current data version of a user (0 until the first write)"""
+        self._sync_data_changes()
+        with self._data_version_lock:
+            return self._data_versions.get(user_id, 0)
+
+    def add_data_change_listener(self, listener):
+        """Call listener(user_id) when another process or connection changed that user's data"""
+        self._data_change_listeners.append(listener)
+
+    def _sync_data_changes(self, force=False):
+        """Pick up counters bumped by other processes, at most every DATA_VERSION_POLL_INTERVAL"""
+        now = time.monotonic()
+        if not force and now - self._last_change_poll < DATA_VERSION_POLL_INTERVAL:
+            return
+
+        # One thread polls at a time, the others use the versions they already have
+        if not self._change_watch_lock.acquire(blocking=force):
+            return
+        try:
+            self._last_change_poll = now
+            if self._change_conn is None:
+                self._change_conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30.0)
+
+            data_version = self._change_conn.execute("PRAGMA data_version").fetchone()[0]
+            if not force and data_version == self._seen_data_version:
+                return
+            self._seen_data_version = data_version
+            rows = self._change_conn.execute("SELECT scope, user_id, version FROM data_changes").fetchall()
+        finally:
+            self._change_watch_lock.release()
+
+        changed_data = []
+        changed_users = []
+        with self._data_version_lock:
+            for scope, user_id, version in rows:
+                if scope == DATA_SCOPE:
+                    versions, changed = self._data_versions, changed_data
+                elif scope == USER_SCOPE:
+                    versions, changed = self._user_versions, changed_users
+                else:
+                    continue
+                if version > versions.get(user_id, 0):
+                    versions[user_id] = version
+                    changed.append(user_id)
+
+        for user_id in changed_users:
+            self.invalidate_session_user(user_id)
+        for user_id in changed_data:
+            for listener in self._data_change_listeners:
+                listener(user_id)
+
+    def close_change_watcher(self):
+        with self._change_watch_lock:
+            if self._change_conn is not None:
+                self._change_conn.close()
+                self._change_conn = None
+
+    # --------------- Export ----------------------------------
+    # Same column layout the CSV importer accepts (income exported as negative amounts)
+    EXPORT_COLUMNS = ["category", "merchant", "amount", "date", "note", "recurring"]
+
+    # First column is the row id used as the paging key, it is not exported
+    _EXPORT_QUERIES = {
+        "transactions": """
+            SELECT t.id, c.name, t.merchant, t.amount, t.date, t.note, t.recurring
+            FROM transactions t
+            LEFT JOIN categories c ON t.category_id = c.id
+            WHERE t.user_id = ? AND t.id > ?
+            ORDER BY t.id
+            LIMIT ?
+        """,
+        "income": """
+            SELECT i.id, '', i.source, -i.amount, i.date, '', 0
+            FROM income i
+            WHERE i.user_id = ? AND i.id > ?
+            ORDER BY i.id
+            LIMIT ?
+        """,
+        "recurring": """
+            SELECT rt.id, c.name, rt.merchant, rt.amount, rt.date, rt.note, rt.recurring
+            FROM recurringTransactions rt
+            LEFT JOIN categories c ON rt.category_id = c.id
+            WHERE rt.user_id = ? AND rt.recurring = 1 AND rt.id > ?
+            ORDER BY rt.id
+            LIMIT ?
+        """,
+    }
+
+    def iter_export_rows(self, kind, user_id, page_size=1000):
+        """
+        Yield pages of CSV-ready rows for one user's data
+
+        Each page is read on its own connection checkout so no read lock is
+        held while the caller is busy sending the previous page to a client.
+
+        Args:
+            kind: 'transactions', 'income' or 'recurring'
+            user_id: Owner of the rows
+            page_size: Rows fetched per checkout
+        """
+        if kind not in self._EXPORT_QUERIES:
+            raise ValueError(f"Unknown export kind: {kind}")
+
+        query = self._EXPORT_QUERIES[kind]
+        last_id = 0
+        while True:
+            with self._get_cursor() as cursor:
+                cursor.execute(query, (user_id, last_id, page_size))
+                rows = cursor.fetchmany(page_size)
+
+            if not rows:
+                return
+
+            last_id = rows[-1][0]
+            yield [row[1:] for row in rows]
+
+            if len(rows) < page_size:
+                return
+
     # ------------------------------------------------------
     def get_total_spent_by_category_filtered(
         self, start_date=None, end_date=None, user_id=None
@@ -862,6 +1433,25 @@ class ExpenseDB:
             return cursor.fetchall()
 
 
+    def get_merchant_category_counts(self, user_id):
+        """How often each canonical merchant was booked under each category by a user"""
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT m.name, counts.category_id, counts.num_transactions
+                FROM (
+                    SELECT merchant_id, category_id, COUNT(*) AS num_transactions
+                    FROM transactions
+                    WHERE user_id = ? AND category_id IS NOT NULL AND merchant_id IS NOT NULL
+                    GROUP BY merchant_id, category_id
+                ) counts
+                JOIN merchants m ON m.id = counts.merchant_id
+                """,
+                (user_id,),
+            )
+            return cursor.fetchall()
+
+
     def get_monthly_spending_by_category(self, year, end_month=None, user_id=None):
         with self._get_cursor() as cursor:
             # Regular transactions query
@@ -1336,6 +1926,141 @@ class ExpenseDB:
             return income_data, sorted_spending_list, sorted_transactions_list
 
 
+    def get_top_transactions_flow(self, start_date, end_date, user_id=None, top_n=10):
+        """
+        Flow data limited to the top N transactions per category
+
+        Transactions beyond the top N of a category are summed into a single
+        "Other (k more)" row, so the result size is bounded by the number of
+        categories rather than the length of the date range.
+
+        Returns:
+            income_data, spending_data, transactions_data as in get_all_transactions_flow
+        """
+        with self._get_cursor() as cursor:
+            # --- Income query ---
+            income_query = """
+                SELECT source, SUM(amount)
+                FROM income
+                WHERE date(date) BETWEEN date(?) AND date(?)
+            """
+            income_params = [start_date, end_date]
+
+            if user_id:
+                income_query += " AND user_id = ?"
+                income_params.append(user_id)
+            income_query += " GROUP BY source"
+            cursor.execute(income_query, income_params)
+            income_data = cursor.fetchall()
+
+            rows = self._get_ranked_flow_rows(cursor, start_date, end_date, user_id, top_n)
+
+        # Category totals come from every transaction, not just the top N
+        spending_data = []
+        transactions_data = []
+        seen = set()
+        for category, merchant, amount, category_total, _ in rows:
+            if category not in seen:
+                seen.add(category)
+                spending_data.append((category, category_total))
+            transactions_data.append((category, merchant, amount))
+
+        return income_data, spending_data, transactions_data
+
+    def _get_ranked_flow_rows(self, cursor, start_date, end_date, user_id=None, top_n=10, category=None):
+        """Top N transactions per category plus an "Other" remainder row, highest category first"""
+        user_filter = " AND rt.user_id = ?" if user_id else ""
+        category_filter = " AND c.name = ?" if category is not None else ""
+        flow_query = f"""
+            WITH RECURSIVE occurrences AS (
+                SELECT 
+                    rt.category_id,
+                    rt.merchant,
+                    rt.amount,
+                    rt.date as original_date,
+                    date(rt.date, '+1 month') as occurrence_date,
+                    1 as iteration
+                FROM recurringTransactions rt
+                WHERE rt.recurring = 1{user_filter}
+
+                UNION ALL
+
+                SELECT 
+                    o.category_id,
+                    o.merchant,
+                    o.amount,
+                    o.original_date,
+                    date(o.original_date, '+' || (iteration + 1) || ' month'),
+                    iteration + 1
+                FROM occurrences o
+                WHERE date(o.original_date, '+' || (iteration + 1) || ' month') <= date(?)
+            ),
+            flow AS (
+                SELECT c.name AS category, t.merchant AS merchant, t.amount AS amount
+                FROM transactions t
+                JOIN categories c ON t.category_id = c.id
+                WHERE date(t.date) BETWEEN date(?) AND date(?){" AND t.user_id = ? AND c.user_id = ?" if user_id else ""}{category_filter}
+
+                UNION ALL
+
+                SELECT c.name, o.merchant, o.amount
+                FROM occurrences o
+                JOIN categories c ON o.category_id = c.id
+                WHERE date(o.occurrence_date) BETWEEN date(?) AND date(?){" AND c.user_id = ?" if user_id else ""}{category_filter}
+            ),
+            ranked AS (
+                SELECT
+                    category,
+                    merchant,
+                    amount,
+                    ROW_NUMBER() OVER (PARTITION BY category ORDER BY amount DESC) AS rank,
+                    SUM(amount) OVER (PARTITION BY category) AS category_total
+                FROM flow
+            )
+            SELECT category, merchant, amount, category_total, 0 AS is_other
+            FROM ranked
+            WHERE rank <= ?
+
+            UNION ALL
+
+            SELECT category, 'Other (' || COUNT(*) || ' more)', SUM(amount), MAX(category_total), 1
+            FROM ranked
+            WHERE rank > ?
+            GROUP BY category
+
+            ORDER BY category_total DESC, category, is_other, amount DESC
+        """
+
+        flow_params = []
+        if user_id:
+            flow_params.append(user_id)
+        flow_params.append(end_date)
+        flow_params.extend([start_date, end_date])
+        if user_id:
+            flow_params.extend([user_id, user_id])
+        if category is not None:
+            flow_params.append(category)
+        flow_params.extend([start_date, end_date])
+        if user_id:
+            flow_params.append(user_id)
+        if category is not None:
+            flow_params.append(category)
+        flow_params.extend([top_n, top_n])
+
+        cursor.execute(flow_query, flow_params)
+        return cursor.fetchall()
+
+    def get_category_transactions_flow(self, start_date, end_date, category, user_id=None, top_n=50):
+        """
+        Transactions of a single category for the Sankey drill-down
+
+        Returns:
+            [(category, merchant, amount), ...] highest first, with an "Other" row beyond top N
+        """
+        with self._get_cursor() as cursor:
+            rows = self._get_ranked_flow_rows(cursor, start_date, end_date, user_id, top_n, category)
+        return [(row_category, merchant, amount) for row_category, merchant, amount, _, _ in rows]
+
     def get_current_netWorth_snapshot(self, user_id=None):
         """Retrieves the current net worth snapshot with all associated assets and liabilities"""
         try:
@@ -1413,6 +2138,8 @@ class ExpenseDB:
                     "liabilities": liabilities,
                 }
 
+        except (QueryTimeoutError, staleRequests.StaleRequestError):
+            raise  # Let the callback report the timeout or drop the superseded update
         except Exception as e:
             print(f"Error fetching current net worth snapshot: {e}")
             return None
@@ -1502,6 +2229,8 @@ class ExpenseDB:
 
                 return all_snapshots
 
+        except (QueryTimeoutError, staleRequests.StaleRequestError):
+            raise  # Let the callback report the timeout or drop the superseded update
         except Exception as e:
             print(f"Error fetching non-current net worth snapshots: {e}")
             return None
@@ -1646,13 +2375,18 @@ class ExpenseDB:
         if self.use_pool:
             self.pool.close_all()
         else:
-            if self._direct_conn:
+            with self._thread_conns_lock:
+                conns = list(self._thread_conns.values())
+                self._thread_conns.clear()
+            # Threads still running open a fresh connection if they touch the database again
+            self._thread_local = threading.local()
+            for conn in conns:
                 try:
-                    self._direct_conn.commit()
-                    self._direct_conn.close()
-                    print("Direct connection closed")
+                    conn.commit()
+                    conn.close()
                 except Exception as e:
                     print(f"Error closing direct connection: {e}")
+            print(f"Direct connections closed ({len(conns)})")
 
 # --- Initialization ---
 
@@ -1672,12 +2406,13 @@ def monitor_pool_health(db: ExpenseDB, interval_seconds=60):
     
     # Run in background thread
     import threading
-    monitor_thread = threading.Thread(target=monitor, daemon=True)
+    monitor_thread = threading.Thread(target=monitor, name="PoolHealthMonitor", daemon=True)
     monitor_thread.start()
     return monitor_thread
 
 db_initialized = None  # Global variable to hold the initialized database instance
-def init_db(use_pool_init=True, pool_size_init=8, enable_monitoring_init=True, use_wal_init=True):
+def init_db(use_pool_init=True, pool_size_init=8, enable_monitoring_init=True, use_wal_init=True, checkout_timeout_init=10.0,
+            pragma_profile_init=DEFAULT_PRAGMA_PROFILE, query_budget_init=None):
     """
     Initialize the ExpenseDB instance
     
@@ -1686,6 +2421,9 @@ def init_db(use_pool_init=True, pool_size_init=8, enable_monitoring_init=True, u
         pool_size_init: Number of connections in pool
         enable_monitoring_init: Enable pool monitoring
         use_wal_init: Force WAL mode on/off (None = auto-detect)
+        checkout_timeout_init: Seconds to wait for a pooled connection
+        pragma_profile_init: Connection PRAGMA profile (safe, balanced, throughput)
+        query_budget_init: Seconds a query may run before it is aborted (None = no limit)
     """
     global db_initialized
     if db_initialized is not None:
@@ -1721,12 +2459,15 @@ def init_db(use_pool_init=True, pool_size_init=8, enable_monitoring_init=True, u
             use_pool=use_pool_init, 
             pool_size=pool_size_init, 
             enable_monitoring=enable_monitoring_init,
-            use_wal=use_wal_init
+            use_wal=use_wal_init,
+            checkout_timeout=checkout_timeout_init,
+            pragma_profile=pragma_profile_init,
+            query_budget=query_budget_init
         )
         
         mode = "pooled" if use_pool_init else "direct"
         print(f"Database successfully loaded from {DB_PATH} ({mode} mode)")
-        print(f"Journal mode: {'WAL' if use_wal_init else 'DELETE'}")
+        print(f"Journal mode: {'WAL' if use_wal_init else 'DELETE'}, pragma profile: {pragma_profile_init}")
         
         # Start background health monitoring only for pooled mode (if needed)
         if use_pool_init and enable_monitoring_init:
@@ -1739,6 +2480,15 @@ def init_db(use_pool_init=True, pool_size_init=8, enable_monitoring_init=True, u
         # Tags - use if table missing
         db_initialized.create_tags_table() 
 
+        # Change counters - cross-process cache invalidation
+        db_initialized.create_data_changes_table()
+
+        # Merchants - dimension table and merchant_id columns, backfilled once
+        db_initialized.create_merchants_table()
+        backfilled = db_initialized.backfill_merchant_ids()
+        if backfilled:
+            print(f"Backfilled merchant ids for {backfilled} rows")
+
         # ---------------------------------------------------------------------
             
     except Exception as e:
@@ -1773,10 +2523,15 @@ def cleanup():
                 print("Performing final checkpoint...")
                 db.perform_checkpoint()
         
+        db.close_change_watcher()
+
         if db.use_pool:
             # Close all connections explicitly
             if hasattr(db, 'pool') and hasattr(db.pool, 'close_all'):
                 db.pool.close_all()
+        else:
+            # Per-thread direct connections
+            db.close()
         
         # Clear the global reference
         db_initialized = None
@@ -1808,6 +2563,6 @@ def periodic_checkpoint(db: ExpenseDB, interval_seconds=300):
                 print(f"Periodic checkpoint error: {e}")
     
     import threading
-    checkpoint_thread = threading.Thread(target=checkpoint_loop, daemon=True)
+    checkpoint_thread = threading.Thread(target=checkpoint_loop, name="WALCheckpoint", daemon=True)
     checkpoint_thread.start()
     return checkpoint_thread
\ No newline at end of file
@@ -1,4 +1,4 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 import dash_bootstrap_components as dbc
 import pandas as pd
 from functools import wraps
@@ -16,6 +16,12 @@ import sys
 import uuid
 import json
 
+# Merchant keyword classifier and learned merchant -> category index
+from categoryAssignment import get_classifier, MerchantCategoryIndex
+
+# Per-callback cost recording (/debug/perf)
+from perfMonitor import instrument_callback
+
 # Security
 from flask_login import current_user
 def authenticate_callback(func):
@@ -65,6 +71,7 @@ def data_page_layout():
                                                     id="tm-merchant",
                                                     placeholder="Merchant",
                                                     type="text",
+                                                    debounce=True,  # Suggest a category once, not per keystroke
                                                     className="mb-3",
                                                 )
                                             )
@@ -1027,10 +1034,41 @@ def data_page_layout():
                                         n_intervals=0,
                                         disabled=True,
                                     ),
+                                    # Export links (same column layout as import)
+                                    html.Hr(className="my-3"),
+                                    dbc.ButtonGroup(
+                                        [
+                                            dbc.Button(
+                                                "Export Transactions",
+                                                href="export/transactions.csv",
+                                                external_link=True,
+                                                color="secondary",
+                                                outline=True,
+                                                size="sm",
+                                            ),
+                                            dbc.Button(
+                                                "Export Income",
+                                                href="export/income.csv",
+                                                external_link=True,
+                                                color="secondary",
+                                                outline=True,
+                                                size="sm",
+                                            ),
+                                            dbc.Button(
+                                                "Export Recurring",
+                                                href="export/recurring.csv",
+                                                external_link=True,
+                                                color="secondary",
+                                                outline=True,
+                                                size="sm",
+                                            ),
+                                        ],
+                                        className="w-100",
+                                    ),
                                 ]
                             )
                         ],
-                        title="Import CSV",
+                        title="Import / Export CSV",
                     ),
                     # # -- CODE INJECTOR --
                     # dbc.AccordionItem(
@@ -1081,6 +1119,7 @@ def data_page_layout():
             ),  # Storage for custom event sent to script when category added
             dcc.Store(id="income-added", data=False),
             dcc.Store(id="checkbox-store"),
+            dcc.Store(id="tm-category-suggested"),  # Category last filled in by suggest_category
             html.Div(
                 id="dummy-trans", style={"display": "none"}
             ),  # Dummy since dash always requires outputs for callbacks
@@ -1221,6 +1260,32 @@ def data_page_layout():
 
 # --- BACKEND ---
 
+# Date arrow buttons: move the date one day forward/back, ids end in -increment/-decrement
+DATE_ARROWS_JS = """
+function(incrementClicks, decrementClicks, currentDate) {
+    const triggered = dash_clientside.callback_context.triggered;
+    if (!triggered || !triggered.length || !currentDate) {
+        return dash_clientside.no_update;
+    }
+
+    // Get which button was clicked
+    const buttonId = triggered[0].prop_id.split(".")[0];
+    let step = 0;
+    if (buttonId.endsWith("-increment")) {
+        step = 1;
+    } else if (buttonId.endsWith("-decrement")) {
+        step = -1;
+    } else {
+        return dash_clientside.no_update;
+    }
+
+    // Work in UTC so the browser's timezone cannot shift the day
+    const parts = currentDate.slice(0, 10).split("-").map(Number);
+    const newDate = new Date(Date.UTC(parts[0], parts[1] - 1, parts[2] + step));
+    return newDate.toISOString().slice(0, 10);
+}
+"""
+
 # -- DATA PAGE CALLBACKS --
 def data_page_callbacks(app):
 
@@ -1228,12 +1293,17 @@ def data_page_callbacks(app):
     from database import get_db
     db = get_db()
 
+    # Learned merchant -> category counts per user (kept current by the write callbacks below)
+    merchant_index = MerchantCategoryIndex(db.get_merchant_category_counts)
+    db.add_data_change_listener(merchant_index.invalidate)  # Writes made by other worker processes
+
     # -- Populate layout --
     @app.callback(
         [Output("tm-category", "options"),
         Output("tv-category-filter", "options")],
         Input("url", "pathname")  # Using the URL as trigger for initial load
     )
+    @instrument_callback
     def populate_category_options(_):
         # Fetch categories from database when layout loads
         categories_data = db.get_categories(current_user.id)
@@ -1275,6 +1345,7 @@ def data_page_callbacks(app):
         prevent_initial_call=True,
     )
     @authenticate_callback
+    @instrument_callback
     def handle_transactions(n_clicks, n_intervals, category, merchant, amount, note, date, recurring, tags, current_text):
         ctx = callback_context
         
@@ -1336,9 +1407,12 @@ def data_page_callbacks(app):
                     )
                 
                 # If all passed then add transaction
+                merchant_id = db.get_merchant_id(current_user.id, merchant)
                 with db._get_cursor() as cursor:
                     cursor.execute(
-                        "INSERT INTO transactions VALUES (NULL, ?, ?, ?, ?, ?, ?, ?)",
+                        """INSERT INTO transactions
+                        (category_id, merchant, amount, date, note, recurring, user_id, merchant_id)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
                         (
                             category,
                             merchant,
@@ -1347,6 +1421,7 @@ def data_page_callbacks(app):
                             note,
                             int(recurring),
                             current_user.id,
+                            merchant_id,
                         ),
                     )
 
@@ -1356,7 +1431,9 @@ def data_page_callbacks(app):
                     # If recurring, add to recurringTransactions with the transaction_id
                     if int(recurring):
                         cursor.execute(
-                            "INSERT INTO recurringTransactions VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            """INSERT INTO recurringTransactions
+                            (trans_id, category_id, merchant, amount, date, note, recurring, user_id, merchant_id)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
                             (
                                 trans_id,
                                 category,
@@ -1366,8 +1443,12 @@ def data_page_callbacks(app):
                                 note,
                                 int(recurring),
                                 current_user.id,
+                                merchant_id,
                             ),
                         )
+                db.mark_user_data_changed(current_user.id)
+
+                merchant_index.record(current_user.id, merchant, category)
 
                 # If tags provided, insert into tags table
                 if tags:
@@ -1428,6 +1509,27 @@ def data_page_callbacks(app):
     # def store_checkbox_value(value, _):
     #     return {"value": value}
 
+    # -- Suggest category from the user's own history for this merchant --
+    @app.callback(
+        Output("tm-category", "value", allow_duplicate=True),
+        Output("tm-category-suggested", "data"),
+        Input("tm-merchant", "value"),
+        State("tm-category", "value"),
+        State("tm-category-suggested", "data"),
+        prevent_initial_call=True,
+    )
+    @authenticate_callback
+    @instrument_callback
+    def suggest_category(merchant, category, suggested):
+        # Never override a category the user picked, only an earlier suggestion
+        if not merchant or (category and category != suggested):
+            raise PreventUpdate
+
+        suggestion = merchant_index.suggest(current_user.id, merchant)
+        if suggestion is None or suggestion == category:
+            raise PreventUpdate
+        return suggestion, suggestion
+
     # --- TAG MANAGEMENT ON ADD CALLBACKS ---
     
     # -- Tag suggestions dynamic update --
@@ -1438,6 +1540,7 @@ def data_page_callbacks(app):
         prevent_initial_call=True,
     )
     @authenticate_callback
+    @instrument_callback
     def update_tag_suggestions(search_text):
         if not search_text:
             return [], False
@@ -1500,6 +1603,7 @@ def data_page_callbacks(app):
         State("selected-tags-store", "data"),
         prevent_initial_call=True,
     )
+    @instrument_callback
     def select_tag_from_suggestion(n_clicks_list, current_tags):
         if not any(n_clicks_list):
             raise PreventUpdate
@@ -1531,6 +1635,7 @@ def data_page_callbacks(app):
         State("selected-tags-store", "data"),
         prevent_initial_call=True,
     )
+    @instrument_callback
     def add_tag_on_enter(n_submit, tag_input, current_tags):
         if not tag_input or not tag_input.strip():
             raise PreventUpdate
@@ -1567,6 +1672,7 @@ def data_page_callbacks(app):
         Input("selected-tags-store", "data"),
         prevent_initial_call=True,
     )
+    @instrument_callback
     def display_selected_tags(tags):
         if not tags:
             return []
@@ -1602,6 +1708,7 @@ def data_page_callbacks(app):
         State("selected-tags-store", "data"),
         prevent_initial_call=True
     )
+    @instrument_callback
     def remove_tag(n_clicks_list, current_tags):
         if not any(n_clicks_list):
             raise PreventUpdate
@@ -1621,37 +1728,15 @@ def data_page_callbacks(app):
 
     # --------------------------------------------------------------------------------------
 
-    # CHANGE DATE TRANSACTION
-    @app.callback(
+    # CHANGE DATE TRANSACTION (runs in the browser)
+    app.clientside_callback(
+        DATE_ARROWS_JS,
         Output("tm-date", "date", allow_duplicate=True),
         Input("tm-date-increment", "n_clicks"),
         Input("tm-date-decrement", "n_clicks"),
         State("tm-date", "date"),
         prevent_initial_call=True
     )
-    @authenticate_callback
-    def update_date_from_arrows(increment_clicks, decrement_clicks, current_date):
-        """Callback to handle date increment/decrement from arrow buttons"""
-        ctx = callback_context
-        
-        if not ctx.triggered:
-            return no_update
-        
-        # Get which button was clicked
-        button_id = ctx.triggered[0]["prop_id"].split(".")[0]
-        
-        # Parse current date
-        current_date = datetime.strptime(current_date[:10], "%Y-%m-%d").date()
-        
-        # Calculate new date
-        if button_id == "tm-date-increment":
-            new_date = current_date + timedelta(days=1)
-        elif button_id == "tm-date-decrement":
-            new_date = current_date - timedelta(days=1)
-        else:
-            return no_update
-        
-        return new_date
     
     # -- ADD CATEGORY --
     @app.callback(
@@ -1679,6 +1764,7 @@ def data_page_callbacks(app):
     prevent_initial_call=True
     )
     @authenticate_callback
+    @instrument_callback
     def handle_category_add(n_clicks, n_intervals, category, budget, current_text):
         ctx = callback_context
         
@@ -1721,6 +1807,7 @@ def data_page_callbacks(app):
                         "INSERT INTO categories VALUES (NULL, ?, ?, ?)",
                         (category, budget, current_user.id),
                     )
+                db.mark_user_data_changed(current_user.id)
                 
                 return (
                     "Category Added!",  
@@ -1782,6 +1869,7 @@ def data_page_callbacks(app):
     prevent_initial_call=True
     )
     @authenticate_callback
+    @instrument_callback
     def handle_income_add(n_clicks, n_intervals, source, amount, date, current_text):
         ctx = callback_context
         
@@ -1824,6 +1912,7 @@ def data_page_callbacks(app):
                         "INSERT INTO income VALUES (NULL, ?, ?, ?, ?)",
                         (source, amount, date, current_user.id),
                     )
+                db.mark_user_data_changed(current_user.id)
                 
                 return (
                     "Income Added!",  
@@ -1860,37 +1949,15 @@ def data_page_callbacks(app):
         
         raise PreventUpdate
     
-    # CHANGE DATE INCOME
-    @app.callback(
+    # CHANGE DATE INCOME (runs in the browser)
+    app.clientside_callback(
+        DATE_ARROWS_JS,
         Output("im-date", "date", allow_duplicate=True),
         Input("im-date-increment", "n_clicks"),
         Input("im-date-decrement", "n_clicks"),
         State("im-date", "date"),
         prevent_initial_call=True
     )
-    @authenticate_callback
-    def update_date_from_arrows(increment_clicks, decrement_clicks, current_date):
-        """Callback to handle date increment/decrement from arrow buttons"""
-        ctx = callback_context
-        
-        if not ctx.triggered:
-            return no_update
-        
-        # Get which button was clicked
-        button_id = ctx.triggered[0]["prop_id"].split(".")[0]
-        
-        # Parse current date
-        current_date = datetime.strptime(current_date[:10], "%Y-%m-%d").date()
-        
-        # Calculate new date
-        if button_id == "im-date-increment":
-            new_date = current_date + timedelta(days=1)
-        elif button_id == "im-date-decrement":
-            new_date = current_date - timedelta(days=1)
-        else:
-            return no_update
-        
-        return new_date
 
     
     # -- Listener to put focus back on merchant once transaction added --
@@ -1945,6 +2012,7 @@ def data_page_callbacks(app):
         prevent_initial_call = True
     )
     @authenticate_callback
+    @instrument_callback
     def update_transactions_list(n_clicks, trans_added, cat_added, num_trans_limit, search_term, category_filter, start_date, end_date, recurring_filter, sort_order):
         
         if num_trans_limit is None:
@@ -2015,7 +2083,8 @@ def data_page_callbacks(app):
         prevent_initial_call=True
     )
     @authenticate_callback
-    def reset_date_filters(n_clicks):
+    @instrument_callback
+    def reset_tv_date_filters(n_clicks):
         if n_clicks:
             return None, None  
         return no_update, no_update
@@ -2030,6 +2099,7 @@ def data_page_callbacks(app):
         prevent_initial_call=True
     )
     @authenticate_callback
+    @instrument_callback
     def delete_transaction(delete_clicks, delete_ids):
         ctx = callback_context
         if not ctx.triggered:
@@ -2052,6 +2122,9 @@ def data_page_callbacks(app):
 
                 cursor.execute("DELETE FROM recurringTransactions WHERE trans_id = ? AND user_id = ?", (trans_id, current_user.id)) # if exists, delete from recurringTransactions
                 cursor.execute("DELETE FROM transactions WHERE id = ? AND user_id = ?", (trans_id, current_user.id))
+            db.mark_user_data_changed(current_user.id)
+
+            merchant_index.invalidate(current_user.id)
             
             # Return None to trigger the refresh via the other callback
             return None, no_update, no_update
@@ -2073,6 +2146,7 @@ def data_page_callbacks(app):
         prevent_initial_call=True
     )
     @authenticate_callback
+    @instrument_callback
     def end_recurring_transaction(end_clicks, end_ids):
         ctx = callback_context
         if not ctx.triggered:
@@ -2137,12 +2211,18 @@ def data_page_callbacks(app):
             else:
                 insert_note = "(ended)"
 
+            merchant_id = db.get_merchant_id(current_user.id, merchant)
             with db._get_cursor() as cursor:
                 for date in dates:
                     cursor.execute(
-                        "INSERT INTO transactions VALUES (NULL, ?, ?, ?, ?, ?, ?, ?)",
-                        (category, merchant, amount, date.strftime('%Y-%m-%d'), insert_note, 0, current_user.id)
+                        """INSERT INTO transactions
+                        (category_id, merchant, amount, date, note, recurring, user_id, merchant_id)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                        (category, merchant, amount, date.strftime('%Y-%m-%d'), insert_note, 0, current_user.id, merchant_id)
                     )
+            db.mark_user_data_changed(current_user.id)
+
+            merchant_index.invalidate(current_user.id)
             
             # Return None to trigger the refresh via the other callback
             return None, no_update, no_update
@@ -2172,6 +2252,7 @@ def data_page_callbacks(app):
         prevent_initial_call=True
     )
     @authenticate_callback
+    @instrument_callback
     def open_edit_transaction_modal(edit_clicks, edit_ids):
         ctx = callback_context
         if not ctx.triggered:
@@ -2233,7 +2314,8 @@ def data_page_callbacks(app):
         prevent_initial_call=True
     )
     @authenticate_callback
-    def close_edit_modal(cancel_click):
+    @instrument_callback
+    def close_edit_transaction_modal(cancel_click):
         if cancel_click:
             return False
         raise PreventUpdate
@@ -2255,6 +2337,7 @@ def data_page_callbacks(app):
         prevent_initial_call=True
     )
     @authenticate_callback
+    @instrument_callback
     def update_transaction(submit_click, trans_id, merchant, amount, date, note, recurring, category_name):
         if not submit_click:
             raise PreventUpdate
@@ -2285,6 +2368,7 @@ def data_page_callbacks(app):
                         }
                     )
                 
+            merchant_id = db.get_merchant_id(current_user.id, merchant)
             with db._get_cursor() as cursor:
             
                 # Get cat id
@@ -2295,9 +2379,9 @@ def data_page_callbacks(app):
                 # First update main transaction
                 cursor.execute("""
                     UPDATE transactions 
-                    SET merchant = ?, amount = ?, date = ?, note = ?, recurring = ?, category_id = ?
+                    SET merchant = ?, amount = ?, date = ?, note = ?, recurring = ?, category_id = ?, merchant_id = ?
                     WHERE id = ? AND user_id = ?
-                """, (merchant, amount, date, note, int(recurring), category_id, trans_id, current_user.id))
+                """, (merchant, amount, date, note, int(recurring), category_id, merchant_id, trans_id, current_user.id))
 
             # Handle recurring transactions
             with db._get_cursor() as cursor:
@@ -2310,19 +2394,22 @@ def data_page_callbacks(app):
                         # Update existing recurring transaction
                         cursor.execute("""
                             UPDATE recurringTransactions 
-                            SET merchant = ?, amount = ?, date = ?, note = ?, recurring = ?, category_id = ?
+                            SET merchant = ?, amount = ?, date = ?, note = ?, recurring = ?, category_id = ?, merchant_id = ?
                             WHERE trans_id = ? AND user_id = ?
-                        """, (merchant, amount, date, note, int(recurring), category_id, trans_id, current_user.id))
+                        """, (merchant, amount, date, note, int(recurring), category_id, merchant_id, trans_id, current_user.id))
                     else:
                         # Add new recurring transaction
                         cursor.execute("""
                             INSERT INTO recurringTransactions 
-                            (trans_id, merchant, amount, date, note, recurring, category_id)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                        """, (trans_id, merchant, amount, date, note, int(recurring), category_id, current_user.id))
+                            (trans_id, merchant, amount, date, note, recurring, category_id, user_id, merchant_id)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        """, (trans_id, merchant, amount, date, note, int(recurring), category_id, current_user.id, merchant_id))
                 else:
                     # Remove from recurringTransactions if it exists
                     cursor.execute("DELETE FROM recurringTransactions WHERE trans_id = ? AND user_id = ?", (trans_id, current_user.id))
+            db.mark_user_data_changed(current_user.id)
+
+            merchant_index.invalidate(current_user.id)
             
             # Return to trigger refresh and close modal
             return None, False, "Save", default_style
@@ -2350,6 +2437,7 @@ def data_page_callbacks(app):
         prevent_initial_call = True
     )
     @authenticate_callback
+    @instrument_callback
     def update_categories_list(click, trans_added, cat_added):
         # Fetch categories
         with db._get_cursor() as cursor:
@@ -2439,6 +2527,7 @@ def data_page_callbacks(app):
         prevent_initial_call=True
     )
     @authenticate_callback
+    @instrument_callback
     def delete_category(delete_clicks, delete_ids):
         ctx = callback_context
         if not ctx.triggered:
@@ -2464,6 +2553,9 @@ def data_page_callbacks(app):
 
                 # Delete categories
                 cursor.execute("DELETE FROM categories WHERE id = ? AND user_id = ?", (cat_id, current_user.id))
+            db.mark_user_data_changed(current_user.id)
+
+            merchant_index.invalidate(current_user.id)
         
             # Return None to trigger the refresh via the other callback
             return None, no_update, no_update, None
@@ -2481,6 +2573,7 @@ def data_page_callbacks(app):
         prevent_initial_call=True
     )
     @authenticate_callback
+    @instrument_callback
     def update_category_options(n_clicks):
         
         categories_data = db.get_categories(current_user.id)
@@ -2501,6 +2594,7 @@ def data_page_callbacks(app):
         prevent_initial_call=True
     )
     @authenticate_callback
+    @instrument_callback
     def open_edit_category_modal(edit_clicks, edit_ids):
         ctx = callback_context
         if not ctx.triggered:
@@ -2556,6 +2650,7 @@ def data_page_callbacks(app):
         prevent_initial_call=True
     )
     @authenticate_callback
+    @instrument_callback
     def update_category(submit_click, cat_id, name, budget):
         if not submit_click:
             raise PreventUpdate
@@ -2593,6 +2688,7 @@ def data_page_callbacks(app):
                     SET name = ?, budget = ?
                     WHERE id = ? AND user_id = ?
                 """, (name, budget, cat_id, current_user.id))
+            db.mark_user_data_changed(current_user.id)
 
             
             # Return to trigger refresh and close modal
@@ -2617,7 +2713,8 @@ def data_page_callbacks(app):
         prevent_initial_call=True
     )
     @authenticate_callback
-    def close_edit_modal(cancel_click):
+    @instrument_callback
+    def close_edit_category_modal(cancel_click):
         if cancel_click:
             return False
         raise PreventUpdate
@@ -2638,6 +2735,7 @@ def data_page_callbacks(app):
         prevent_initial_call = True
     )
     @authenticate_callback
+    @instrument_callback
     def update_income_list(n_clicks, income_added, num_income_limit, search_term, start_date, end_date, sort_order):
         
         if num_income_limit is None:
@@ -2722,7 +2820,8 @@ def data_page_callbacks(app):
         prevent_initial_call=True
     )
     @authenticate_callback
-    def reset_date_filters(n_clicks):
+    @instrument_callback
+    def reset_iv_date_filters(n_clicks):
         if n_clicks:
             return None, None  
         return no_update, no_update
@@ -2737,6 +2836,7 @@ def data_page_callbacks(app):
         prevent_initial_call=True
     )
     @authenticate_callback
+    @instrument_callback
     def delete_income(delete_clicks, delete_ids):
         ctx = callback_context
         if not ctx.triggered:
@@ -2758,6 +2858,7 @@ def data_page_callbacks(app):
 
                 # Delete income
                 cursor.execute("DELETE FROM income WHERE id = ? AND user_id = ?", (inc_id, current_user.id))
+            db.mark_user_data_changed(current_user.id)
         
             # Return None to trigger the refresh via the other callback
             return None, no_update, no_update
@@ -2782,6 +2883,7 @@ def data_page_callbacks(app):
         prevent_initial_call=True
     )
     @authenticate_callback
+    @instrument_callback
     def open_edit_income_modal(edit_clicks, edit_ids):
         ctx = callback_context
         if not ctx.triggered:
@@ -2832,6 +2934,7 @@ def data_page_callbacks(app):
         prevent_initial_call=True
     )
     @authenticate_callback
+    @instrument_callback
     def close_edit_income_modal(cancel_click):
         if cancel_click:
             return False
@@ -2851,6 +2954,7 @@ def data_page_callbacks(app):
         prevent_initial_call=True
     )
     @authenticate_callback
+    @instrument_callback
     def update_income(submit_click, income_id, source, amount, date):
         if not submit_click:
             raise PreventUpdate
@@ -2888,6 +2992,7 @@ def data_page_callbacks(app):
                     SET source = ?, amount = ?, date = ?
                     WHERE id = ? AND user_id = ?
                 """, (source, amount, date, income_id, current_user.id))
+            db.mark_user_data_changed(current_user.id)
             
             # Return to trigger refresh and close modal
             return None, False, "Save", default_style
@@ -2926,6 +3031,7 @@ def data_page_callbacks(app):
         prevent_initial_call=True
     )
     @authenticate_callback
+    @instrument_callback
     def import_csv(n_clicks, n_intervals, contents, filename, current_text):
         ctx = callback_context
         
@@ -3028,6 +3134,26 @@ def data_page_callbacks(app):
                     cursor.execute("SELECT id, name FROM categories WHERE user_id = ?", (current_user.id,))
                     category_map = {name.lower(): id for id, name in cursor.fetchall()}
 
+                # Auto-fill blank spending categories, first from the user's own
+                # merchant history, then from merchant keywords. Keyword guesses are
+                # only used where they name one of the user's own categories
+                blank_category = (df['amount'] > 0) & (
+                    df['category'].isna() | (df['category'].astype(str).str.strip() == '')
+                )
+                if blank_category.any():
+                    category_names = {cat_id: name for name, cat_id in category_map.items()}
+                    learned = pd.Series(
+                        merchant_index.suggest_many(current_user.id, df.loc[blank_category, 'merchant']),
+                        index=df.index[blank_category],
+                    ).map(category_names).dropna()
+                    df.loc[learned.index, 'category'] = learned
+                    blank_category.loc[learned.index] = False
+
+                if blank_category.any():
+                    guesses = get_classifier().classify_many(df.loc[blank_category, 'merchant'])
+                    known_guesses = guesses[guesses.str.lower().isin(category_map.keys())]
+                    df.loc[known_guesses.index, 'category'] = known_guesses
+
                 invalid_categories = []
                 df['category_id'] = None
 
@@ -3062,17 +3188,24 @@ def data_page_callbacks(app):
 
                 # Import spending to transactions table
                 if not spending_df.empty:
+                    # Resolve merchant ids once per distinct merchant
+                    merchant_ids = db.get_merchant_ids(current_user.id, spending_df['merchant'])
+                    spending_df = spending_df.assign(merchant_id=spending_df['merchant'].map(merchant_ids))
+
                     spending_transactions = spending_df[['category_id', 'merchant', 'amount', 'date', 'note', 'recurring']].to_records(index=False)
 
                     records_with_user = [
-                        (*record, current_user.id) for record in spending_transactions
+                        (*record, current_user.id, merchant_id)
+                        for record, merchant_id in zip(spending_transactions, spending_df['merchant_id'])
                     ]
 
-                    with db._get_cursor() as cursor:
+                    # Bulk inserts of a large file are allowed to run past the query budget
+                    with db._get_cursor(budget=None) as cursor:
                         cursor.executemany(
-                            "INSERT INTO transactions (category_id, merchant, amount, date, note, recurring) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            "INSERT INTO transactions (category_id, merchant, amount, date, note, recurring, user_id, merchant_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
                             records_with_user,
                         )
+                    db.mark_user_data_changed(current_user.id)
 
                 # Handle recurring spending transactions
                 recurring_spending = spending_df[spending_df['recurring'] == 1]
@@ -3091,16 +3224,23 @@ def data_page_callbacks(app):
                         ))
                     
                     records_with_user = [
-                        (*record, current_user.id) for record in recurring_records
+                        (*record, current_user.id, merchant_ids.get(record[1])) for record in recurring_records
                     ]
 
-                    with db._get_cursor() as cursor:
+                    with db._get_cursor(budget=None) as cursor:
                         cursor.executemany(
                             """INSERT INTO recurringTransactions 
-                            (trans_id, merchant, amount, date, note, recurring, category_id)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                            (trans_id, merchant, amount, date, note, recurring, category_id, user_id, merchant_id)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
                             records_with_user,
                         )
+                    db.mark_user_data_changed(current_user.id)
+
+                if not spending_df.empty:
+                    merchant_index.record_many(
+                        current_user.id,
+                        zip(spending_df['merchant'], spending_df['category_id']),
+                    )
 
                 # Import income to income table
                 if not income_df.empty:
@@ -3108,14 +3248,15 @@ def data_page_callbacks(app):
                     income_df['amount'] = income_df['amount'].abs()
                     # Use merchant as source for income
                     income_records = income_df[['merchant', 'amount', 'date']].to_records(index=False)
-                    with db._get_cursor() as cursor:
+                    with db._get_cursor(budget=None) as cursor:
                         
                         records_with_user = [(*record, current_user.id) for record in income_records]
                         
                         cursor.executemany(
-                            "INSERT INTO income (source, amount, date) VALUES (?, ?, ?, ?)",
+                            "INSERT INTO income (source, amount, date, user_id) VALUES (?, ?, ?, ?)",
                             records_with_user,
                         )
+                    db.mark_user_data_changed(current_user.id)
 
                 total_imported = len(spending_df) + len(income_df)
                 message = []
@@ -3312,6 +3453,7 @@ def data_page_callbacks(app):
         prevent_initial_call=True
     )
     @authenticate_callback
+    @instrument_callback
     def manage_assets(add_clicks, clear_clicks, name, amount, asset_type, note, stored_assets):
         ctx = callback_context
         triggered_id = ctx.triggered[0]['prop_id'].split('.')[0]
@@ -3389,6 +3531,7 @@ def data_page_callbacks(app):
         prevent_initial_call=True
     )
     @authenticate_callback
+    @instrument_callback
     def remove_asset(remove_clicks, stored_assets):
         if not any(remove_clicks):
             raise PreventUpdate
@@ -3460,6 +3603,7 @@ def data_page_callbacks(app):
         prevent_initial_call=True
     )
     @authenticate_callback
+    @instrument_callback
     def manage_liabilities(add_clicks, clear_clicks, name, amount, liability_type, note, stored_liabilities):
         ctx = callback_context
         triggered_id = ctx.triggered[0]['prop_id'].split('.')[0]
@@ -3538,6 +3682,7 @@ def data_page_callbacks(app):
         prevent_initial_call=True
     )
     @authenticate_callback
+    @instrument_callback
     def remove_liability(remove_clicks, stored_liabilities):
         if not any(remove_clicks):
             raise PreventUpdate
@@ -3601,6 +3746,7 @@ def data_page_callbacks(app):
         Input('stored-liabilities', 'data')]
     )
     @authenticate_callback
+    @instrument_callback
     def update_review_totals(assets, liabilities):
         total_assets = sum(asset['amount'] for asset in assets) if assets else 0
         total_liabilities = sum(liability['amount'] for liability in liabilities) if liabilities else 0
@@ -3625,6 +3771,7 @@ def data_page_callbacks(app):
         prevent_initial_call=True
     )
     @authenticate_callback
+    @instrument_callback
     def save_networth_snapshot(n_clicks, assets, liabilities, note, existing_data):
         if not n_clicks:
             raise PreventUpdate
@@ -3685,6 +3832,7 @@ def data_page_callbacks(app):
                         """,
                         (snapshot_id, liability['name'], 'liability', liability['type'], liability['amount'], liability.get('note', ''))
                     )
+            db.mark_user_data_changed(current_user.id)
             
             # Prepare success message
             success_message = f"Snapshot saved for {snapshot_date} with {len(assets)} assets and {len(liabilities)} liabilities"
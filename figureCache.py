@@ -0,0 +1,125 @@
+# figureCache.py
+# Bounded per-user cache of finished figure payloads for the homepage callbacks.
+# Entries are keyed by (callback, normalized inputs, today, user data version), so
+# a write that bumps the user's data version makes all of their entries stale.
+
+import threading
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+
+from flask_login import current_user
+
+import staleRequests
+import tracing
+
+MAX_ENTRIES_PER_USER = 24   # Figures kept per user, least recently used dropped first
+MAX_USERS = 128             # Users kept, least recently active dropped first
+
+_MISSING = object()
+
+
+def _normalize(value):
+    """Turn callback inputs into something hashable and order independent"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _normalize(v)) for k, v in value.items()))
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return repr(value)
+
+
+def _to_payload(result):
+    """Convert figures to their plain JSON structure once, so hits skip Plotly entirely"""
+    if isinstance(result, tuple):
+        return tuple(_to_payload(item) for item in result)
+    if hasattr(result, "to_plotly_json"):
+        return result.to_plotly_json()
+    return result
+
+
+class FigureCache:
+    def __init__(self, version_source, max_entries_per_user=MAX_ENTRIES_PER_USER, max_users=MAX_USERS):
+        """
+        Args:
+            version_source: callable user_id -> data version (e.g. ExpenseDB.get_data_version)
+            max_entries_per_user: figures kept per user
+            max_users: users kept
+        """
+        self._version_source = version_source
+        self.max_entries_per_user = max_entries_per_user
+        self.max_users = max_users
+        self._users = OrderedDict()  # user_id -> OrderedDict(key -> payload)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id, key):
+        with self._lock:
+            entries = self._users.get(user_id)
+            if entries is None or key not in entries:
+                self.misses += 1
+                return _MISSING
+            self._users.move_to_end(user_id)
+            entries.move_to_end(key)
+            self.hits += 1
+            return entries[key]
+
+    def put(self, user_id, key, payload):
+        with self._lock:
+            entries = self._users.get(user_id)
+            if entries is None:
+                entries = self._users[user_id] = OrderedDict()
+            self._users.move_to_end(user_id)
+            entries[key] = payload
+            entries.move_to_end(key)
+
+            while len(entries) > self.max_entries_per_user:
+                entries.popitem(last=False)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id=None):
+        """Drop cached figures for one user, or for everyone"""
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users": len(self._users),
+                "entries": sum(len(entries) for entries in self._users.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def cached(self, func):
+        """Decorator for callbacks whose outputs depend only on their inputs and the user's data"""
+        @wraps(func)
+        def wrapper(*args):
+            user_id = current_user.id
+            key = (
+                func.__name__,
+                _normalize(args),
+                date.today().isoformat(),  # Relative ranges like "last 30 days" move with the date
+                self._version_source(user_id),
+            )
+
+            payload = self.get(user_id, key)
+            if payload is not _MISSING:
+                return payload
+
+            with tracing.span("figure build", "figure", callback=func.__name__):
+                result = func(*args)
+            with tracing.span("figure to json", "figure", callback=func.__name__):
+                payload = _to_payload(result)
+            if not staleRequests.is_stale():  # A superseded build is dropped, do not keep it either
+                self.put(user_id, key, payload)
+            return payload
+        return wrapper
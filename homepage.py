@@ -2,11 +2,22 @@
 import calendar
 from datetime import datetime, timedelta, date
 import dash_bootstrap_components as dbc
-from dash import html, dcc, Input, Output, State, callback_context, no_update
+from dash import html, dcc, Input, Output, State, no_update, Patch
 from dash.exceptions import PreventUpdate
 import plotly.graph_objects as go
-from collections import defaultdict
+from collections import Counter, OrderedDict
 from functools import wraps
+import threading
+
+from sankey import build_sankey_model, build_transaction_nodes, CATEGORY
+from figureCache import FigureCache
+from perfMonitor import instrument_callback
+from staleRequests import PAGE_LOAD_STORE, latest_only, page_load_store
+from database import QueryTimeoutError
+
+SANKEY_TOP_N = 10
+SANKEY_DRILLDOWN_MAX = 50       # Transactions shown when expanding a category without the lag limiter
+SANKEY_CACHE_SIZE = 256         # Drill-down results kept per process
 
 # Security
 from flask_login import current_user, login_required
@@ -19,6 +30,245 @@ from flask_login import current_user, login_required
 #         return func(*args, **kwargs)
 #     return wrapper
 
+def render_query_timeout(*other_outputs):
+    """
+    Show a query that ran past its time budget in the graph instead of failing the callback
+
+    Args:
+        other_outputs: values for the outputs after the figure and its title
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            except QueryTimeoutError as e:
+                fig = go.Figure()
+                fig.add_annotation(text=str(e), showarrow=False, font=dict(size=14, color="#d62728"))
+                fig.update_layout(template="gridon", xaxis=dict(visible=False), yaxis=dict(visible=False))
+                return (fig, "Query took too long", *other_outputs)
+        return wrapper
+    return decorator
+
+# --- FIGURES ---
+# Built from query results only, so benchmarks/bench.py can time the exact homepage figures
+def build_category_bar_figure(data, title_suffix, budget_data=None):
+    """
+    Spending per category as bars, colored against the budgets when budget_data is given
+
+    Args:
+        data: (category, total) rows, not empty
+        title_suffix: period shown in the title
+        budget_data: (category, budget) rows, None for plain bars
+
+    Returns:
+        figure, total spent
+    """
+    categories, totals = zip(*data)
+    categories = list(categories)  # list with fixed order
+    totals = list(totals)
+    total = sum(totals)
+
+    # Create figure
+    fig = go.Figure()
+    
+    # Determine colors based on budget comparison
+    if budget_data is not None:
+        budget_dict = dict(budget_data)
+        budget_values = [budget_dict.get(cat, None) for cat in categories]
+        
+        # Create colors based on budget comparison
+        spending_colors = []
+        for cat, spent, budget in zip(categories, totals, budget_values):
+            if budget is None:
+                # No budget set - use neutral blue
+                spending_colors.append('#1f77b4')
+            elif spent <= budget:
+                # Under budget - green
+                spending_colors.append('#2ca02c')
+            else:
+                # Over budget - red
+                spending_colors.append('#d62728')
+        
+        # Add spending bars with budget-aware colors
+        fig.add_trace(go.Bar(
+            x=categories,
+            y=totals,
+            name='Spending',
+            marker_color=spending_colors,
+            customdata=categories,
+            width=0.4,
+            showlegend=False  # Don't show in legend since colors vary
+        ))
+        
+        # Add budget bars if requested
+        if any(b is not None for b in budget_values):
+            fig.add_trace(go.Bar(
+                x=categories,
+                y=budget_values,
+                name='Budget',
+                marker_color='#add8e6',
+                customdata=categories,
+                opacity=0.3,
+                width=0.2
+            ))
+            
+        # Add legend entries for color coding (invisible bars just for legend)
+        fig.add_trace(go.Bar(
+            x=[None], y=[None],
+            name='Within Budget',
+            marker_color='#2ca02c',
+            showlegend=True
+        ))
+        fig.add_trace(go.Bar(
+            x=[None], y=[None],
+            name='Over Budget',
+            marker_color='#d62728',
+            showlegend=True
+        ))
+        fig.add_trace(go.Bar(
+            x=[None], y=[None],
+            name='No Budget Set',
+            marker_color='#1f77b4',
+            showlegend=True
+        ))
+        
+    else:
+        # No budget display or not month filter - use neutral blue for all
+        fig.add_trace(go.Bar(
+            x=categories,
+            y=totals,
+            name='Spending',
+            marker_color='#1f77b4',
+            customdata=categories,
+            width=0.4
+        ))
+
+    fig.update_layout(
+        title=f"<b>Total Spent per Category - {title_suffix}</b>",
+        xaxis_title="Category",
+        yaxis_title="Amount, $",
+        template="gridon",
+        bargap=0.4,
+        yaxis=dict(
+            automargin=True,
+        ),
+        xaxis=dict(
+            tickangle = -25,
+            automargin=True,
+        ),
+        margin=dict(t=60),
+        barmode='overlay',
+        autosize = True
+    )
+
+    return fig, total
+
+
+def build_trend_figure(monthly_data, month, category_filter):
+    """
+    Spending per category per month, January to month
+
+    Args:
+        monthly_data: (category, month number, amount) rows
+        month: last month shown
+        category_filter: categories to draw
+    """
+    # Organize data by category
+    categories = {}
+    for category, month_num, amount in monthly_data:
+        # Skip categories not in the filter
+        if not category_filter or category not in category_filter:
+            continue
+            
+        if category not in categories:
+            categories[category] = {}
+        categories[category][int(month_num)] = amount
+
+    fig = go.Figure()
+    
+    month_names = [calendar.month_abbr[m] for m in range(1, month+1)]
+    
+    for category in categories:
+        # Fill in data for all months (zero if missing)
+        amounts = []
+        for m in range(1, month+1):
+            amounts.append(categories[category].get(m, 0))
+        
+        fig.add_trace(go.Scatter(
+            x=month_names,
+            y=amounts,
+            name=category,
+            mode='lines+markers',
+            marker=dict(size=8),
+            line=dict(width=2)
+        ))
+    
+    fig.update_layout(
+        title=f"<b>Spending trend per Category</b>",
+        yaxis_title="Amount, $",
+        template="gridon",
+        hovermode="x unified",
+        legend=dict(
+            orientation="h",
+            yanchor="top",
+            y=-0.1,  # Position below the plot area
+            xanchor="center",
+            x=0.5
+        ),
+        autosize=True
+    )
+    
+    return fig
+
+
+def build_sankey_figure(model, show_transactions):
+    """
+    Money flow figure from a build_sankey_model result
+
+    Returns:
+        figure, height in pixels
+    """
+    num_transactions = model["num_transactions"]
+
+    fig = go.Figure(go.Sankey(    
+        arrangement='snap',
+        node=dict(
+            pad=15,
+            thickness=15,
+            line=dict(color="black", width=0.5),
+            label=model["labels"],
+            color=model["colors"],
+            customdata=model["levels"],
+            x = model["x"],
+            y = model["y"]
+        ),
+        link=dict(
+            source=model["sources"],
+            target=model["targets"],
+            value=model["values"],
+            color=model["link_colors"]
+        )
+    ))
+    
+    if show_transactions:
+        auto_height = 300 + num_transactions * 20
+        if auto_height > 700:
+            auto_height = 700
+        
+        fig.update_layout(
+            title = f"<b>Money Flow diagram</b>",
+            font_size=15,
+            autosize=True,
+            #margin=dict(t=0, l=0, r=0, b=20),
+            height=auto_height
+        )
+    else:
+        auto_height = 550
+
+    return fig, auto_height
+
+
 # --- FRONTEND ---
 def homepage_layout():
     
@@ -588,7 +838,7 @@ def homepage_layout():
                                         options=[
                                             {"label": "Transactions", "value": "enable"}
                                         ],
-                                        value=["enable"],
+                                        value=[],
                                         switch=True,
                                         className="dash-checklist-group",
                                     ),
@@ -621,6 +871,8 @@ def homepage_layout():
                                     figure=go.Figure(),
                                     config={"displaylogo": False, "responsive": True},
                                 ),
+                                # Range and expanded categories of the figure shown, for drill-down
+                                dcc.Store(id="sankey-meta"),
                                 className="graph-container px-0",  # remove horizontal padding
                             ),
                             className="g-0",  # remove gutters
@@ -767,6 +1019,7 @@ def homepage_layout():
             ),
             # Hidden elements for storing data
             dcc.Store(id="net-worth-update-trigger", data={"initial_load": True}),
+            page_load_store(),
         ],
         id="main-container",
         fluid=True,
@@ -787,12 +1040,16 @@ def home_callbacks(app):
     from database import get_db
     db = get_db()
 
+    # Finished figures per user, stale as soon as the user's data version changes
+    figure_cache = FigureCache(db.get_data_version)
+
     # -- Populate layout --
     @app.callback(
         [Output("trend-category-filter", "options"),
         Output("trend-category-filter", "value")],
         Input("url", "pathname")  # Trigger on page load
     )
+    @instrument_callback
     def populate_trend_category_filter(_):
         # Fetch categories from database
         categories_data = db.get_categories(current_user.id)
@@ -804,53 +1061,65 @@ def home_callbacks(app):
         return category_options, all_values
     
     # -- Filter panel --
+    # Pure UI callbacks run in the browser, no server round-trip
+
     # Toggle collapse
-    @app.callback(
+    app.clientside_callback(
+        """
+        function(n, isOpen) {
+            if (n) {
+                return !isOpen;
+            }
+            return isOpen;
+        }
+        """,
         Output("filter-collapse", "is_open"),
         Input("filter-toggle", "n_clicks"),
         State("filter-collapse", "is_open")
     )
-    @login_required
-    def toggle_collapse(n, is_open):
-        
-        if n:
-            return not is_open
-        return is_open
 
     # Toggle radio items based on filter type
-    @app.callback(
+    app.clientside_callback(
+        """
+        function(filterType) {
+            const show = {"display": "block"};
+            const hide = {"display": "none"};
+            if (filterType === "month") {
+                return [show, hide, hide];
+            } else if (filterType === "last") {
+                return [hide, show, hide];
+            }
+            return [hide, hide, show];  // daterange
+        }
+        """,
         Output("month-filter-options", "style"),
         Output("last-filter-options", "style"),
         Output("daterange-filter-options", "style"),
         Input("filter-type", "value")
     )
-    @login_required
-    def toggle_filter_options(filter_type):
-        if filter_type == "month":
-            return {"display": "block"}, {"display": "none"}, {"display": "none"}
-        elif filter_type == "last":
-            return {"display": "none"}, {"display": "block"}, {"display": "none"}
-        else:  # daterange
-            return {"display": "none"}, {"display": "none"}, {"display": "block"}
 
     # Update the year input based on the arrow button clicks
-    @app.callback(
+    app.clientside_callback(
+        """
+        function(incrementClicks, decrementClicks, currentYear) {
+            const triggered = dash_clientside.callback_context.triggered;
+            if (!triggered || !triggered.length) {
+                return currentYear;
+            }
+            const buttonId = triggered[0].prop_id.split(".")[0];
+            if (buttonId === "year-increment") {
+                return currentYear + 1;
+            } else if (buttonId === "year-decrement") {
+                return currentYear - 1;
+            }
+            return currentYear;
+        }
+        """,
         Output("year-input", "value"),
         Input("year-increment", "n_clicks"),
         Input("year-decrement", "n_clicks"),
         State("year-input", "value")
     )
-    @login_required
-    def update_year(increment_clicks, decrement_clicks, current_year):
-        ctx = callback_context
-        if not ctx.triggered:
-            return current_year
-        button_id = ctx.triggered[0]["prop_id"].split(".")[0]
-        if button_id == "year-increment":
-            return current_year + 1
-        elif button_id == "year-decrement":
-            return current_year - 1
-        return current_year
     
 # ------------------------------------------------------------
 # -- INDICATOR ELEMENTS --
@@ -873,6 +1142,7 @@ def home_callbacks(app):
         prevent_initial_call=False
     )
     @login_required
+    @instrument_callback
     def populate_net_worth_viewer(trigger, end_date_input):
         
         # Format currency values
@@ -982,9 +1252,14 @@ def home_callbacks(app):
         Input("last-period-options", "value"),
         Input("custom-days-input", "value"),
         Input("start-date-picker", "date"),  # Add date range inputs
-        Input("end-date-picker", "date")
+        Input("end-date-picker", "date"),
+        State(PAGE_LOAD_STORE, "data"),
     )
     @login_required
+    @instrument_callback
+    @latest_only
+    @render_query_timeout()
+    @figure_cache.cached
     def update_bar_graph(filter_type, data_display, year, month, last_period_value, custom_days, start_date_picker, end_date_picker):
         
         now = datetime.now()
@@ -1025,106 +1300,9 @@ def home_callbacks(app):
         if not data:
             return go.Figure(), f"Total: $0.00"
 
-        categories, totals = zip(*data)
-        categories = list(categories)  # list with fixed order
-        totals = list(totals)
-        total = sum(totals)
-
-        # Create figure
-        fig = go.Figure()
-        
-        # Determine colors based on budget comparison and display_budget setting
-        if filter_type == "month" and display_budget:
-            # Get budget data for color coding
-            budget_data = db.get_budget_by_category(current_user.id)
-            budget_dict = dict(budget_data)
-            budget_values = [budget_dict.get(cat, None) for cat in categories]
-            
-            # Create colors based on budget comparison
-            spending_colors = []
-            for cat, spent, budget in zip(categories, totals, budget_values):
-                if budget is None:
-                    # No budget set - use neutral blue
-                    spending_colors.append('#1f77b4')
-                elif spent <= budget:
-                    # Under budget - green
-                    spending_colors.append('#2ca02c')
-                else:
-                    # Over budget - red
-                    spending_colors.append('#d62728')
-            
-            # Add spending bars with budget-aware colors
-            fig.add_trace(go.Bar(
-                x=categories,
-                y=totals,
-                name='Spending',
-                marker_color=spending_colors,
-                customdata=categories,
-                width=0.4,
-                showlegend=False  # Don't show in legend since colors vary
-            ))
-            
-            # Add budget bars if requested
-            if any(b is not None for b in budget_values):
-                fig.add_trace(go.Bar(
-                    x=categories,
-                    y=budget_values,
-                    name='Budget',
-                    marker_color='#add8e6',
-                    customdata=categories,
-                    opacity=0.3,
-                    width=0.2
-                ))
-                
-            # Add legend entries for color coding (invisible bars just for legend)
-            fig.add_trace(go.Bar(
-                x=[None], y=[None],
-                name='Within Budget',
-                marker_color='#2ca02c',
-                showlegend=True
-            ))
-            fig.add_trace(go.Bar(
-                x=[None], y=[None],
-                name='Over Budget',
-                marker_color='#d62728',
-                showlegend=True
-            ))
-            fig.add_trace(go.Bar(
-                x=[None], y=[None],
-                name='No Budget Set',
-                marker_color='#1f77b4',
-                showlegend=True
-            ))
-            
-        else:
-            # No budget display or not month filter - use neutral blue for all
-            fig.add_trace(go.Bar(
-                x=categories,
-                y=totals,
-                name='Spending',
-                marker_color='#1f77b4',
-                customdata=categories,
-                width=0.4
-            ))
-
-        fig.update_layout(
-            title=f"<b>Total Spent per Category - {title_suffix}</b>",
-            xaxis_title="Category",
-            yaxis_title="Amount, $",
-            template="gridon",
-            bargap=0.4,
-            yaxis=dict(
-                automargin=True,
-            ),
-            xaxis=dict(
-                tickangle = -25,
-                automargin=True,
-            ),
-            margin=dict(t=60),
-            barmode='overlay',
-            autosize = True
-        )
-
+        # Budget colors only make sense for a single month
+        budget_data = db.get_budget_by_category(current_user.id) if filter_type == "month" and display_budget else None
+        fig, total = build_category_bar_figure(data, title_suffix, budget_data)
         return fig, f"Total: ${total:,.2f}"
 
     # SUPPLEMENT CATEGORY BAR GRAPH CALLBACK
@@ -1138,9 +1316,14 @@ def home_callbacks(app):
         Input("last-period-options", "value"),
         Input("custom-days-input", "value"),
         Input("start-date-picker", "date"),  # Add date range inputs
-        Input("end-date-picker", "date")
+        Input("end-date-picker", "date"),
+        State(PAGE_LOAD_STORE, "data"),
     )
     @login_required
+    @instrument_callback
+    @latest_only
+    @render_query_timeout()
+    @figure_cache.cached
     def update_category_graph(click_data, filter_type, year, month, last_period_value, custom_days, start_date_picker, end_date_picker):
         if not click_data:
             return go.Figure(), ""
@@ -1245,9 +1428,14 @@ def home_callbacks(app):
         Input("year-input", "value"),
         Input("month-slider", "value"),
         Input("filter-type", "value"),
-        Input("trend-category-filter", "value")
+        Input("trend-category-filter", "value"),
+        State(PAGE_LOAD_STORE, "data"),
     )
     @login_required
+    @instrument_callback
+    @latest_only
+    @render_query_timeout()
+    @figure_cache.cached
     def update_trend_graph(year, month, filter_type, category_filter):
         # Only for month vew
         if filter_type != "month":
@@ -1259,51 +1447,7 @@ def home_callbacks(app):
         if not monthly_data:
             return go.Figure(), f"No data for {year} until {calendar.month_name[month]}"
         
-        # Organize data by category
-        categories = {}
-        for category, month_num, amount in monthly_data:
-            # Skip categories not in the filter
-            if not category_filter or category not in category_filter:
-                continue
-                
-            if category not in categories:
-                categories[category] = {}
-            categories[category][int(month_num)] = amount
-
-        fig = go.Figure()
-        
-        month_names = [calendar.month_abbr[m] for m in range(1, month+1)]
-        
-        for category in categories:
-            # Fill in data for all months (zero if missing)
-            amounts = []
-            for m in range(1, month+1):
-                amounts.append(categories[category].get(m, 0))
-            
-            fig.add_trace(go.Scatter(
-                x=month_names,
-                y=amounts,
-                name=category,
-                mode='lines+markers',
-                marker=dict(size=8),
-                line=dict(width=2)
-            ))
-        
-        fig.update_layout(
-            title=f"<b>Spending trend per Category</b>",
-            yaxis_title="Amount, $",
-            template="gridon",
-            hovermode="x unified",
-            legend=dict(
-                orientation="h",
-                yanchor="top",
-                y=-0.1,  # Position below the plot area
-                xanchor="center",
-                x=0.5
-            ),
-            autosize=True
-        )
-        
+        fig = build_trend_figure(monthly_data, month, category_filter)
         return fig, f"Trend from January to {calendar.month_name[month]} {year}"
     
     # Income net trend graph
@@ -1312,9 +1456,14 @@ def home_callbacks(app):
         Output("trend-title-inc", "children"),
         Input("year-input", "value"),
         Input("month-slider", "value"),
-        Input("filter-type", "value")
+        Input("filter-type", "value"),
+        State(PAGE_LOAD_STORE, "data"),
     )
     @login_required
+    @instrument_callback
+    @latest_only
+    @render_query_timeout()
+    @figure_cache.cached
     def update_net_income_graph(year, month, filter_type):
         
         # Only if month view
@@ -1398,6 +1547,7 @@ def home_callbacks(app):
         Output("sankey-diagram", "figure"),
         Output("sankey-title", "children"),
         Output("sankey-height", "value"),
+        Output("sankey-meta", "data"),
         Input("filter-type", "value"),
         Input("year-input", "value"),
         Input("month-slider", "value"),
@@ -1406,9 +1556,14 @@ def home_callbacks(app):
         Input("start-date-picker", "date"),  # New input
         Input("end-date-picker", "date"),     # New input
         Input("lag-limiter", "value"),
-        Input("trans-limiter", "value")
+        Input("trans-limiter", "value"),
+        State(PAGE_LOAD_STORE, "data"),
     )
     @login_required
+    @instrument_callback
+    @latest_only
+    @render_query_timeout(no_update, None)
+    @figure_cache.cached
     def update_sankey_diagram(filter_type, year, month, last_period_value, custom_days, start_date_picker, end_date_picker, lag_limiter, trans_limiter):
         now = datetime.now()
         
@@ -1421,11 +1576,11 @@ def home_callbacks(app):
             # Validate inputs for "last period" mode
             if last_period_value == "custom":
                 if custom_days is None or custom_days <= 0:
-                    return go.Figure(), "No period selected", no_update
+                    return go.Figure(), "No period selected", no_update, None
                 days = custom_days
             else:
                 if last_period_value is None:
-                    return go.Figure(), "No period selected", no_update
+                    return go.Figure(), "No period selected", no_update, None
                 days = int(last_period_value)
             
             start_date = (now - timedelta(days=days)).strftime("%Y-%m-%d")
@@ -1433,48 +1588,39 @@ def home_callbacks(app):
             title_suffix = f"Last {days} Days"
         else:  # Date range filter
             if not start_date_picker or not end_date_picker:
-                return go.Figure(), "Please select both start and end dates", no_update
+                return go.Figure(), "Please select both start and end dates", no_update, None
             
             start_date = start_date_picker
             end_date = end_date_picker
             title_suffix = f"{start_date} to {end_date}"
 
-        # OPTIMIZATION: Limit VISUALIZED transactions to top 10 per category if needed
-        if lag_limiter and "enable" in lag_limiter:
+        show_transactions = bool(trans_limiter and "enable" in trans_limiter)
 
-            # Get data
-            income_data, spending_data, all_transactions_data = db.get_all_transactions_flow(start_date, end_date, current_user.id)
+        if not show_transactions:
 
-            if not income_data and not spending_data and not all_transactions_data:
-                    return go.Figure(), f"No data available for {title_suffix}", no_update
+            # Category level only, transactions are fetched per category on click
+            income_data, spending_data, _ = db.get_top_transactions_flow(
+                start_date, end_date, current_user.id, top_n=0
+            )
+            transactions_data = []
 
-            if len(all_transactions_data) > 100:
-                
-                # Calculate accurate category totals using ALL transactions
-                category_totals = {}
-                for category, _, amount in all_transactions_data:
-                    category_totals[category] = category_totals.get(category, 0) + amount
-                
-                # Update spending_data with accurate totals
-                spending_data = [(category, category_totals[category]) for category in category_totals]
-                    
-                transactions_by_category = defaultdict(list)
-                for category, merchant, amount in all_transactions_data:
-                    transactions_by_category[category].append((amount, merchant))
-                
-                # Get top 10 transactions per category for visualization only
-                viz_transactions = []
-                for category in transactions_by_category:
-                    # Take first 10 transactions without sorting
-                    category_transactions = transactions_by_category[category][:10]
-                    for amount, merchant in category_transactions:
-                        viz_transactions.append((category, merchant, amount))
-                
-                transactions_data = viz_transactions
-                title_suffix += " (Top 10 per category limit)"
+            if not income_data and not spending_data:
+                return go.Figure(), f"No data available for {title_suffix}", no_update, None
 
-            else:
-                transactions_data = all_transactions_data
+        # OPTIMIZATION: Limit VISUALIZED transactions to top 10 per category if needed
+        elif lag_limiter and "enable" in lag_limiter:
+
+            # Top 10 per category plus an "Other" remainder, totals stay accurate
+            income_data, spending_data, transactions_data = db.get_top_transactions_flow(
+                start_date, end_date, current_user.id, top_n=SANKEY_TOP_N
+            )
+
+            if not income_data and not spending_data and not transactions_data:
+                    return go.Figure(), f"No data available for {title_suffix}", no_update, None
+
+            rows_per_category = Counter(category for category, _, _ in transactions_data)
+            if any(rows > SANKEY_TOP_N for rows in rows_per_category.values()):
+                title_suffix += f" (Top {SANKEY_TOP_N} per category limit)"
 
         else:
 
@@ -1482,269 +1628,110 @@ def home_callbacks(app):
             income_data, spending_data, transactions_data = db.get_all_transactions_flow(start_date, end_date, current_user.id)
             
             if not income_data and not spending_data and not transactions_data:
-                return go.Figure(), f"No data available for {title_suffix}", no_update
-        
-        # Create nodes, links, and COLOR settings
-        labels = []
-        sources = []
-        targets = []
-        values = []
-        colors = []
+                return go.Figure(), f"No data available for {title_suffix}", no_update, None
         
-        opacityTarget = 0.6
-        greenColor = 'rgba(34,139,34, 0.6)'
-        redColor = 'rgba(255,0,0, 0.4)'
-        
-        # Create a dictionary to map labels to indices
-        label_to_index = {}
-        current_index = 0
-        
-        # Add income sources (first level)
-        income_total = 0
-        for source, amount in income_data:
-            if source not in label_to_index:
-                label_to_index[source] = current_index
-                labels.append(source)
-                colors.append(greenColor)  # Green for income
-                current_index += 1
-            income_total += amount
-            
-        # Add spending categories (second level)
-        spending_total = 0
-        for category, amount in spending_data:
-            if category not in label_to_index:
-                label_to_index[category] = current_index
-                labels.append(category)
-                colors.append(redColor)  # Red for spending
-                current_index += 1
-            spending_total += amount
-            
-        savings_amount = income_total - spending_total
-        
-        # Add a total income node
-        if savings_amount >= 0:
-            total_income_label = f"Income (${income_total:.2f})<br>Spent (${spending_total:.2f})"
-        else:
-            total_income_label = f"Income (${income_total:.2f})<br>Spent (${spending_total:.2f})<br>Net -(${abs(savings_amount):.2f})"
-        
-        label_to_index[total_income_label] = current_index
-        labels.append(total_income_label)
-        if savings_amount > 0:
-            colors.append(greenColor)
-        else:
-            colors.append(redColor)
-        current_index += 1
-        
-        # Link income sources to total income
-        for source, amount in income_data:
-            sources.append(label_to_index[source])
-            targets.append(label_to_index[total_income_label])
-            values.append(amount)
-        
-        # Link total income to spending categories
-        for category, amount in spending_data:
-            sources.append(label_to_index[total_income_label])
-            targets.append(label_to_index[category])
-            values.append(amount)
-            
-        # Add savings
-        if savings_amount > 0:
-            savings_label = f"Saved (${savings_amount:.2f})"
-            label_to_index[savings_label] = current_index
-            labels.append(savings_label)
-            colors.append('rgba(160, 160, 160, 0.6)')
-            current_index += 1
-            
-        # Link total income to savings
-        if savings_amount > 0:
-            sources.append(label_to_index[total_income_label])
-            targets.append(label_to_index[savings_label])
-            values.append(savings_amount)
-        
-        node_x = []
-        node_y = []
-        padding = 15
-        transaction_threshhold = 30
-        
-        if trans_limiter and "enable" in trans_limiter:
-            # Add individual transactions (third level)
-            transaction_colors = [
-                f'rgba(255, 127, 14, {opacityTarget})',    # Orange
-                f'rgba(148, 103, 189, {opacityTarget})',   # Purple
-                f'rgba(140, 86, 75, {opacityTarget})',     # Brown
-                f'rgba(227, 119, 194, {opacityTarget})',   # Pink
-                f'rgba(127, 127, 127, {opacityTarget})',   # Gray
-                f'rgba(188, 189, 34, {opacityTarget})',    # Olive
-                f'rgba(23, 190, 207, {opacityTarget})',    # Cyan
-                f'rgba(44, 160, 44, {opacityTarget})',     # Green
-                f'rgba(31, 119, 180, {opacityTarget})',    # Blue
-                f'rgba(152, 223, 138, {opacityTarget})',   # Light Green
-                f'rgba(174, 199, 232, {opacityTarget})',   # Light Blue
-                f'rgba(197, 176, 213, {opacityTarget})',   # Light Purple
-                f'rgba(196, 156, 148, {opacityTarget})',   # Light Brown
-                f'rgba(247, 182, 210, {opacityTarget})',   # Light Pink
-                f'rgba(219, 219, 141, {opacityTarget})',   # Light Yellow
-                f'rgba(158, 218, 229, {opacityTarget})',   # Light Cyan
-                f'rgba(255, 187, 120, {opacityTarget})',   # Light Orange
-                f'rgba(199, 199, 199, {opacityTarget})'    # Light Gray
-            ]
-            
-            num_transactions = 0
-            transaction_labels = []
-            color_idx = 0
-            for category, merchant, amount in transactions_data:
-                
-                transaction_label = f"{merchant[:20] + '...' if len(merchant) > 20 else merchant} (${amount:.2f})"
-                if transaction_label not in label_to_index:
-                    label_to_index[transaction_label] = current_index
-                    labels.append(transaction_label)
-                    colors.append(transaction_colors[color_idx % len(transaction_colors)])
-                    color_idx += 1
-                    current_index += 1
-                
-                # Link category to transaction
-                sources.append(label_to_index[category])
-                targets.append(label_to_index[transaction_label])
-                values.append(amount)
+        model = build_sankey_model(income_data, spending_data, transactions_data, show_transactions)
+        fig, auto_height = build_sankey_figure(model, show_transactions)
+        if not show_transactions:
+            title_suffix += " - click a category to show its transactions"
 
-                num_transactions += 1
-                transaction_labels.append(transaction_label)
-        
-            # Create the Sankey diagram
-            # Calculate positions
-
-            # Define vertical positions for each level
-            LEVEL_POSITIONS = {
-                'income': 0.1,        # Leftmost (sources)
-                'total': 0.3,         # Center left
-                'categories': 0.35,    # Center right
-                'savings': 0.85,       # Above center
-            }
-            
-            for label in labels:
-                
-                if label in [source for source, _ in income_data]:
-                    # Income sources
-                    node_x.append(0)
-                    node_y.append(LEVEL_POSITIONS['income'])
-
-                elif label == total_income_label:
-                    # Total income
-                    node_x.append(0.33)
-                    node_y.append(LEVEL_POSITIONS['total'])
-
-                # Spending categories (center right)
-                elif label in [category for category, _ in spending_data]:
-                    node_x.append(0.66)
-                    node_y.append(LEVEL_POSITIONS['categories'])
-
-                elif label in transaction_labels:
-                    # Transactions
-                    if num_transactions > transaction_threshhold:
-                        # Transactions distribute positions so that no conflict with savings
-                        index = transaction_labels.index(label)
-                        if num_transactions == 1:
-                            position = 0.5  # Center if only one transaction
-                        else:
-                            position = 0.0001 + (0.9999 * index / (num_transactions - 1))
-                        node_x.append(1.0)
-                        node_y.append(position)
-                    else:
-                        node_x.append(1.0)
-                        node_y.append(0.35)
-                    
-                # Savings label
-                elif savings_amount > 0 and label == savings_label:
-                    if label == savings_label:
-                        # Savings
-                        node_x.append(0.5)
-                        node_y.append(LEVEL_POSITIONS['savings'])
-        else:
-            # Define vertical positions for each level
-            LEVEL_POSITIONS = {
-                'income': 0.0,        # Leftmost (sources)
-                'total': 0.0001,         # Center left
-                'categories': 0.0005,    # Center right
-                'savings': 0.95,       # Above center
-            }
-            
-            for label in labels:
-                
-                if label in [source for source, _ in income_data]:
-                    # Income sources
-                    node_x.append(0)
-                    node_y.append(LEVEL_POSITIONS['income'])
-
-                elif label == total_income_label:
-                    # Total income
-                    node_x.append(0.4)
-                    node_y.append(LEVEL_POSITIONS['total'])
-
-                # Spending categories (center right)
-                elif label in [category for category, _ in spending_data]:
-                    node_x.append(0.8)
-                    node_y.append(LEVEL_POSITIONS['categories'])
-                    
-                # Savings label
-                elif savings_amount > 0 and label == savings_label:
-                    if label == savings_label:
-                        # Savings
-                        node_x.append(0.6)
-                        node_y.append(LEVEL_POSITIONS['savings'])
-
-        fig = go.Figure(go.Sankey(    
-            arrangement='snap',
-            node=dict(
-                pad=padding,
-                thickness=15,
-                line=dict(color="black", width=0.5),
-                label=labels,
-                color=colors,
-                x = node_x,
-                y = node_y
-            ),
-            link=dict(
-                source=sources,
-                target=targets,
-                value=values,
-                color=[redColor if labels[trg] in [category for category, _ in spending_data] 
-                        else greenColor if labels[src] in [source for source, _ in income_data]
-                        else colors[trg]
-                        for trg, src in zip(targets, sources)]
-            )
-        ))
+        meta = {
+            "start_date": start_date,
+            "end_date": end_date,
+            "top_n": SANKEY_TOP_N if lag_limiter and "enable" in lag_limiter else SANKEY_DRILLDOWN_MAX,
+            "expandable": not show_transactions,
+            "expanded": [],
+            "num_nodes": len(model["labels"]),
+            "color_offset": 0,
+        }
         
-        if trans_limiter and "enable" in trans_limiter:
-            auto_height = 300 + num_transactions * 20
-            if auto_height > 700:
-                auto_height = 700
-            
-            fig.update_layout(
-                title = f"<b>Money Flow diagram</b>",
-                font_size=15,
-                autosize=True,
-                #margin=dict(t=0, l=0, r=0, b=20),
-                height=auto_height
-            )
-        else:
-            auto_height = 550
-        
-        return fig, f"Flow for {title_suffix}", auto_height
+        return fig, f"Flow for {title_suffix}", auto_height, meta
+
+    # Drill-down rows per (user, range, category, data version), least recently used first
+    drilldown_cache = OrderedDict()
+    drilldown_lock = threading.Lock()
+
+    def get_drilldown_rows(start_date, end_date, category, top_n):
+        key = (current_user.id, start_date, end_date, category, top_n, db.get_data_version(current_user.id))
+        with drilldown_lock:
+            rows = drilldown_cache.get(key)
+            if rows is not None:
+                drilldown_cache.move_to_end(key)
+                return rows
+
+        rows = db.get_category_transactions_flow(start_date, end_date, category, current_user.id, top_n=top_n)
+
+        with drilldown_lock:
+            drilldown_cache[key] = rows
+            drilldown_cache.move_to_end(key)
+            while len(drilldown_cache) > SANKEY_CACHE_SIZE:
+                drilldown_cache.popitem(last=False)
+        return rows
+
+    # Splice a clicked category's transactions into the figure already on the page
+    @app.callback(
+        Output("sankey-diagram", "figure", allow_duplicate=True),
+        Output("sankey-meta", "data", allow_duplicate=True),
+        Output("sankey-title", "children", allow_duplicate=True),
+        Input("sankey-diagram", "clickData"),
+        State("sankey-meta", "data"),
+        prevent_initial_call=True
+    )
+    @login_required
+    @instrument_callback
+    def expand_sankey_category(click_data, meta):
+        if not click_data or not meta or not meta.get("expandable"):
+            raise PreventUpdate
+
+        # Only category nodes carry the category level as customdata, links carry none
+        point = click_data["points"][0]
+        category = point.get("label")
+        if point.get("customdata") != CATEGORY or category in meta["expanded"]:
+            raise PreventUpdate
+
+        try:
+            rows = get_drilldown_rows(meta["start_date"], meta["end_date"], category, meta["top_n"])
+        except QueryTimeoutError as e:
+            # Keep the figure as it is, the category can be clicked again
+            return no_update, no_update, f"{category}: {e}"
+        if not rows:
+            raise PreventUpdate
+
+        nodes = build_transaction_nodes(point["pointNumber"], rows, meta["num_nodes"], meta["color_offset"])
+
+        patched_figure = Patch()
+        node = patched_figure["data"][0]["node"]
+        node["label"].extend(nodes["labels"])
+        node["color"].extend(nodes["colors"])
+        node["customdata"].extend(nodes["levels"])
+        node["x"].extend(nodes["x"])
+        node["y"].extend(nodes["y"])
+        link = patched_figure["data"][0]["link"]
+        link["source"].extend(nodes["sources"])
+        link["target"].extend(nodes["targets"])
+        link["value"].extend(nodes["values"])
+        link["color"].extend(nodes["link_colors"])
+
+        meta["expanded"].append(category)
+        meta["num_nodes"] += len(nodes["labels"])
+        meta["color_offset"] += len(nodes["labels"])
+        return patched_figure, meta, no_update
     
-    # Change height upon user input
+    # Change height upon user input, only the height goes over the wire
     @app.callback(
         Output("sankey-diagram", "figure", allow_duplicate=True),
         Input("sankey-height", "value"),
-        State("sankey-diagram", "figure"),
         prevent_initial_call=True
     )
     @login_required
-    def update_height(user_height, current_figure):
-        if current_figure is None:
+    @instrument_callback
+    def update_height(user_height):
+        if user_height is None:
             return no_update
-            
-        current_figure['layout']['height'] = user_height
-        return current_figure
+
+        patched_figure = Patch()
+        patched_figure['layout']['height'] = user_height
+        return patched_figure
 # --------------------------------------------------------------------------------
 
 # -- MOVEMENT TREND GRAPH AND NET WORTH GRAPH HANDLER --
@@ -1754,9 +1741,14 @@ def home_callbacks(app):
         Output('trend-title-movement', 'children'),
         Input('start-date-picker-movement', 'date'),
         Input('end-date-picker-movement', 'date'),
-        Input('show-net-worth-movement', 'value')
+        Input('show-net-worth-movement', 'value'),
+        State(PAGE_LOAD_STORE, "data"),
     )
     @login_required
+    @instrument_callback
+    @latest_only
+    @render_query_timeout()
+    @figure_cache.cached
     def update_movement_graph(start_date, end_date, show_net_worth):
         
         title_text = ""
@@ -1889,17 +1881,20 @@ def home_callbacks(app):
         return fig, title_text
     
     # Start date picker visibility toggle
-    @app.callback(
+    app.clientside_callback(
+        """
+        function(netWorthSwitch) {
+            // If switch is enabled, hide start date
+            if (netWorthSwitch && netWorthSwitch.includes("enable")) {
+                return [{"display": "none"}, {"display": "none"}];
+            }
+            // Otherwise show
+            return [{"margin-right": "10px"}, {"display": "block"}];
+        }
+        """,
         [Output('start-date-picker-movement', 'style'),
         Output('start-date-label-movement', 'style')],
         [Input('show-net-worth-movement', 'value')]
     )
-    @login_required
-    def toggle_date_picker_visibility(net_worth_switch):
-        # If switch is enabled, hide start date
-        if net_worth_switch and "enable" in net_worth_switch:
-            return {'display': 'none'}, {'display': 'none'}
-        # Otherwise show
-        return {'margin-right': '10px'}, {'display': 'block'}
     
 # --------------------------------------------------------------------------------
\ No newline at end of file
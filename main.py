@@ -1,13 +1,26 @@
 import dash
 import dash_bootstrap_components as dbc
 from dash import html, dcc, Input, Output, State
+from flask import Response, abort, request, jsonify
+from markupsafe import escape
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
 import os
 import configparser
 import threading
 import time
+import csv
+import io
+from datetime import date
 from database import init_db, get_db, cleanup, periodic_checkpoint
+from authGuard import PasswordHasher, LoginThrottle, HashingBusyError
+from concurrency import ConcurrencyConfig, AdmissionController, DASH_CALLBACK_SUFFIX, AUTH_OUTPUTS
+import perfMonitor
+import tracing
+import profiler
+import staleRequests
+from trafficRecorder import TrafficRecorder
+from workers import (is_primary, worker_id, load_secret_key, reuseport_supported,
+                     bind_reuseport_socket, spawn_workers, stop_workers)
 import signal
 import sys
 
@@ -20,14 +33,60 @@ production = True  # Set to True for production, False for development
 pool_monitoring = config.getboolean("ConnectionPool", "monitoring")  # Enable or disable pool monitoring
 use_connection_pool = config.getboolean("ConnectionPool", "use_pool")  # Use connection pool; if False, use direct connections
 
-cpu_count = os.cpu_count()
-pool_size = cpu_count if cpu_count else int(config["ConnectionPool"]["pool_size"])  # Connection pool size use logical processors
-if not pool_size or pool_size < 1:
-    raise ValueError("Invalid pool size in config.ini, must be at least 1")
+# Waitress threads, pool size and callback admission are sized together from [Server]
+concurrency_config = ConcurrencyConfig.from_config(config, os.cpu_count())
+pool_size = concurrency_config.pool_size
 
 use_wal = config.getboolean("ConnectionPool", "use_wal")  # Use WAL mode for SQLite
+pragma_profile = config.get("ConnectionPool", "pragma_profile", fallback="safe")  # safe, balanced or throughput
+query_budget = config.getfloat("ConnectionPool", "query_budget_ms", fallback=5000) / 1000  # 0 = no limit
 continuous_pool_monitoring = False  # If True, monitor pool continuously (not recommended, for testing only)
 
+# Password hashing runs on its own small pool, failed logins are throttled per username and address.
+# Each hash blocks a request thread, so the backlog is capped by the login slots
+hash_workers, hash_max_pending = concurrency_config.hashing_limits(
+    config.getint("Security", "hash_workers", fallback=2),
+    config.getint("Security", "hash_max_pending", fallback=8),
+)
+password_hasher = PasswordHasher(workers=hash_workers, max_pending=hash_max_pending)
+login_throttle = LoginThrottle(
+    max_per_username=config.getint("Security", "max_failed_logins_per_user", fallback=5),
+    max_per_ip=config.getint("Security", "max_failed_logins_per_ip", fallback=20),
+    window=config.getint("Security", "failed_login_window", fallback=900),
+)
+trust_forwarded_for = config.getboolean("Security", "trust_forwarded_for", fallback=False)  # Only behind a proxy that sets it
+
+# Per-callback performance recording and the admin-only /debug pages
+perfMonitor.configure(
+    enable=config.getboolean("Debug", "perf_monitoring", fallback=True),
+    allocations=config.getboolean("Debug", "trace_allocations", fallback=False),
+)
+admin_users = {name.strip() for name in config.get("Debug", "admin_users", fallback="").split(",") if name.strip()}
+profile_max_seconds = config.getfloat("Debug", "profile_max_seconds", fallback=15)
+
+# Sampled request tracing to Chrome trace files
+trace_dir = config.get("Tracing", "output_dir", fallback="traces")
+if not os.path.isabs(trace_dir):
+    trace_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), trace_dir)
+tracing.configure(
+    enable=config.getboolean("Tracing", "enabled", fallback=False),
+    rate=config.getfloat("Tracing", "sample_rate", fallback=0.01),
+    window=config.getfloat("Tracing", "interaction_window", fallback=3.0),
+    min_duration=config.getfloat("Tracing", "min_duration_ms", fallback=0.0),
+    directory=trace_dir,
+    keep_files=config.getint("Tracing", "max_files", fallback=200),
+)
+TRACE_SKIP_PATHS = ("_dash-component-suites", "/assets/", "_favicon")  # Static files, not worth a span
+
+# Homepage figure callbacks superseded by a newer invocation from the same session are cancelled
+staleRequests.configure(enable=config.getboolean("Server", "cancel_superseded_callbacks", fallback=True))
+
+# Anonymized callback traffic for benchmarks/replay.py
+record_traffic = config.getboolean("Recording", "enabled", fallback=False)
+recording_dir = config.get("Recording", "output_dir", fallback="recordings")
+if not os.path.isabs(recording_dir):
+    recording_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), recording_dir)
+
 if production:
     from waitress import serve
     import socket
@@ -52,12 +111,59 @@ app.title = 'Gringotts - Finance Safety'
 server = app.server
 
 # Configure Flask-Login
+# The key is shared by all worker processes and persists across restarts
+secret_key_file = config.get("Server", "secret_key_file", fallback="secret.key")
+if not os.path.isabs(secret_key_file):
+    secret_key_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), secret_key_file)
 server.config.update(
-    SECRET_KEY=os.urandom(32).hex(),  # use real key in production
+    SECRET_KEY=load_secret_key(secret_key_file),
 )
+worker_processes = []  # Spawned workers, only ever filled in the primary process
+
+# Keyed with the session secret so every worker hashes a value to the same token
+traffic_recorder = None
+if record_traffic:
+    traffic_recorder = TrafficRecorder(
+        recording_dir,
+        server.config["SECRET_KEY"],
+        max_file_mb=config.getfloat("Recording", "max_file_mb", fallback=50),
+        path_suffix=DASH_CALLBACK_SUFFIX,
+    )
 
 login_manager = LoginManager()
 login_manager.init_app(server)
+if traffic_recorder:
+    traffic_recorder.init_app(server)
+
+# Registered before admission so the admission wait is inside the request span
+# (teardown functions run in reverse order, so this one finishes last)
+@server.before_request
+def start_request_trace():
+    if not tracing.enabled or any(part in request.path for part in TRACE_SKIP_PATHS):
+        return
+    key = current_user.get_id() if current_user.is_authenticated else client_address()
+    tracing.start_request(f"{request.method} {request.path}", key=f"user {key}")
+
+@server.teardown_request
+def finish_request_trace(exc=None):
+    tracing.finish_request(error=type(exc).__name__ if exc else None)
+
+# Dash callbacks beyond the pool's capacity get a fast 503 instead of waiting on checkout.
+# Logins and registrations have their own slots, so a burst of them cannot take the
+# dashboard slots and dashboards cannot lock users out of logging in
+admission = AdmissionController(
+    concurrency_config.max_active_callbacks,
+    concurrency_config.admission_timeout,
+    exclude_outputs=AUTH_OUTPUTS,
+)
+admission.init_app(server)
+auth_admission = AdmissionController(
+    concurrency_config.max_auth_callbacks,
+    concurrency_config.admission_timeout,
+    outputs=AUTH_OUTPUTS,
+    name="auth",
+)
+auth_admission.init_app(server)
 # Set login view to include the URL prefix
 login_manager.login_view = f'{URL_PREFIX}login'
 
@@ -71,10 +177,11 @@ class User(UserMixin):
 
 @login_manager.user_loader
 def load_user(user_id):
+    # Runs on every request including Dash callbacks, so served from the session user cache
     db = get_db()
-    user_data = db.get_user_by_id(int(user_id))
-    if user_data and user_data[5]:  # is_active check
-        return User(user_data[0], user_data[1], user_data[3], user_data[4])
+    user_data = db.get_session_user(int(user_id))
+    if user_data and user_data[4]:  # is_active check
+        return User(user_data[0], user_data[1], user_data[2], user_data[3])
     return None
 
 # Define a common navbar with login/logout button
@@ -247,7 +354,7 @@ class PoolMonitor:
             return
             
         self.running = True
-        self.thread = threading.Thread(target=self._monitor_loop, daemon=True)
+        self.thread = threading.Thread(target=self._monitor_loop, name="PoolMonitor", daemon=True)
         self.thread.start()
         print("Pool monitoring started")
     
@@ -312,6 +419,11 @@ class PoolMonitor:
               f"Utilization: {health['utilization_percent']}%, "
               f"Active: {health['active_connections']}")
 
+        admission_stats = admission.stats()
+        print(f"[{timestamp}] Admission: {admission_stats['admitted']} admitted, "
+              f"{admission_stats['rejected']} rejected ({admission_stats['rejection_percent']}%), "
+              f"max wait {admission_stats['max_wait_ms']}ms")
+
 # Lazy import functions for page layouts and callbacks
 def get_homepage_layout():
     """Lazy import homepage layout"""
@@ -368,6 +480,12 @@ def display_page(pathname, search):
            return dcc.Location(pathname=f"{URL_PREFIX}login", id="home-login-redirect"), get_navbar()
         return get_homepage_layout(), get_navbar()
 
+def client_address():
+    """Address used for login throttling"""
+    if trust_forwarded_for and request.access_route:
+        return request.access_route[0]
+    return request.remote_addr
+
 # Login callback
 @app.callback(
     Output("login-message", "children"),
@@ -379,16 +497,28 @@ def login_user_callback(n_clicks, username, password):
     if n_clicks is None:
         return ""
 
+    ip = client_address()
+    retry_after = login_throttle.retry_after(username, ip)
+    if retry_after:
+        return dbc.Alert(f"Too many failed attempts, try again in {retry_after // 60 + 1} min", color="danger")
+
     db = get_db()
     user_data = db.get_user_by_username(username)
 
+    try:
+        password_ok = password_hasher.check(user_data[2] if user_data else None, password)
+    except HashingBusyError:
+        return dbc.Alert("Server is busy, please try again in a moment", color="warning")
+
     if (
-        user_data and check_password_hash(user_data[2], password) and user_data[5]
+        user_data and password_ok and user_data[5]
     ):  # is_active check
+        login_throttle.record_success(username)
         user = User(user_data[0], user_data[1], user_data[3], user_data[4])
         login_user(user)
         return dcc.Location(pathname=f"{URL_PREFIX}", id="login-success-redirect")
     else:
+        login_throttle.record_failure(username, ip)
         return dbc.Alert("Invalid username or password", color="danger")
 
 # Registration callback
@@ -417,9 +547,18 @@ def register_user(n_clicks, username, email, name, password, confirm_password):
     if len(password) < 8:
         return dbc.Alert("Password must be at least 8 characters long", color="danger")
 
+    # Registrations share the per-address budget with failed logins
+    ip = client_address()
+    if login_throttle.retry_after(None, ip):
+        return dbc.Alert("Too many attempts, please try again later", color="danger")
+    login_throttle.record_failure(None, ip)
+
     # Create user
     db = get_db()
-    password_hash = generate_password_hash(password)
+    try:
+        password_hash = password_hasher.generate(password)
+    except HashingBusyError:
+        return dbc.Alert("Server is busy, please try again in a moment", color="warning")
     user_id = db.create_user(username, password_hash, email, name)
 
     if user_id:
@@ -427,12 +566,126 @@ def register_user(n_clicks, username, email, name, password, confirm_password):
     else:
         return dbc.Alert("Username or email already exists", color="danger")
 
+# --- CSV EXPORT ---
+# Streams a user's rows in the same layout the CSV importer accepts
+EXPORT_KINDS = ("transactions", "income", "recurring")
+
+@server.route(f"{URL_PREFIX}export/<kind>.csv")
+@login_required
+def export_csv(kind):
+    if kind not in EXPORT_KINDS:
+        abort(404)
+
+    db = get_db()
+    user_id = current_user.id  # Resolve before streaming, generator runs outside the request
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        # Send the header straight away so the download starts immediately
+        writer.writerow(db.EXPORT_COLUMNS)
+        yield buffer.getvalue()
+
+        for rows in db.iter_export_rows(kind, user_id):
+            buffer.seek(0)
+            buffer.truncate(0)
+            writer.writerows(rows)
+            yield buffer.getvalue()
+
+    filename = f"{kind}_{date.today().isoformat()}.csv"
+    return Response(
+        generate(),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+# --- DEBUG PAGES ---
+# Only for usernames listed in [Debug] admin_users, everyone else gets a 404
+def require_admin():
+    if not current_user.is_authenticated or current_user.username not in admin_users:
+        abort(404)
+
+@server.after_request
+def record_callback_payload(response):
+    """Response size of each Dash callback for the perf page"""
+    if perfMonitor.enabled and request.path.endswith(DASH_CALLBACK_SUFFIX) and not response.is_streamed:
+        perfMonitor.record_payload_size(response.calculate_content_length() or 0)
+    return response
+
+PERF_COLUMNS = [
+    ("callback", "Callback"), ("calls", "Calls"), ("total_ms", "Total ms"), ("avg_ms", "Avg ms"),
+    ("p50_ms", "p50 ms"), ("p95_ms", "p95 ms"), ("max_ms", "Max ms"),
+    ("avg_pool_wait_ms", "Pool wait ms"), ("avg_pool_hold_ms", "Pool hold ms"), ("avg_sql", "SQL / call"),
+    ("avg_payload_kb", "Payload KB"), ("max_payload_kb", "Max payload KB"),
+    ("max_peak_alloc_kb", "Peak alloc KB"), ("query_timeouts", "Query timeouts"), ("errors", "Errors"),
+]
+
+@server.route(f"{URL_PREFIX}debug/perf")
+@login_required
+def debug_perf():
+    require_admin()
+    rows = perfMonitor.summary()
+    if request.args.get("format") == "json":
+        return jsonify(rows)
+
+    header = "".join(f"<th>{label}</th>" for _, label in PERF_COLUMNS)
+    body = "".join(
+        "<tr>" + "".join(f"<td>{escape('' if row[key] is None else row[key])}</td>" for key, _ in PERF_COLUMNS) + "</tr>"
+        for row in rows
+    )
+    page = f"""<!DOCTYPE html>
+<html><head><title>Callback performance</title>
+<style>body{{font-family:sans-serif}} table{{border-collapse:collapse}} td,th{{border:1px solid #ccc;padding:4px 8px;text-align:right}} td:first-child{{text-align:left}}</style>
+</head><body>
+<h3>Callback performance (worker {worker_id()}, last {perfMonitor.WINDOW} calls per callback, ranked by total time)</h3>
+<table><tr>{header}</tr>{body}</table>
+</body></html>"""
+    return Response(page, mimetype="text/html")
+
+@server.route(f"{URL_PREFIX}debug/pool")
+@login_required
+def debug_pool():
+    require_admin()
+    db = get_db()
+    return jsonify({
+        "worker": worker_id(),
+        "pool": db.get_pool_health(),
+        "query_timeouts": db.query_timeouts,
+        "stale_requests": staleRequests.stats(),
+        "admission": admission.stats(),
+        "auth_admission": auth_admission.stats(),
+        "concurrency": vars(concurrency_config),
+        "recording": traffic_recorder.stats() if traffic_recorder else None,
+    })
+
+@server.route(f"{URL_PREFIX}debug/profile")
+@login_required
+def debug_profile():
+    """Sample every thread of this worker for ?seconds=N and return collapsed stacks"""
+    require_admin()
+    # Sampling runs on the profiler's own thread, this request only waits for the result
+    seconds = min(max(request.args.get("seconds", default=10, type=float), 0.1), profile_max_seconds)
+    interval = min(max(request.args.get("interval_ms", default=10, type=float), 1), 1000) / 1000
+    try:
+        lines, samples = profiler.sample_stacks(seconds, interval)
+    except profiler.ProfilerBusyError as e:
+        return Response(str(e), status=409, mimetype="text/plain")
+
+    print(f"Profile taken by {current_user.username}: {seconds}s, {samples} samples, worker {worker_id()}")
+    return Response("\n".join(lines) + "\n", mimetype="text/plain",
+                    headers={"X-Profile-Samples": str(samples), "X-Worker-Id": str(worker_id())})
+
 # --- Handle termination signals for graceful shutdown ---
 def handle_sigterm(signum, frame):
     """Handle SIGTERM signal for graceful shutdown."""
     print("Received SIGTERM, initiating graceful shutdown...")
     if 'monitor' in globals():
         monitor.stop_monitoring()
+    stop_workers(worker_processes)
+    password_hasher.shutdown()
+    if traffic_recorder:
+        traffic_recorder.close()
     cleanup()
     sys.exit(0)
 
@@ -446,7 +699,9 @@ if __name__ == "__main__":
     try: 
         # --- LAUNCH BACKEND FIRST ---
         print("Initializing database...")
-        init_db(use_pool_init=use_connection_pool, pool_size_init=pool_size, enable_monitoring_init=pool_monitoring, use_wal_init=use_wal)
+        init_db(use_pool_init=use_connection_pool, pool_size_init=pool_size, enable_monitoring_init=pool_monitoring, use_wal_init=use_wal,
+                checkout_timeout_init=concurrency_config.checkout_timeout, pragma_profile_init=pragma_profile,
+                query_budget_init=query_budget)
         db = get_db()
         
         # Initialize pool monitoring (separate)
@@ -457,8 +712,8 @@ if __name__ == "__main__":
             # Start monitoring
             monitor.start_monitoring()
         
-        # In Docker with WAL pool mode, start periodic checkpoints
-        if use_wal:
+        # In Docker with WAL pool mode, start periodic checkpoints (one process is enough)
+        if use_wal and is_primary():
             if db.use_wal:
                 print("Starting periodic WAL checkpoints for Docker...")
                 periodic_checkpoint(db, interval_seconds=300)  # Checkpoint every 5 min
@@ -480,14 +735,29 @@ if __name__ == "__main__":
             host = '0.0.0.0'
             port = APP_PORT
             
-            print("╔════════════════════════════════╗")
-            print("║   Waitress Server Started      ║")
-            print("╠════════════════════════════════╣")
-            print(f"║ Local:  http://localhost:{port}{URL_PREFIX} ║")
-            print(f"║ LAN:    http://{local_ip}:{port}{URL_PREFIX}  ║")
-            print("╚════════════════════════════════╝")
+            if is_primary():
+                print("╔════════════════════════════════╗")
+                print("║   Waitress Server Started      ║")
+                print("╠════════════════════════════════╣")
+                print(f"║ Local:  http://localhost:{port}{URL_PREFIX} ║")
+                print(f"║ LAN:    http://{local_ip}:{port}{URL_PREFIX}  ║")
+                print("╚════════════════════════════════╝")
             
-            serve(app.server, host=host, port=port)
+            print(f"Worker {worker_id()} - threads: {concurrency_config.threads}, pool: {pool_size}, "
+                  f"concurrent callbacks: {concurrency_config.max_active_callbacks}, "
+                  f"concurrent logins: {concurrency_config.max_auth_callbacks}")
+
+            if concurrency_config.workers > 1 and reuseport_supported():
+                # Every process binds its own socket to the same port, the kernel spreads connections
+                listen_socket = bind_reuseport_socket(host, port)
+                if is_primary():
+                    worker_processes.extend(spawn_workers(concurrency_config.workers))
+                    print(f"Started {len(worker_processes)} additional worker processes")
+                serve(app.server, sockets=[listen_socket], threads=concurrency_config.threads)
+            else:
+                if concurrency_config.workers > 1:
+                    print("SO_REUSEPORT is not available on this platform, serving with a single process")
+                serve(app.server, host=host, port=port, threads=concurrency_config.threads)
 
     except KeyboardInterrupt:
         print("\nReceived interrupt signal...")
@@ -501,6 +771,11 @@ if __name__ == "__main__":
         if 'monitor' in locals():
             monitor.stop_monitoring()
         
+        stop_workers(worker_processes)
+        password_hasher.shutdown()
+        if traffic_recorder:
+            traffic_recorder.close()
+
         # Explicit cleanup with checkpoint
         cleanup()
         
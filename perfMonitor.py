@@ -0,0 +1,185 @@
+# perfMonitor.py
+# Per-callback performance recording for the Dash callbacks.
+# instrument_callback wraps a callback (below login_required / authenticate_callback)
+# and records wall time, pool wait/hold time, SQL statement count, queries stopped by
+# their time budget and optionally peak allocations. The response payload size is
+# added by an after_request hook in main.py.
+# Aggregates are rolling: the last WINDOW calls of each callback.
+# The wrapper also opens the callback's span when the request is being traced.
+
+import threading
+import time
+import tracemalloc
+from collections import deque
+from functools import wraps
+
+import tracing
+
+WINDOW = 500  # Samples kept per callback
+
+_local = threading.local()
+_lock = threading.Lock()
+_samples = {}   # callback name -> deque of sample dicts
+_totals = {}    # callback name -> lifetime call count
+_names = set()  # Names of instrumented callbacks, each has to be unique to get its own row
+
+enabled = True
+# tracemalloc is process-wide and slows allocation, off unless asked for. Its peak is
+# process-wide too: each call resets it, so when callbacks overlap on several threads
+# a call's peak_alloc also counts the others' allocations, and a reset by a later
+# call can hide an earlier peak. Read it from single-user runs.
+trace_allocations = False
+
+
+def configure(enable=True, allocations=False):
+    """Turn recording on/off, and allocation tracing (tracemalloc) on/off"""
+    global enabled, trace_allocations
+    enabled = enable
+    trace_allocations = enable and allocations
+    if trace_allocations and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not trace_allocations and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def _active():
+    return getattr(_local, "record", None)
+
+
+# --- Hooks called from database.py ---
+def record_sql(statement):
+    """sqlite3 trace callback: counts statements run by the current callback"""
+    record = _active()
+    if record is not None:
+        record["sql_count"] += 1
+
+
+def record_pool_wait(seconds):
+    record = _active()
+    if record is not None:
+        record["pool_wait"] += seconds
+
+
+def record_pool_hold(seconds):
+    record = _active()
+    if record is not None:
+        record["pool_hold"] += seconds
+
+
+def record_query_timeout():
+    record = _active()
+    if record is not None:
+        record["query_timeouts"] += 1
+
+
+# --- Callback wrapper ---
+def instrument_callback(func):
+    """Record the cost of each call of a Dash callback, aggregated by function name"""
+    name = func.__name__
+    if name in _names:
+        print(f"Warning: more than one callback named {name}, their calls share one /debug/perf row")
+    _names.add(name)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with tracing.span(name, "callback"):
+            return _call(func, name, args, kwargs)
+    return wrapper
+
+
+def _call(func, name, args, kwargs):
+    if not enabled or _active() is not None:
+        return func(*args, **kwargs)
+
+    record = {
+        "callback": name,
+        "sql_count": 0,
+        "pool_wait": 0.0,
+        "pool_hold": 0.0,
+        "query_timeouts": 0,
+        "payload_bytes": None,
+        "peak_alloc": None,
+        "error": False,
+    }
+    _local.record = record
+    if trace_allocations:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    except Exception as e:
+        # PreventUpdate is how callbacks skip, not a failure
+        record["error"] = type(e).__name__ != "PreventUpdate"
+        raise
+    finally:
+        record["wall"] = time.perf_counter() - start
+        if trace_allocations:
+            record["peak_alloc"] = tracemalloc.get_traced_memory()[1]
+        _local.record = None
+        _local.last_record = record
+        _store(record)
+
+
+def record_payload_size(size):
+    """Attach the response size to the callback that just ran on this thread"""
+    record = getattr(_local, "last_record", None)
+    if record is not None:
+        record["payload_bytes"] = size
+        _local.last_record = None
+
+
+def _store(record):
+    with _lock:
+        samples = _samples.get(record["callback"])
+        if samples is None:
+            samples = _samples[record["callback"]] = deque(maxlen=WINDOW)
+        samples.append(record)
+        _totals[record["callback"]] = _totals.get(record["callback"], 0) + 1
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summary():
+    """Per-callback aggregates over the rolling window, most expensive (total wall time) first"""
+    with _lock:
+        snapshot = {name: list(samples) for name, samples in _samples.items()}
+        totals = dict(_totals)
+
+    rows = []
+    for name, samples in snapshot.items():
+        walls = sorted(sample["wall"] for sample in samples)
+        payloads = [sample["payload_bytes"] for sample in samples if sample["payload_bytes"] is not None]
+        peaks = [sample["peak_alloc"] for sample in samples if sample["peak_alloc"] is not None]
+        count = len(samples)
+        rows.append({
+            "callback": name,
+            "calls": totals.get(name, count),
+            "window": count,
+            "total_ms": round(sum(walls) * 1000, 1),
+            "avg_ms": round(sum(walls) / count * 1000, 2),
+            "p50_ms": round(_percentile(walls, 0.5) * 1000, 2),
+            "p95_ms": round(_percentile(walls, 0.95) * 1000, 2),
+            "max_ms": round(walls[-1] * 1000, 2),
+            "avg_pool_wait_ms": round(sum(s["pool_wait"] for s in samples) / count * 1000, 2),
+            "avg_pool_hold_ms": round(sum(s["pool_hold"] for s in samples) / count * 1000, 2),
+            "avg_sql": round(sum(s["sql_count"] for s in samples) / count, 1),
+            "avg_payload_kb": round(sum(payloads) / len(payloads) / 1024, 1) if payloads else None,
+            "max_payload_kb": round(max(payloads) / 1024, 1) if payloads else None,
+            "max_peak_alloc_kb": round(max(peaks) / 1024, 1) if peaks else None,
+            "query_timeouts": sum(s["query_timeouts"] for s in samples),
+            "errors": sum(1 for s in samples if s["error"]),
+        })
+
+    rows.sort(key=lambda row: row["total_ms"], reverse=True)
+    return rows
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+        _totals.clear()
@@ -0,0 +1,102 @@
+# profiler.py
+# Sampling profiler for a live server. A background loop reads every thread's stack
+# through sys._current_frames() at a fixed interval and counts identical stacks, so
+# nothing is attached to the request threads and the cost is a stack walk per sample.
+# Output is collapsed stacks ("thread;outer;...;inner count"), the input format of
+# flamegraph.pl, speedscope and similar flame graph tools.
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+DEFAULT_INTERVAL = 0.01  # seconds between samples (100 Hz)
+MAX_DEPTH = 128          # Deeper stacks are cut at the root end
+
+_running = threading.Lock()  # One profile at a time
+
+
+class ProfilerBusyError(Exception):
+    """Raised when a profile is requested while another one is running"""
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame):
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+
+def _sample_once(counts, skip_ids):
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    for thread_id, frame in sys._current_frames().items():
+        if thread_id in skip_ids:
+            continue
+        thread_name = names.get(thread_id, f"thread-{thread_id}").replace(";", ":")
+        counts[f"{thread_name};{_collapse(frame)}"] += 1
+
+
+def _sample_loop(seconds, interval, skip_ids):
+    counts = Counter()
+    samples = 0
+    deadline = time.monotonic() + seconds
+    next_sample = time.monotonic()
+
+    while next_sample < deadline:
+        _sample_once(counts, skip_ids)
+        samples += 1
+
+        next_sample += interval
+        delay = next_sample - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_sample = time.monotonic()  # Fell behind, skip rather than burst
+
+    lines = [f"{stack} {count}" for stack, count in counts.most_common()]
+    return lines, samples
+
+
+def sample_stacks(seconds, interval=DEFAULT_INTERVAL):
+    """
+    Sample all threads for the given time
+
+    The stack walks run on a dedicated "Profiler" thread, the caller only waits for
+    its result. Neither thread shows up in the samples.
+
+    Args:
+        seconds: how long to sample
+        interval: seconds between samples
+
+    Returns:
+        (collapsed stack lines, most frequent first; number of samples taken)
+    """
+    if not _running.acquire(blocking=False):
+        raise ProfilerBusyError("A profile is already running")
+
+    caller_id = threading.get_ident()
+    result = {}
+
+    def run():
+        try:
+            result["profile"] = _sample_loop(seconds, interval, {caller_id, threading.get_ident()})
+        finally:
+            _running.release()
+
+    try:
+        sampler = threading.Thread(target=run, name="Profiler", daemon=True)
+        sampler.start()
+    except Exception:
+        _running.release()
+        raise
+    sampler.join()
+    if "profile" not in result:
+        raise RuntimeError("Profiler thread stopped without a result")
+    return result["profile"]
@@ -0,0 +1,256 @@
+# sankey.py
+# Builds the node/link model behind the money flow Sankey diagram.
+# Kept free of Dash/Plotly so it can be built and checked outside a callback.
+
+OPACITY_TARGET = 0.6
+GREEN_COLOR = 'rgba(34,139,34, 0.6)'
+RED_COLOR = 'rgba(255,0,0, 0.4)'
+SAVINGS_COLOR = 'rgba(160, 160, 160, 0.6)'
+
+TRANSACTION_COLORS = [
+    f'rgba(255, 127, 14, {OPACITY_TARGET})',    # Orange
+    f'rgba(148, 103, 189, {OPACITY_TARGET})',   # Purple
+    f'rgba(140, 86, 75, {OPACITY_TARGET})',     # Brown
+    f'rgba(227, 119, 194, {OPACITY_TARGET})',   # Pink
+    f'rgba(127, 127, 127, {OPACITY_TARGET})',   # Gray
+    f'rgba(188, 189, 34, {OPACITY_TARGET})',    # Olive
+    f'rgba(23, 190, 207, {OPACITY_TARGET})',    # Cyan
+    f'rgba(44, 160, 44, {OPACITY_TARGET})',     # Green
+    f'rgba(31, 119, 180, {OPACITY_TARGET})',    # Blue
+    f'rgba(152, 223, 138, {OPACITY_TARGET})',   # Light Green
+    f'rgba(174, 199, 232, {OPACITY_TARGET})',   # Light Blue
+    f'rgba(197, 176, 213, {OPACITY_TARGET})',   # Light Purple
+    f'rgba(196, 156, 148, {OPACITY_TARGET})',   # Light Brown
+    f'rgba(247, 182, 210, {OPACITY_TARGET})',   # Light Pink
+    f'rgba(219, 219, 141, {OPACITY_TARGET})',   # Light Yellow
+    f'rgba(158, 218, 229, {OPACITY_TARGET})',   # Light Cyan
+    f'rgba(255, 187, 120, {OPACITY_TARGET})',   # Light Orange
+    f'rgba(199, 199, 199, {OPACITY_TARGET})'    # Light Gray
+]
+
+# More transactions than this get spread vertically instead of stacked
+TRANSACTION_THRESHOLD = 30
+
+# Node levels
+INCOME = "income"
+TOTAL = "total"
+CATEGORY = "category"
+TRANSACTION = "transaction"
+SAVINGS = "savings"
+
+# (x, y) per level, with and without the transaction level shown
+_POSITIONS_WITH_TRANSACTIONS = {
+    INCOME: (0, 0.1),
+    TOTAL: (0.33, 0.3),
+    CATEGORY: (0.66, 0.35),
+    SAVINGS: (0.5, 0.85),
+}
+_POSITIONS_WITHOUT_TRANSACTIONS = {
+    INCOME: (0, 0.0),
+    TOTAL: (0.4, 0.0001),
+    CATEGORY: (0.8, 0.0005),
+    SAVINGS: (0.6, 0.95),
+}
+
+
+def transaction_label(merchant, amount):
+    """Node label for a single transaction"""
+    return f"{merchant[:20] + '...' if len(merchant) > 20 else merchant} (${amount:.2f})"
+
+
+def build_sankey_model(income_data, spending_data, transactions_data, show_transactions=False):
+    """
+    Build Sankey nodes, links and positions in a single pass over the data
+
+    Args:
+        income_data: [(source, amount), ...]
+        spending_data: [(category, amount), ...]
+        transactions_data: [(category, merchant, amount), ...]
+        show_transactions: add the transaction level (third column)
+
+    Returns:
+        dict with labels, colors, levels, x, y, sources, targets, values,
+        link_colors and num_transactions
+    """
+    labels = []
+    colors = []
+    levels = []
+    sources = []
+    targets = []
+    values = []
+    label_to_index = {}
+
+    def add_node(label, color, level):
+        # First occurrence wins, so a label keeps the index, color and level it first got
+        index = label_to_index.get(label)
+        if index is None:
+            index = len(labels)
+            label_to_index[label] = index
+            labels.append(label)
+            colors.append(color)
+            levels.append(level)
+        return index
+
+    # Add income sources (first level)
+    income_total = 0
+    for source, amount in income_data:
+        add_node(source, GREEN_COLOR, INCOME)
+        income_total += amount
+
+    # Add spending categories (second level)
+    spending_total = 0
+    for category, amount in spending_data:
+        add_node(category, RED_COLOR, CATEGORY)
+        spending_total += amount
+
+    savings_amount = income_total - spending_total
+
+    # Total income node
+    if savings_amount >= 0:
+        total_income_label = f"Income (${income_total:.2f})<br>Spent (${spending_total:.2f})"
+    else:
+        total_income_label = f"Income (${income_total:.2f})<br>Spent (${spending_total:.2f})<br>Net -(${abs(savings_amount):.2f})"
+
+    total_index = len(labels)
+    label_to_index[total_income_label] = total_index
+    labels.append(total_income_label)
+    colors.append(GREEN_COLOR if savings_amount > 0 else RED_COLOR)
+    levels.append(TOTAL)
+
+    # Link income sources to total income
+    for source, amount in income_data:
+        sources.append(label_to_index[source])
+        targets.append(total_index)
+        values.append(amount)
+
+    # Link total income to spending categories
+    for category, amount in spending_data:
+        sources.append(total_index)
+        targets.append(label_to_index[category])
+        values.append(amount)
+
+    # Savings
+    if savings_amount > 0:
+        savings_label = f"Saved (${savings_amount:.2f})"
+        savings_index = len(labels)
+        label_to_index[savings_label] = savings_index
+        labels.append(savings_label)
+        colors.append(SAVINGS_COLOR)
+        levels.append(SAVINGS)
+
+        sources.append(total_index)
+        targets.append(savings_index)
+        values.append(savings_amount)
+
+    # Individual transactions (third level). Each transaction node remembers
+    # the position of its first occurrence for vertical spreading.
+    num_transactions = 0
+    first_position = {}
+    if show_transactions:
+        color_idx = 0
+        for category, merchant, amount in transactions_data:
+            label = transaction_label(merchant, amount)
+            if label not in label_to_index:
+                add_node(label, TRANSACTION_COLORS[color_idx % len(TRANSACTION_COLORS)], TRANSACTION)
+                color_idx += 1
+            first_position.setdefault(label_to_index[label], num_transactions)
+
+            # Link category to transaction
+            sources.append(label_to_index[category])
+            targets.append(label_to_index[label])
+            values.append(amount)
+
+            num_transactions += 1
+
+    # Positions
+    positions = _POSITIONS_WITH_TRANSACTIONS if show_transactions else _POSITIONS_WITHOUT_TRANSACTIONS
+    income_sources = {source for source, _ in income_data}
+    spending_categories = {category for category, _ in spending_data}
+
+    node_x = []
+    node_y = []
+    for index, label in enumerate(labels):
+        if label in income_sources:
+            level = INCOME
+        elif index == total_index:
+            level = TOTAL
+        elif label in spending_categories:
+            level = CATEGORY
+        else:
+            level = levels[index]
+
+        if level == TRANSACTION:
+            node_x.append(1.0)
+            if num_transactions > TRANSACTION_THRESHOLD:
+                # Spread transactions so they do not collide with savings
+                node_y.append(0.0001 + (0.9999 * first_position[index] / (num_transactions - 1)))
+            else:
+                node_y.append(0.35)
+        else:
+            x, y = positions[level]
+            node_x.append(x)
+            node_y.append(y)
+
+    # Links into categories are red, out of income sources green, otherwise the target's color
+    link_colors = [
+        RED_COLOR if labels[trg] in spending_categories
+        else GREEN_COLOR if labels[src] in income_sources
+        else colors[trg]
+        for trg, src in zip(targets, sources)
+    ]
+
+    return {
+        "labels": labels,
+        "colors": colors,
+        "levels": levels,
+        "x": node_x,
+        "y": node_y,
+        "sources": sources,
+        "targets": targets,
+        "values": values,
+        "link_colors": link_colors,
+        "num_transactions": num_transactions,
+    }
+
+
+def build_transaction_nodes(category_index, transactions_data, first_index, color_offset=0,
+                            y=_POSITIONS_WITHOUT_TRANSACTIONS[CATEGORY][1]):
+    """
+    Transaction nodes and links for one category, to be appended to an existing model
+
+    Args:
+        category_index: node index of the category the transactions flow out of
+        transactions_data: [(category, merchant, amount), ...] for that category
+        first_index: index the first new node will get (current node count)
+        color_offset: position in TRANSACTION_COLORS to continue from
+        y: vertical position of the new nodes
+
+    Returns:
+        dict with the same list keys as build_sankey_model, covering only the new nodes and links
+    """
+    labels = []
+    colors = []
+    sources = []
+    targets = []
+    values = []
+
+    for offset, (_, merchant, amount) in enumerate(transactions_data):
+        color = TRANSACTION_COLORS[(color_offset + offset) % len(TRANSACTION_COLORS)]
+        labels.append(transaction_label(merchant, amount))
+        colors.append(color)
+        sources.append(category_index)
+        targets.append(first_index + offset)
+        values.append(amount)
+
+    return {
+        "labels": labels,
+        "colors": colors,
+        "levels": [TRANSACTION] * len(labels),
+        "x": [1.0] * len(labels),
+        "y": [y] * len(labels),
+        "sources": sources,
+        "targets": targets,
+        "values": values,
+        "link_colors": list(colors),
+        "num_transactions": len(labels),
+    }
@@ -0,0 +1,117 @@
+# staleRequests.py
+# Drops homepage callback invocations that a newer one has made pointless. Dragging
+# the month slider fires the figure callbacks for every value it passes; only the
+# last one is shown. Each invocation of a wrapped callback takes the next version
+# for (user, page load, callback). While it runs, the database's progress handler
+# aborts its queries as soon as a newer version exists, and a result that finishes
+# anyway is discarded (PreventUpdate) before Dash serializes it.
+#
+# Versions live in this process only. With [Server] workers > 1 an invocation and
+# the one superseding it can land on different processes; neither sees the other
+# and both run to the end, as they did before this module existed.
+
+import threading
+import uuid
+from functools import wraps
+
+from dash import dcc
+from dash.exceptions import PreventUpdate
+from flask_login import current_user
+
+PAGE_LOAD_STORE = "page-load-id"  # dcc.Store holding a random id per rendered page
+
+_local = threading.local()
+_lock = threading.Lock()
+_latest = {}  # (user, session, callback) -> [latest version, invocations running]
+
+enabled = True
+superseded = 0  # Finished invocations whose result was dropped
+cancelled = 0   # Invocations stopped in the middle of a query
+
+
+class StaleRequestError(Exception):
+    """The callback invocation running on this thread was superseded by a newer one"""
+
+
+def configure(enable=True):
+    global enabled
+    enabled = enable
+
+
+def page_load_store():
+    """Store for a page layout, a new id every time the layout is built"""
+    return dcc.Store(id=PAGE_LOAD_STORE, data=uuid.uuid4().hex)
+
+
+# --- Hooks called from database.py ---
+def is_tracked():
+    """True while a latest_only callback runs on this thread"""
+    return getattr(_local, "ticket", None) is not None
+
+
+def is_stale():
+    """True when the callback running on this thread has been superseded"""
+    ticket = getattr(_local, "ticket", None)
+    if ticket is None:
+        return False
+    entry, version = ticket
+    return entry[0] != version
+
+
+# --- Callback wrapper ---
+def latest_only(func):
+    """
+    Skip the output of a callback invocation once a newer one for the same page load started
+
+    The callback's last argument must be State(PAGE_LOAD_STORE, "data"). It is taken
+    off here and not passed on, so two tabs of the same user do not supersede each
+    other and the figure cache key does not change with every page load.
+    """
+    name = func.__name__
+
+    @wraps(func)
+    def wrapper(*args):
+        *args, page_load = args
+        if not enabled or is_tracked():
+            return func(*args)
+
+        key = (current_user.get_id(), page_load, name)
+        with _lock:
+            entry = _latest.setdefault(key, [0, 0])
+            entry[0] += 1
+            entry[1] += 1
+            _local.ticket = (entry, entry[0])
+        try:
+            return _run(func, args)
+        finally:
+            _local.ticket = None
+            with _lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del _latest[key]  # Nothing left to supersede
+    return wrapper
+
+
+def _run(func, args):
+    global superseded, cancelled
+    try:
+        result = func(*args)
+    except StaleRequestError:
+        with _lock:
+            cancelled += 1
+        raise PreventUpdate
+    if is_stale():
+        with _lock:
+            superseded += 1
+        raise PreventUpdate
+    return result
+
+
+def stats():
+    with _lock:
+        return {
+            "enabled": enabled,
+            "running": sum(entry[1] for entry in _latest.values()),
+            "superseded": superseded,
+            "cancelled": cancelled,
+        }
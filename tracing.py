@@ -0,0 +1,218 @@
+# tracing.py
+# Sampled span tracing for single slow interactions. A homepage load fires several Dash
+# callbacks as separate requests, so sampling is decided per interaction: once a user's
+# request is picked, all their requests for the next few seconds are traced too, and
+# they all go to the same Chrome trace-event file (one row per Waitress thread).
+# Open the files in chrome://tracing or https://ui.perfetto.dev.
+#
+# Spans: Flask request > Dash callback > figure build > pool checkout / SQL statement.
+# When no trace is active on the thread every span is a no-op.
+
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+MAX_ARG_LENGTH = 200  # SQL text and other span arguments are cut to this length
+
+_local = threading.local()
+_lock = threading.Lock()
+_interactions = {}  # interaction key -> _TraceFile, while its window is open
+_span_ids = itertools.count(1)
+
+enabled = False
+sample_rate = 0.01
+interaction_window = 3.0
+min_duration_ms = 0.0
+output_dir = "traces"
+max_files = 200
+
+
+def configure(enable=False, rate=0.01, window=3.0, min_duration=0.0, directory="traces", keep_files=200):
+    """
+    Args:
+        enable: turn tracing on
+        rate: fraction of interactions traced
+        window: seconds after a sampled request during which the same user stays traced
+        min_duration: requests faster than this (ms) are left out of the file
+        directory: where trace files are written
+        keep_files: trace files kept, oldest removed first
+    """
+    global enabled, sample_rate, interaction_window, min_duration_ms, output_dir, max_files
+    enabled = enable
+    sample_rate = rate
+    interaction_window = window
+    min_duration_ms = min_duration
+    output_dir = directory
+    max_files = keep_files
+    if enabled:
+        os.makedirs(output_dir, exist_ok=True)
+
+
+def _now_us():
+    return time.perf_counter_ns() // 1000
+
+
+def _clip(value):
+    text = value if isinstance(value, str) else repr(value)
+    text = " ".join(text.split())
+    return text if len(text) <= MAX_ARG_LENGTH else text[:MAX_ARG_LENGTH] + "..."
+
+
+class _TraceFile:
+    """One Chrome trace file in JSON array format, appended to as traced requests finish"""
+
+    def __init__(self, key):
+        self.pid = os.getpid()
+        self.expires = time.monotonic() + interaction_window
+        self.path = os.path.join(
+            output_dir,
+            f"trace-{time.strftime('%Y%m%d-%H%M%S')}-{self.pid}-{next(_span_ids)}.json",
+        )
+        self._threads = set()
+        self._lock = threading.Lock()
+        self._write([{
+            "name": "process_name", "ph": "M", "pid": self.pid, "tid": 0,
+            "args": {"name": f"Expense Tracker (pid {self.pid}, {key})"},
+        }], first=True)
+        _prune_old_files()
+
+    def _write(self, events, first=False):
+        # The closing ] is optional in the array format, so events can just be appended
+        chunk = ",\n".join(json.dumps(event, separators=(",", ":")) for event in events)
+        with open(self.path, "w" if first else "a", encoding="utf-8") as f:
+            f.write(("[\n" if first else ",\n") + chunk)
+
+    def add(self, tid, thread_name, events):
+        with self._lock:
+            if tid not in self._threads:
+                self._threads.add(tid)
+                events = [{
+                    "name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid,
+                    "args": {"name": thread_name},
+                }] + events
+            try:
+                self._write(events)
+            except OSError as e:
+                print(f"Error writing trace {self.path}: {e}")
+
+
+def _prune_old_files():
+    try:
+        names = sorted(
+            name for name in os.listdir(output_dir)
+            if name.startswith("trace-") and name.endswith(".json")
+        )
+        for name in names[:max(0, len(names) - max_files)]:
+            os.remove(os.path.join(output_dir, name))
+    except OSError as e:
+        print(f"Error pruning trace files: {e}")
+
+
+def _trace_file_for(key):
+    """The open trace file for this interaction, a new one if sampled, otherwise None"""
+    now = time.monotonic()
+    with _lock:
+        trace_file = _interactions.get(key)
+        if trace_file is not None and trace_file.expires > now:
+            return trace_file
+
+        for stale in [k for k, f in _interactions.items() if f.expires <= now]:
+            del _interactions[stale]
+        if random.random() >= sample_rate:
+            return None
+
+        try:
+            trace_file = _interactions[key] = _TraceFile(key)
+        except OSError as e:
+            print(f"Error starting trace: {e}")
+            return None
+        return trace_file
+
+
+# --- Request level ---
+def start_request(name, key, **args):
+    """Open the root span of a request if its interaction is sampled"""
+    _local.trace = None
+    if not enabled:
+        return False
+    trace_file = _trace_file_for(key)
+    if trace_file is None:
+        return False
+
+    thread = threading.current_thread()
+    _local.trace = {
+        "file": trace_file,
+        "tid": thread.ident,
+        "thread_name": thread.name,
+        "events": [],
+        "stack": [],
+    }
+    _open_span(name, "request", args)
+    return True
+
+
+def finish_request(**args):
+    """Close the root span and append the request's spans to its interaction file"""
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        return
+    _local.trace = None
+
+    while trace["stack"]:
+        _close_span(trace, args if len(trace["stack"]) == 1 else {})
+
+    root = trace["events"][-1]
+    if root["dur"] / 1000 >= min_duration_ms:
+        trace["file"].add(trace["tid"], trace["thread_name"], trace["events"])
+
+
+def is_tracing():
+    return getattr(_local, "trace", None) is not None
+
+
+# --- Spans ---
+def _open_span(name, category, args):
+    trace = _local.trace
+    span_id = next(_span_ids)
+    span_args = {key: _clip(value) for key, value in args.items()}
+    span_args["span_id"] = span_id
+    if trace["stack"]:
+        span_args["parent_id"] = trace["stack"][-1]["args"]["span_id"]
+    trace["stack"].append({
+        "name": name, "cat": category, "ph": "X", "ts": _now_us(),
+        "pid": trace["file"].pid, "tid": trace["tid"], "args": span_args,
+    })
+
+
+def _close_span(trace, args):
+    event = trace["stack"].pop()
+    event["dur"] = _now_us() - event["ts"]
+    for key, value in args.items():
+        if value is not None:
+            event["args"][key] = _clip(value)
+    trace["events"].append(event)
+
+
+@contextmanager
+def span(name, category="app", **args):
+    """Time a block as a child of the current span, does nothing when not tracing"""
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        yield
+        return
+
+    _open_span(name, category, args)
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        # The request may have been finished underneath us (e.g. a generator closed late)
+        if _local.trace is trace and trace["stack"]:
+            _close_span(trace, {"error": error} if error else {})
@@ -0,0 +1,216 @@
+# trafficRecorder.py
+# Opt-in recording of Dash callback traffic, replayed by benchmarks/replay.py.
+# Every callback request of a logged-in user is written as one JSON line into a
+# gzip file: when it arrived, which callback, its inputs and state, status and time
+# taken. Values are anonymized before they leave the request thread:
+# - filters, periods, dates and toggles are kept as they are (they drive the queries)
+# - other text becomes a keyed hash token, equal values give equal tokens
+# - other numbers are rounded to one significant digit
+# - uploaded files are reduced to their row count
+# Login and registration callbacks are never recorded.
+
+import base64
+import gzip
+import hashlib
+import hmac
+import json
+import math
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from flask import g, request
+from flask_login import current_user
+
+FORMAT_VERSION = 1
+QUEUE_SIZE = 10000        # Events waiting for the writer, newer ones are dropped beyond this
+FLUSH_INTERVAL = 1.0      # Seconds between gzip flushes, the file is readable up to the last flush
+
+# "id.prop" values recorded verbatim
+KEEP_VALUES = {
+    "url.pathname",
+    "filter-type.value", "data-display-options.value", "year-input.value", "month-slider.value",
+    "last-period-options.value", "custom-days-input.value", "start-date-picker.date", "end-date-picker.date",
+    "lag-limiter.value", "trans-limiter.value", "sankey-height.value",
+    "start-date-picker-movement.date", "end-date-picker-movement.date", "show-net-worth-movement.value",
+    "tm-date.date", "tm-recurring.value", "im-date.date",
+}
+COUNTER_PROPS = {"n_clicks", "n_intervals", "n_submit", "n_blur"}
+CATEGORY_ID_KEYS = {"tm-category.value", "tv-category-filter.value"}                # Mapped to a category id on replay
+CATEGORY_NAME_KEYS = {"trend-category-filter.value", "edit-trans-category.value"}   # Mapped to a category name on replay
+UPLOAD_KEYS = {"upload-transactions.contents"}
+SKIP_OUTPUTS = ("login-message.", "register-message.")
+
+
+class TrafficRecorder:
+    def __init__(self, directory, secret, max_file_mb=50, path_suffix="_dash-update-component"):
+        """
+        Args:
+            directory: where recordings are written
+            secret: key for the anonymizing hashes (the session secret, so all workers agree)
+            max_file_mb: compressed size after which a new file is started
+            path_suffix: request paths that are recorded
+        """
+        self.directory = directory
+        self.max_file_bytes = int(max_file_mb * 1024 * 1024)
+        self.path_suffix = path_suffix
+        self._key = hmac.new(secret.encode("utf-8"), b"traffic-recording", hashlib.sha256).digest()
+        self._queue = queue.Queue(QUEUE_SIZE)
+        self._start = time.monotonic()
+        self._started_at = datetime.now()
+        self._part = 0
+        self._file = None
+        self._raw = None
+        self.recorded = 0
+        self.dropped = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._writer = threading.Thread(target=self._write_loop, name="TrafficRecorder", daemon=True)
+        self._writer.start()
+
+    def init_app(self, server):
+        server.before_request(self._before_request)
+        server.after_request(self._after_request)
+
+    # --- Anonymizing ---
+    def _token(self, text):
+        return hmac.new(self._key, text.encode("utf-8"), hashlib.sha256).hexdigest()[:12]
+
+    def _scrub(self, value, counter=False):
+        if value is None or isinstance(value, bool):
+            return value
+        if isinstance(value, (int, float)):
+            if counter or value == 0 or not math.isfinite(value):
+                return value
+            return round(value, -int(math.floor(math.log10(abs(value)))))
+        if isinstance(value, str):
+            return "~" + self._token(value)
+        if isinstance(value, list):
+            return [self._scrub(item, counter) for item in value]
+        if isinstance(value, dict):
+            return {key: self._scrub(item, counter) for key, item in value.items()}
+        return None
+
+    def anonymize(self, key, value):
+        """Anonymized copy of one property value, key is "id.prop" """
+        if key in KEEP_VALUES or value is None:
+            return value
+        if key in UPLOAD_KEYS:
+            if not isinstance(value, str):
+                return None
+            _, _, encoded = value.partition(",")
+            try:
+                rows = base64.b64decode(encoded).decode("utf-8", "replace").strip().count("\n")
+            except ValueError:
+                rows = 0
+            return {"~csv_rows": rows}
+        if key in CATEGORY_ID_KEYS or key in CATEGORY_NAME_KEYS:
+            values = value if isinstance(value, list) else [value]
+            tokens = [{"~category": self._token(str(item))} for item in values]
+            return tokens if isinstance(value, list) else tokens[0]
+        return self._scrub(value, counter=key.rsplit(".", 1)[-1] in COUNTER_PROPS)
+
+    def _anonymize_items(self, items):
+        result = []
+        for item in items or []:
+            if isinstance(item, list):  # Pattern-matching wildcard, one entry per matched component
+                result.append(self._anonymize_items(item))
+                continue
+            component_id = item.get("id")
+            if isinstance(component_id, dict):
+                key = json.dumps(component_id, sort_keys=True, separators=(",", ":")) + "." + item.get("property", "")
+            else:
+                key = f"{component_id}.{item.get('property')}"
+            result.append(dict(item, value=self.anonymize(key, item.get("value"))))
+        return result
+
+    # --- Request hooks ---
+    def _before_request(self):
+        if request.path.endswith(self.path_suffix):
+            g._traffic_start = time.perf_counter()
+
+    def _after_request(self, response):
+        start = g.pop("_traffic_start", None)
+        if start is None or not current_user.is_authenticated:
+            return response
+
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict) or str(body.get("output", "")).lstrip(".").startswith(SKIP_OUTPUTS):
+            return response
+
+        event = {
+            "t": round(time.monotonic() - self._start, 3),
+            "u": self._token(str(current_user.get_id())),
+            "o": body.get("output"),
+            "os": body.get("outputs"),
+            "c": body.get("changedPropIds", []),
+            "i": self._anonymize_items(body.get("inputs")),
+            "s": self._anonymize_items(body.get("state")),
+            "st": response.status_code,
+            "ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+        return response
+
+    # --- Writer ---
+    def _open_file(self):
+        self._part += 1
+        path = os.path.join(
+            self.directory,
+            f"traffic-{self._started_at.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._part}.jsonl.gz",
+        )
+        self._raw = open(path, "wb")
+        self._file = gzip.GzipFile(fileobj=self._raw, mode="wb")
+        header = {"format": "et-traffic", "version": FORMAT_VERSION, "started_at": self._started_at.isoformat(),
+                  "pid": os.getpid(), "part": self._part}
+        self._file.write((json.dumps(header) + "\n").encode("utf-8"))
+        print(f"Recording callback traffic to {path}")
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._raw.close()
+            self._file = self._raw = None
+
+    def _write_loop(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                event = self._queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                event = None
+            if event is _STOP:
+                self._close_file()
+                return
+
+            try:
+                if event is not None:
+                    if self._file is None:
+                        self._open_file()
+                    self._file.write((json.dumps(event, separators=(",", ":")) + "\n").encode("utf-8"))
+                    self.recorded += 1
+
+                if self._file is not None and time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                    self._file.flush()  # Sync flush, readers get every complete line so far
+                    last_flush = time.monotonic()
+                    if self._raw.tell() >= self.max_file_bytes:
+                        self._close_file()
+            except OSError as e:
+                print(f"Traffic recording error: {e}")
+                self._close_file()
+
+    def close(self):
+        """Write out everything queued and close the current file"""
+        self._queue.put(_STOP)
+        self._writer.join(timeout=10)
+
+    def stats(self):
+        return {"recorded": self.recorded, "dropped": self.dropped, "queued": self._queue.qsize()}
+
+
+_STOP = object()
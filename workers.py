@@ -0,0 +1,82 @@
+# workers.py
+# Multi-process serving: several Waitress processes accept on one port through
+# SO_REUSEPORT, each with its own connection pool. Sessions work across processes
+# because every worker signs cookies with the same persistent secret key.
+
+import os
+import secrets
+import socket
+import subprocess
+import sys
+
+WORKER_ENV = "ET_WORKER_ID"     # Set for spawned workers, absent in the primary process
+SECRET_ENV = "SECRET_KEY"       # Overrides the key file when set
+
+
+def worker_id():
+    """0 for the primary process, 1..n-1 for spawned workers"""
+    return int(os.environ.get(WORKER_ENV, "0"))
+
+
+def is_primary():
+    return worker_id() == 0
+
+
+def load_secret_key(path):
+    """
+    Shared session secret: SECRET_KEY from the environment, otherwise a key file
+    that is created once (owner read/write only) and reused by every process and restart
+    """
+    key = os.environ.get(SECRET_ENV)
+    if key:
+        return key
+
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path) as f:
+            key = f.read().strip()
+        if not key:
+            raise RuntimeError(f"Secret key file {path} is empty, delete it to generate a new key")
+        return key
+
+    key = secrets.token_hex(32)
+    with os.fdopen(fd, "w") as f:
+        f.write(key)
+    return key
+
+
+def reuseport_supported():
+    return hasattr(socket, "SO_REUSEPORT")
+
+
+def bind_reuseport_socket(host, port, backlog=1024):
+    """Listening socket that other processes can bind to the same port as well"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def spawn_workers(count):
+    """Start count - 1 more copies of this program, each one a worker serving the same port"""
+    processes = []
+    for i in range(1, count):
+        env = dict(os.environ)
+        env[WORKER_ENV] = str(i)
+        processes.append(subprocess.Popen([sys.executable, os.path.abspath(sys.argv[0])] + sys.argv[1:], env=env))
+    return processes
+
+
+def stop_workers(processes, timeout=10):
+    """Ask workers to shut down (SIGTERM), kill the ones that do not exit in time"""
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()